@@ -0,0 +1,92 @@
+"""Measures the payload of a course unit made of N School Yourself blocks.
+
+Every block used to inline its view JS and student_view.css into its
+fragment. Now the fragments reference the files in public/ by URL,
+which the browser fetches once per page (and then caches across
+pages). This prints both numbers side by side.
+
+Usage:
+  python benchmarks/fragment_payload.py [N ...]
+"""
+
+from __future__ import absolute_import, print_function
+import importlib.resources
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mock import Mock
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from schoolyourself.schoolyourself_lesson import SchoolYourselfLessonXBlock
+from schoolyourself.schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+# These are the files that used to be inlined, per block type.
+INLINED_ASSETS = {
+  SchoolYourselfLessonXBlock: ["public/js/lesson_student_view.js",
+                               "public/css/student_view.css"],
+  SchoolYourselfReviewXBlock: ["public/js/review_student_view.js",
+                               "public/css/student_view.css"],
+}
+
+
+def asset_size(path):
+  return len(importlib.resources.files("schoolyourself").joinpath(
+      path).read_bytes())
+
+
+def make_block(block_class, index):
+  runtime = Mock()
+  runtime.local_resource_url.side_effect = (
+      lambda block, uri: "/xblock/resource/schoolyourself/%s" % uri)
+  runtime.handler_url.side_effect = (
+      lambda block, handler, *args, **kwargs: "/handler/%s" % handler)
+  return block_class(runtime,
+                     DictFieldData({"module_id": "algebra/module_%d" % index,
+                                    "shared_key": "key"}),
+                     ScopeIds("user", "type", "def", "usage_%d" % index))
+
+
+def fragment_bytes(fragment):
+  """The bytes a fragment contributes to the page HTML."""
+  total = len(fragment.content.encode("utf8"))
+  for resource in fragment.resources:
+    total += len(resource.data.encode("utf8"))
+  return total
+
+
+def unit_payload(num_blocks):
+  """Returns (inlined bytes, page bytes, one-time asset bytes)."""
+  inlined = 0
+  page = 0
+  urls = set()
+  for index in range(num_blocks):
+    block_class = (SchoolYourselfReviewXBlock if index % 2
+                   else SchoolYourselfLessonXBlock)
+    fragment = make_block(block_class, index).student_view()
+    size = fragment_bytes(fragment)
+    page += size
+    inlined += size + sum(asset_size(path)
+                          for path in INLINED_ASSETS[block_class])
+    urls.update(resource.data for resource in fragment.resources
+                if resource.kind == "url")
+
+  prefix = "/xblock/resource/schoolyourself/"
+  assets = sum(asset_size(url[len(prefix):])
+               for url in urls if url.startswith(prefix))
+  return inlined, page, assets
+
+
+def main(sizes):
+  print("%6s %16s %16s %18s" % ("blocks", "inlined (bytes)",
+                                "page (bytes)", "assets, once (bytes)"))
+  for num_blocks in sizes:
+    inlined, page, assets = unit_payload(num_blocks)
+    print("%6d %16d %16d %18d" % (num_blocks, inlined, page, assets))
+
+
+if __name__ == "__main__":
+  main([int(arg) for arg in sys.argv[1:]] or [1, 5, 15, 50])
@@ -0,0 +1,78 @@
+"""Measures how long it takes a fresh interpreter to import our package
+and to load the blocks through their entry points.
+
+Each statement runs in its own interpreter with "-X importtime", and
+the cumulative time of the outermost import is reported (the median
+over several runs). The script exits with status 1 if importing the
+package itself takes longer than --max-ms, so it can be used as a
+regression guard.
+
+Usage:
+  python benchmarks/import_time.py [--runs 7] [--max-ms 5]
+"""
+
+from __future__ import absolute_import, print_function
+import argparse
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+STATEMENTS = [
+  ("package", "import schoolyourself"),
+  ("lesson block", "from schoolyourself import SchoolYourselfLessonXBlock"),
+  ("review block", "from schoolyourself import SchoolYourselfReviewXBlock"),
+  ("xblock alone", "import xblock.core"),
+]
+
+
+def import_time_us(statement):
+  """Returns the cumulative import time of the statement's top-level
+  imports, in microseconds, as reported by -X importtime."""
+  result = subprocess.run(
+      [sys.executable, "-X", "importtime", "-c", statement],
+      cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+      check=True)
+
+  # The interpreter's own startup imports are reported first, ending
+  # with "site". Everything at the top level after that is ours.
+  total = 0
+  started = False
+  for line in result.stderr.decode("utf8").splitlines():
+    if not line.startswith("import time:"):
+      continue
+    fields = line[len("import time:"):].split("|")
+    name = fields[2]
+    if name.startswith("  "):
+      continue  # Nested imports are already in their parent's total.
+    if not started:
+      started = name.strip() == "site"
+      continue
+    total += int(fields[1])
+  return total
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--runs", type=int, default=7)
+  parser.add_argument("--max-ms", type=float, default=5.0,
+                      help="the most that importing the package may take")
+  args = parser.parse_args(argv)
+
+  results = {}
+  for name, statement in STATEMENTS:
+    timings = sorted(import_time_us(statement) for _ in range(args.runs))
+    results[name] = timings[len(timings) // 2]
+    print("%-14s %9.2f ms   (%s)" % (name, results[name] / 1000.0,
+                                     statement))
+
+  if results["package"] / 1000.0 > args.max_ms:
+    print("\nImporting the package took more than %.1f ms." % args.max_ms)
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
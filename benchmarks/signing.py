@@ -0,0 +1,61 @@
+"""Compares HMAC signing and verification throughput with and without
+the pre-keyed SigningService.
+
+Usage:
+  python benchmarks/signing.py [iterations]
+"""
+
+from __future__ import absolute_import, print_function
+import hashlib
+import hmac
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from schoolyourself.signing import SigningService
+
+
+SHARED_KEY = "a fairly long shared key, like the ones we hand out to partners"
+USER_ID = "3f0a7b2c9e8d4f61a5b3c2d1e0f9a8b7"
+MASTERY = dict(("algebra/module_%d" % i, (i % 100) / 100.0)
+               for i in range(10))
+
+
+def sign_partner_uncached():
+  return hmac.new(bytes(SHARED_KEY, "utf-8"), bytes(USER_ID, "utf-8"),
+                  digestmod=hashlib.md5).hexdigest()
+
+
+def verify(new_hmac):
+  verifier = new_hmac()
+  for key in sorted(MASTERY):
+    verifier.update(bytes(key, "utf-8"))
+    verifier.update(bytes("%.2f" % MASTERY[key], "utf-8"))
+  return verifier.hexdigest()
+
+
+def main(iterations):
+  signer = SigningService()
+
+  cases = [
+    ("partner signature, hmac.new", sign_partner_uncached),
+    ("partner signature, memoized",
+     lambda: signer.partner_signature(SHARED_KEY, USER_ID)),
+    ("verify 10 tags, hmac.new",
+     lambda: verify(lambda: hmac.new(bytes(SHARED_KEY, "utf-8"),
+                                     bytes(USER_ID, "utf-8"),
+                                     digestmod=hashlib.md5))),
+    ("verify 10 tags, pre-keyed copy",
+     lambda: verify(lambda: signer.new_hmac(SHARED_KEY,
+                                            bytes(USER_ID, "utf-8")))),
+  ]
+  for name, function in cases:
+    elapsed = timeit.timeit(function, number=iterations)
+    print("%-32s %10.0f ops/s  %7.2f us/op" % (
+        name, iterations / elapsed, elapsed / iterations * 1e6))
+
+
+if __name__ == "__main__":
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
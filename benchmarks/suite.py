@@ -0,0 +1,282 @@
+"""A benchmark suite for the render and grading hot paths.
+
+Everything runs offline, against a mock runtime and DictFieldData, so
+the numbers only reflect the work done inside the blocks. For each case
+the suite reports latency percentiles, throughput and the memory
+allocated per call (measured separately, with tracemalloc, so that it
+doesn't slow down the timed runs).
+
+Usage:
+  python benchmarks/suite.py                  # run everything
+  python benchmarks/suite.py -k handle_grade  # only matching cases
+  python benchmarks/suite.py --save           # store as the baseline
+  python benchmarks/suite.py --compare        # flag regressions
+
+A baseline is specific to the machine it was recorded on, so record one
+before making a change and compare against it afterwards.
+"""
+
+from __future__ import absolute_import, print_function
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mock import Mock
+from webob import Request
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from schoolyourself.catalog import ModuleCatalog
+from schoolyourself.mastery_cache import mastery_cache
+from schoolyourself.replay_cache import replay_cache
+from schoolyourself.schoolyourself_lesson import SchoolYourselfLessonXBlock
+from schoolyourself.schoolyourself_review import SchoolYourselfReviewXBlock
+from schoolyourself.signing import signer
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SHARED_KEY = "benchmark_key"
+MODULE_ID = "algebra/module_0"
+MASTERY_SIZES = [1, 10, 100, 1000, 10000]
+CATALOG_SIZE = 20000
+CATALOG_QUERIES = ["a", "algebra/module_1", "module 19", "geometry lines"]
+
+
+def make_runtime():
+  runtime = Mock()
+  runtime.local_resource_url.side_effect = (
+      lambda block, uri: "/xblock/resource/schoolyourself/%s" % uri)
+  runtime.handler_url.side_effect = (
+      lambda block, handler, *args, **kwargs: "/handler/%s" % handler)
+  return runtime
+
+
+def make_block(block_class):
+  return block_class(make_runtime(),
+                     DictFieldData({"module_id": MODULE_ID,
+                                    "module_title": "Module 0",
+                                    "shared_key": SHARED_KEY}),
+                     ScopeIds("user", "type", "def", "usage"))
+
+
+def make_catalog(num_modules):
+  subjects = ["algebra", "geometry", "trigonometry", "calculus"]
+  modules = [{"id": "%s/module_%d" % (subjects[i % 4], i),
+              "title": "%s lines, rays and module %d" % (
+                  subjects[i % 4].title(), i),
+              "description": "Module %d" % i}
+             for i in range(num_modules)]
+  with tempfile.NamedTemporaryFile("w", suffix=".json",
+                                   delete=False) as f:
+    json.dump(modules, f)
+  catalog = ModuleCatalog(path=f.name)
+  len(catalog)  # Load it now, rather than in the first timed call.
+  os.unlink(f.name)
+  return catalog
+
+
+def make_grade_message(num_tags, version=1):
+  mastery = dict(("algebra/module_%d" % i, (i % 100) / 100.0)
+                 for i in range(num_tags))
+  mastery[MODULE_ID] = 0.5
+  return signer.mastery_message(SHARED_KEY, "student", mastery, version)
+
+
+class Case(object):
+  """A named benchmark. setup() runs untimed before every call to run(),
+  and whatever it returns is passed to run()."""
+
+  def __init__(self, name, run, setup=lambda: None, check=None):
+    self.name = name
+    self.run = run
+    self.setup = setup
+    self.check = check
+
+
+def build_cases():
+  cases = []
+
+  lesson = make_block(SchoolYourselfLessonXBlock)
+  cases.append(Case("lesson.student_view",
+                    lambda _: lesson.student_view()))
+
+  review = make_block(SchoolYourselfReviewXBlock)
+  cases.append(Case("review.student_view",
+                    lambda _: review.student_view()))
+  cases.append(Case("review.studio_view", lambda _: review.studio_view()))
+
+  body = json.dumps({"module_id": MODULE_ID,
+                     "module_title": "Module 0",
+                     "module_description": "A module",
+                     "shared_key": SHARED_KEY,
+                     "base_url": "https://schoolyourself.org",
+                     "partner_id": "edx"}).encode("utf8")
+  cases.append(Case(
+      "review.studio_submit",
+      lambda request: review.studio_submit(request),
+      setup=lambda: Request.blank("/", method="POST", body=body)))
+
+  catalog = make_catalog(CATALOG_SIZE)
+  for query in CATALOG_QUERIES:
+    cases.append(Case("catalog.search[%s]" % query,
+                      lambda _, query=query: catalog.search(query)))
+
+  for version in (1, 2):
+    for num_tags in MASTERY_SIZES:
+      message = make_grade_message(num_tags, version)
+      grader = make_block(SchoolYourselfReviewXBlock)
+
+      def fresh_message(message=message):
+        # Otherwise every call after the first would be a repeat that
+        # skips verification, and the cases would share the cached
+        # levels.
+        replay_cache.clear()
+        mastery_cache.invalidate()
+        return message
+
+      cases.append(Case(
+          "review.handle_grade_json[%s%d tags]" % (
+              "v2, " if version == 2 else "", num_tags),
+          lambda data, grader=grader: grader.handle_grade_json(data),
+          setup=fresh_message,
+          check=lambda result: result == 0.5 / 0.7))
+
+  return cases
+
+
+def percentile(sorted_values, fraction):
+  index = min(int(round(fraction * (len(sorted_values) - 1))),
+              len(sorted_values) - 1)
+  return sorted_values[index]
+
+
+def measure(case, min_time, min_iterations):
+  """Returns a dict of statistics for one case."""
+  # Warm up (and sanity check) first.
+  result = case.run(case.setup())
+  if case.check is not None and not case.check(result):
+    raise AssertionError("%s returned %r" % (case.name, result))
+
+  timings = []
+  gc_was_enabled = gc.isenabled()
+  gc.disable()
+  try:
+    started = time.perf_counter()
+    while (len(timings) < min_iterations or
+           time.perf_counter() - started < min_time):
+      argument = case.setup()
+      before = time.perf_counter()
+      case.run(argument)
+      timings.append(time.perf_counter() - before)
+  finally:
+    if gc_was_enabled:
+      gc.enable()
+
+  timings.sort()
+  allocations = measure_allocations(case)
+  return {
+    "iterations": len(timings),
+    "p50_us": percentile(timings, 0.5) * 1e6,
+    "p90_us": percentile(timings, 0.9) * 1e6,
+    "p99_us": percentile(timings, 0.99) * 1e6,
+    "ops_per_sec": len(timings) / sum(timings),
+    "alloc_kb": allocations / 1024.0,
+  }
+
+
+def measure_allocations(case, iterations=20):
+  """Returns the average number of bytes allocated by one call.
+
+  Each call gets its setup right before it, as in measure(), since some
+  setups reset state (such as the replay cache) that the call changes.
+  The baseline is taken after the setup, so only the call is counted.
+  """
+  tracemalloc.start()
+  try:
+    total = 0
+    for _ in range(iterations):
+      argument = case.setup()
+      tracemalloc.reset_peak()
+      baseline = tracemalloc.get_traced_memory()[0]
+      case.run(argument)
+      total += tracemalloc.get_traced_memory()[1] - baseline
+  finally:
+    tracemalloc.stop()
+  return total / float(iterations)
+
+
+def compare(results, baseline, threshold):
+  """Returns the names of the cases whose p50 latency regressed by more
+  than the threshold (a fraction, e.g. 0.2 for 20%)."""
+  regressions = []
+  for name, stats in sorted(results.items()):
+    if name not in baseline:
+      continue
+    before = baseline[name]["p50_us"]
+    change = (stats["p50_us"] - before) / before
+    flag = ""
+    if change > threshold:
+      regressions.append(name)
+      flag = "  REGRESSION"
+    print("%-42s p50 %9.1f us -> %9.1f us  (%+6.1f%%)%s" % (
+        name, before, stats["p50_us"], change * 100, flag))
+  return regressions
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("-k", dest="pattern", default="",
+                      help="only run cases whose name contains this")
+  parser.add_argument("--min-time", type=float, default=0.5,
+                      help="seconds to spend timing each case")
+  parser.add_argument("--min-iterations", type=int, default=20)
+  parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                      help="where the baseline is stored")
+  parser.add_argument("--save", action="store_true",
+                      help="store these results as the baseline")
+  parser.add_argument("--compare", action="store_true",
+                      help="compare against the baseline, and exit with "
+                           "status 1 if anything regressed")
+  parser.add_argument("--threshold", type=float, default=0.2,
+                      help="the p50 slowdown that counts as a regression")
+  args = parser.parse_args(argv)
+
+  results = {}
+  print("%-42s %9s %9s %9s %11s %10s" % ("case", "p50 us", "p90 us",
+                                         "p99 us", "ops/s", "alloc KB"))
+  for case in build_cases():
+    if args.pattern not in case.name:
+      continue
+    stats = measure(case, args.min_time, args.min_iterations)
+    results[case.name] = stats
+    print("%-42s %9.1f %9.1f %9.1f %11.0f %10.1f" % (
+        case.name, stats["p50_us"], stats["p90_us"], stats["p99_us"],
+        stats["ops_per_sec"], stats["alloc_kb"]))
+
+  if args.save:
+    with open(args.baseline, "w") as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+    print("\nSaved baseline to %s" % args.baseline)
+
+  if args.compare:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    print("")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+      print("\n%d case(s) regressed by more than %.0f%%." % (
+          len(regressions), args.threshold * 100))
+      return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
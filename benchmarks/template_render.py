@@ -0,0 +1,61 @@
+"""Measures the per-render cost of the student view templates, with and
+without the compiled template registry.
+
+Usage:
+  python benchmarks/template_render.py [iterations]
+"""
+
+from __future__ import absolute_import, print_function
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mako.template import Template
+
+from schoolyourself.template_cache import TemplateRegistry
+
+
+CONTEXTS = {
+  "lesson_student_view.html": {
+    "iframe_url": "https://schoolyourself.org/page/embed?id=algebra/x",
+    "screenshot_url": "https://schoolyourself.org/page/screenshot/algebra/x",
+    "title": "Multiplication",
+    "description": "Multiplying positive numbers, in any order"
+  },
+  "review_student_view.html": {
+    "iframe_url": "https://schoolyourself.org/review/embed?module=algebra/x",
+    "title": "Multiplication",
+    "module_id": "algebra/x",
+    "icon_url": "/resource/public/review_icon.png",
+    "mastery_url": "/handler/review/mastery",
+    "user_key": "student",
+    "mastery_level": "0.35",
+    "mastery_text": "Almost there!",
+    "mastery_style": "right: 50%; background: #f0b300"
+  },
+}
+
+
+def main(iterations):
+  registry = TemplateRegistry(package="schoolyourself")
+
+  for template_name, context in sorted(CONTEXTS.items()):
+    source = registry.get_template(template_name).source
+
+    def uncached():
+      Template(source).render_unicode(**context)
+
+    def cached():
+      registry.render(template_name, context)
+
+    uncached_time = timeit.timeit(uncached, number=iterations) / iterations
+    cached_time = timeit.timeit(cached, number=iterations) / iterations
+    print("%-26s compile+render %8.1f us   cached render %6.1f us   "
+          "(%.0fx)" % (template_name, uncached_time * 1e6, cached_time * 1e6,
+                       uncached_time / cached_time))
+
+
+if __name__ == "__main__":
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
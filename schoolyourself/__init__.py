@@ -1,2 +1,24 @@
-from .schoolyourself_lesson import SchoolYourselfLessonXBlock
-from .schoolyourself_review import SchoolYourselfReviewXBlock
+"""School Yourself XBlocks.
+
+The block classes are imported on first use rather than when the
+package is imported, so that loading the package (for example, while
+the runtime scans the xblock.v1 entry points) stays cheap.
+"""
+
+_BLOCKS = {
+  "SchoolYourselfLessonXBlock": ".schoolyourself_lesson",
+  "SchoolYourselfReviewXBlock": ".schoolyourself_review",
+}
+
+__all__ = sorted(_BLOCKS)
+
+
+def __getattr__(name):
+  module_name = _BLOCKS.get(name, None)
+  if module_name is None:
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+  import importlib
+  block_class = getattr(importlib.import_module(module_name, __name__), name)
+  globals()[name] = block_class
+  return block_class
@@ -0,0 +1,105 @@
+"""This file contains a unit test for the static assets that the views
+reference by URL."""
+
+from __future__ import absolute_import
+import importlib.resources
+import posixpath
+import re
+import unittest
+
+from mock import Mock
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+from xblock.fragment import Fragment
+
+from .render_cache import render_cache
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+def read_asset(path):
+  return importlib.resources.files(__package__).joinpath(path).read_bytes()
+
+
+def make_runtime():
+  runtime = Mock()
+  runtime.local_resource_url.side_effect = (
+      lambda block, uri: "/resource/%s" % uri)
+  runtime.handler_url.return_value = "/handler/mastery"
+  return runtime
+
+
+class AssetTest(unittest.TestCase):
+  def setUp(self):
+    render_cache.clear()
+
+
+  def test_student_view_references_assets(self):
+    block = SchoolYourselfReviewXBlock(make_runtime(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+
+    fragment = block.student_view()
+    urls = [resource.data for resource in fragment.resources
+            if resource.kind == "url"]
+    self.assertIn("/resource/public/js/review_student_view.js", urls)
+    self.assertIn("/resource/public/sylib.js", urls)
+    self.assertIn('src="/resource/public/review_icon.png"', fragment.content)
+
+    # Nothing large should be inlined into the fragment any more, just
+    # the connection hints for the School Yourself server.
+    self.assertEqual([resource.data for resource in fragment.resources
+                      if resource.kind == "text"],
+                     ['<link rel="preconnect" href="https://schoolyourself.org">'
+                      '<link rel="dns-prefetch" '
+                      'href="https://schoolyourself.org">'])
+
+
+  def test_urls_are_the_files_in_public(self):
+    # The LMS's static pipeline collects public/ under the files' own
+    # names, so every URL has to name a file that exists.
+    runtime = make_runtime()
+    for block_class in (SchoolYourselfLessonXBlock,
+                        SchoolYourselfReviewXBlock):
+      block = block_class(runtime, DictFieldData({}),
+                          ScopeIds("foo", "bar", "baz", "x"))
+      block.student_view()
+
+    paths = set(call[0][1]
+                for call in runtime.local_resource_url.call_args_list)
+    self.assertIn("public/css/fonts.css", paths)
+    for path in paths:
+      self.assertTrue(read_asset(path), path)
+
+    with SchoolYourselfReviewXBlock.open_local_resource(
+        "public/css/student_view.css") as f:
+      self.assertEqual(f.read(), read_asset("public/css/student_view.css"))
+
+
+  def test_fonts_css_references_bundled_fonts(self):
+    css = read_asset("public/css/fonts.css").decode("utf8")
+    urls = re.findall(r'url\("([^"]+)"\)', css)
+    self.assertEqual(len(urls), 3)
+    for url in urls:
+      # Relative to public/css/, where the stylesheet is served from,
+      # under the fonts' own names.
+      path = posixpath.normpath(posixpath.join("public/css", url))
+      self.assertTrue(read_asset(path), path)
+    self.assertEqual(css.count("font-display: swap;"), 3)
+
+
+  def test_fonts_are_self_hosted_and_emitted_once(self):
+    runtime = make_runtime()
+    page = Fragment()
+    for usage_id in ["a", "b"]:
+      block = SchoolYourselfReviewXBlock(runtime, DictFieldData({}),
+                                         ScopeIds("foo", "bar", usage_id, "x"))
+      page.add_fragment_resources(block.student_view())
+
+    urls = [resource.data for resource in page.resources
+            if resource.kind == "url"]
+    self.assertEqual(urls.count("/resource/public/css/fonts.css"), 1)
+    self.assertFalse([url for url in urls if "googleapis" in url])
+
+
+if __name__ == "__main__":
+  unittest.main()
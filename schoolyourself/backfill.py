@@ -0,0 +1,382 @@
+"""Backfills grades from an export of signed mastery messages.
+
+When grades could not be published (an LMS outage, or a broken handler
+deploy), the mastery messages that the School Yourself review player
+sent in the meantime can be exported and replayed offline, instead of
+through handle_grade one request at a time.
+
+The export is a JSONL file with one message per line, exactly as the
+player posts it to handle_grade (either version; see signing.py),
+optionally with a "timestamp" (seconds since the epoch). The review
+blocks to fill in are listed in a JSON file:
+
+    [{"usage_id": "...", "module_id": "algebra/multiplication",
+      "shared_key": "..."}, ...]
+
+Every message is verified with the same rules as handle_grade_json(),
+across a pool of processes, against each shared key in that list.
+A verified message counts for every block with that key whose module
+it reports a level for. Once the whole export has been read, the
+latest grade for each (user, block) pair is handed to the publisher,
+which by default writes one JSON grade event per line.
+
+Progress is checkpointed every --checkpoint-every records. The
+checkpoint holds the file offset and the grades so far. Running the
+same command again resumes from it, and skips the grades that were
+already published. With --dry-run nothing is published; the run only
+reports what it would do.
+
+Usage:
+  schoolyourself-backfill --blocks blocks.json messages.jsonl \\
+      [--workers 8] [--checkpoint backfill.json] [--dry-run] \\
+      [--publisher package.module:factory] [--output grades.jsonl]
+
+A custom publisher is a callable that takes the parsed arguments and
+returns an object with publish(user_id, usage_id, grade) and close()
+methods.
+"""
+
+from __future__ import absolute_import, print_function
+import argparse
+import collections
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .schoolyourself_review import scaled_grade, verify_mastery_message
+
+
+CHUNK_SIZE = 1000  # Lines per task sent to a worker.
+TASKS_PER_WORKER = 4  # How far reading the input gets ahead of them.
+
+
+class JsonLinesPublisher(object):
+    """Writes one {"user_id", "usage_id", "value", "max_value"} grade
+    event per line, for whatever loads them into the LMS."""
+
+    def __init__(self, out):
+      self.out = out
+
+
+    def publish(self, user_id, usage_id, grade):
+      self.out.write(json.dumps({ "user_id": user_id, "usage_id": usage_id,
+                                  "value": grade, "max_value": 1.0 }) + "\n")
+
+
+    def close(self):
+      self.out.flush()
+
+
+def default_publisher(args):
+  out = open(args.output, "a") if args.output else sys.stdout
+  return JsonLinesPublisher(out)
+
+
+def load_publisher(spec, args):
+  """Creates the publisher named by a "package.module:factory" spec."""
+  module_name, _, attr = spec.partition(":")
+  factory = getattr(importlib.import_module(module_name), attr)
+  return factory(args)
+
+
+class Verifier(object):
+    """Verifies the lines of an export against the configured blocks.
+
+    Instances are sent to the worker processes, so they only hold plain
+    data.
+    """
+
+    def __init__(self, blocks):
+      # Shared key -> [(usage_id, module_id)]. Each message only has to
+      # be verified once per key, however many blocks use it.
+      self.blocks_by_key = collections.OrderedDict()
+      for block in blocks:
+        self.blocks_by_key.setdefault(block["shared_key"], []).append(
+            (block["usage_id"], block["module_id"]))
+
+
+    def verify_chunk(self, chunk):
+      """Verifies a list of (offset, line) pairs.
+
+      Returns:
+          A ({status: count}, grades) tuple, where grades is a list of
+          (user_id, usage_id, order, mastery level) tuples and order
+          says which of two grades is the later one.
+      """
+      statuses = collections.Counter()
+      grades = []
+      for line_offset, line in chunk:
+        if not line.strip():
+          continue
+        try:
+          data = json.loads(line)
+        except ValueError:
+          statuses["bad_request"] += 1
+          continue
+
+        timestamp = data.get("timestamp", 0) if isinstance(data, dict) else 0
+        if not isinstance(timestamp, (int, float)):
+          timestamp = 0
+        status = "invalid_signature"
+        for shared_key, blocks in self.blocks_by_key.items():
+          key_status, user_id, _, mastery = verify_mastery_message(
+              data, shared_key)
+          if key_status == "invalid_signature":
+            continue
+          status = key_status
+          if key_status != "ok":
+            break  # Malformed, whatever the key.
+
+          status = "unknown_module"
+          for usage_id, module_id in blocks:
+            try:
+              level = float(mastery[module_id])
+            except (KeyError, TypeError, ValueError):
+              continue
+            status = "ok"
+            grades.append((user_id, usage_id, (timestamp, line_offset),
+                           level))
+          break
+        statuses[status] += 1
+      return statuses, grades
+
+
+    def verify_task(self, task):
+      """Verifies a (chunk, end offset) pair from Backfill.tasks(), and
+      returns a (statuses, grades, end offset) tuple."""
+      chunk, offset = task
+      statuses, grades = self.verify_chunk(chunk)
+      return statuses, grades, offset
+
+
+class Backfill(object):
+    """Reads an export, keeps the latest grade per (user, block), and
+    publishes them. See the module docstring."""
+
+    def __init__(self, blocks, input_path, checkpoint_path=None,
+                 checkpoint_every=100000, workers=None, dry_run=False,
+                 publisher=None, log=None):
+      self.verifier = Verifier(blocks)
+      self.input_path = input_path
+      self.checkpoint_path = checkpoint_path
+      self.checkpoint_every = checkpoint_every
+      self.workers = workers or os.cpu_count() or 1
+      self.dry_run = dry_run
+      self.publisher = publisher
+      self.log = log or sys.stderr
+
+      self.offset = 0  # Bytes of the input that have been read.
+      self.records = 0
+      self.statuses = collections.Counter()
+      self.latest = {}  # (user_id, usage_id) -> (order, mastery level)
+      self.scanned = False
+      self.published = 0  # How many of sorted(self.latest) are done.
+      self.started = None
+
+
+    def run(self):
+      """Runs (or resumes) the backfill, and returns a summary dict."""
+      self.started = time.perf_counter()
+      self.load_checkpoint()
+      if not self.scanned:
+        self.scan()
+        self.scanned = True
+        self.save_checkpoint()
+      self.report()
+      if self.dry_run:
+        print("Dry run: nothing was published.", file=self.log)
+      else:
+        self.publish()
+        self.report()
+      return self.summary()
+
+
+    def tasks(self, f):
+      """Yields the rest of the input as (chunk, end offset) pairs, where
+      a chunk is a list of (offset, line) pairs. The offsets order the
+      lines even across resumed runs."""
+      chunk = []
+      offset = self.offset
+      for line in f:
+        chunk.append((offset, line))
+        offset += len(line)
+        if len(chunk) == CHUNK_SIZE:
+          yield chunk, offset
+          chunk = []
+      if chunk:
+        yield chunk, offset
+
+
+    def scan(self):
+      with open(self.input_path, "rb") as f:
+        f.seek(self.offset)
+        pool = None
+        if self.workers > 1:
+          pool = multiprocessing.Pool(self.workers)
+          results = self.imap(pool, self.tasks(f))
+        else:
+          results = map(self.verifier.verify_task, self.tasks(f))
+
+        try:
+          since_checkpoint = 0
+          for statuses, grades, offset in results:
+            self.merge(statuses, grades)
+            self.offset = offset
+            since_checkpoint += sum(statuses.values())
+            if since_checkpoint >= self.checkpoint_every:
+              since_checkpoint = 0
+              self.save_checkpoint()
+              self.report()
+        finally:
+          if pool is not None:
+            pool.terminate()
+
+
+    def imap(self, pool, tasks):
+      """Like pool.imap(), but only reads a few tasks ahead of the
+      workers, rather than the whole input into memory."""
+      pending = collections.deque()
+      for task in tasks:
+        pending.append(pool.apply_async(self.verifier.verify_task, (task,)))
+        if len(pending) >= self.workers * TASKS_PER_WORKER:
+          yield pending.popleft().get()
+      while pending:
+        yield pending.popleft().get()
+
+
+    def merge(self, statuses, grades):
+      self.statuses.update(statuses)
+      self.records += sum(statuses.values())
+      for user_id, usage_id, order, level in grades:
+        key = (user_id, usage_id)
+        current = self.latest.get(key, None)
+        if current is None or tuple(current[0]) < order:
+          self.latest[key] = (order, level)
+
+
+    def publish(self):
+      keys = sorted(self.latest)
+      for i in range(self.published, len(keys)):
+        user_id, usage_id = keys[i]
+        self.publisher.publish(user_id, usage_id,
+                               scaled_grade(self.latest[keys[i]][1]))
+        self.published = i + 1
+        if self.published % self.checkpoint_every == 0:
+          self.save_checkpoint()
+      self.publisher.close()
+      self.save_checkpoint()
+
+
+    def load_checkpoint(self):
+      if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+        return
+      with open(self.checkpoint_path) as f:
+        state = json.load(f)
+      if state["input"] != os.path.abspath(self.input_path):
+        raise ValueError("%s is a checkpoint for %s" % (
+            self.checkpoint_path, state["input"]))
+
+      self.offset = state["offset"]
+      self.records = state["records"]
+      self.statuses = collections.Counter(state["statuses"])
+      self.latest = dict(((user_id, usage_id), (tuple(order), level))
+                         for user_id, usage_id, order, level
+                         in state["latest"])
+      self.scanned = state["scanned"]
+      self.published = state["published"]
+      print("Resuming from %s: %d records read, %d grades published." % (
+          self.checkpoint_path, self.records, self.published), file=self.log)
+
+
+    def save_checkpoint(self):
+      if not self.checkpoint_path or self.dry_run:
+        return
+      state = {
+        "input": os.path.abspath(self.input_path),
+        "offset": self.offset,
+        "records": self.records,
+        "statuses": dict(self.statuses),
+        "latest": [[user_id, usage_id, list(order), level]
+                   for (user_id, usage_id), (order, level)
+                   in self.latest.items()],
+        "scanned": self.scanned,
+        "published": self.published,
+      }
+      # Write it next to the old one and swap, so that a crash can't
+      # leave half a checkpoint behind.
+      temporary = self.checkpoint_path + ".tmp"
+      with open(temporary, "w") as f:
+        json.dump(state, f)
+      os.replace(temporary, self.checkpoint_path)
+
+
+    def report(self):
+      """Prints the progress so far, and the throughput."""
+      elapsed = time.perf_counter() - self.started
+      print("%d records verified, %d grades, %d published in %.1fs "
+            "(%.0f records/s). %s" % (
+                self.records, len(self.latest), self.published, elapsed,
+                self.records / elapsed if elapsed else 0,
+                ", ".join("%s: %d" % item
+                          for item in sorted(self.statuses.items()))),
+            file=self.log)
+
+
+    def summary(self):
+      return { "records": self.records, "statuses": dict(self.statuses),
+               "grades": len(self.latest),
+               "published": 0 if self.dry_run else self.published }
+
+
+def load_blocks(path):
+  with open(path) as f:
+    blocks = json.load(f)
+  for block in blocks:
+    for name in ("usage_id", "module_id", "shared_key"):
+      if not isinstance(block.get(name, None), str):
+        raise ValueError("Every block needs a %s string: %r" % (name, block))
+  return blocks
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description="Backfills review grades from an export of signed "
+                  "mastery messages.")
+  parser.add_argument("input", help="The JSONL export of mastery messages.")
+  parser.add_argument("--blocks", required=True,
+                      help="A JSON list of the review blocks to fill in, "
+                           "with their usage_id, module_id and shared_key.")
+  parser.add_argument("--workers", type=int, default=None,
+                      help="Verifying processes (default: one per CPU).")
+  parser.add_argument("--checkpoint",
+                      help="Where to keep progress, to resume from.")
+  parser.add_argument("--checkpoint-every", type=int, default=100000,
+                      help="Records (or grades) between checkpoints.")
+  parser.add_argument("--dry-run", action="store_true",
+                      help="Verify everything, but publish nothing.")
+  parser.add_argument("--publisher",
+                      help="A package.module:factory that creates the "
+                           "publisher (default: JSON lines).")
+  parser.add_argument("--output",
+                      help="Where the default publisher appends the grade "
+                           "events (default: stdout).")
+  args = parser.parse_args(argv)
+
+  publisher = None
+  if not args.dry_run:
+    publisher = (load_publisher(args.publisher, args) if args.publisher
+                 else default_publisher(args))
+  backfill = Backfill(load_blocks(args.blocks), args.input,
+                      checkpoint_path=args.checkpoint,
+                      checkpoint_every=args.checkpoint_every,
+                      workers=args.workers, dry_run=args.dry_run,
+                      publisher=publisher)
+  summary = backfill.run()
+  return 0 if summary["records"] else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,185 @@
+"""This file contains a unit test for the grade backfill."""
+
+from __future__ import absolute_import
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from . import backfill
+from .backfill import Backfill, main
+from .signing import signer
+
+
+BLOCKS = [
+  {"usage_id": "block-a", "module_id": "algebra/multiplication",
+   "shared_key": "key"},
+  {"usage_id": "block-b", "module_id": "geometry/lines_rays",
+   "shared_key": "key"},
+  {"usage_id": "block-c", "module_id": "algebra/multiplication",
+   "shared_key": "other key"},
+]
+
+
+class FakePublisher(object):
+  def __init__(self, fail_after=None):
+    self.grades = []
+    self.fail_after = fail_after
+    self.closed = False
+
+
+  def publish(self, user_id, usage_id, grade):
+    if self.fail_after is not None and len(self.grades) >= self.fail_after:
+      raise IOError("The LMS is down again")
+    self.grades.append((user_id, usage_id, grade))
+
+
+  def close(self):
+    self.closed = True
+
+
+class BackfillTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.input_path = self.path("messages.jsonl")
+    self.checkpoint_path = self.path("checkpoint.json")
+
+    lines = [
+      # Older than the next one, whatever the order in the file.
+      dict(signer.mastery_message("key", "u1",
+                                  {"algebra/multiplication": 0.7}),
+           timestamp=200),
+      dict(signer.mastery_message("key", "u1",
+                                  {"algebra/multiplication": 0.35}),
+           timestamp=100),
+      # Counts for both of the blocks with this key.
+      signer.mastery_message("key", "u2", {"algebra/multiplication": 0.07,
+                                           "geometry/lines_rays": 0.35},
+                             version=2),
+      signer.mastery_message("other key", "u2",
+                             {"algebra/multiplication": 0.14}),
+      signer.mastery_message("wrong key", "u3",
+                             {"algebra/multiplication": 0.7}),
+      signer.mastery_message("key", "u3", {"trigonometry/sines": 0.7}),
+      {"mastery": {"algebra/multiplication": "x"}, "user_id": "u3",
+       "signature": "asdf"},
+    ]
+    with open(self.input_path, "w") as f:
+      for line in lines:
+        f.write(json.dumps(line) + "\n")
+      f.write("not json\n\n")
+
+
+  def path(self, name):
+    return os.path.join(self.directory, name)
+
+
+  def run_backfill(self, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("publisher", FakePublisher())
+    runner = Backfill(BLOCKS, self.input_path, log=io.StringIO(), **kwargs)
+    return runner, runner.run()
+
+
+  def assert_all_published(self, grades):
+    self.assertEqual(sorted(grades), [
+      ("u1", "block-a", 1.0),
+      ("u2", "block-a", 0.07 / 0.7),
+      ("u2", "block-b", 0.5),
+      ("u2", "block-c", 0.14 / 0.7),
+    ])
+
+
+  def test_backfill(self):
+    runner, summary = self.run_backfill()
+    self.assert_all_published(runner.publisher.grades)
+    self.assertTrue(runner.publisher.closed)
+    self.assertEqual(summary, {
+      "records": 8,
+      "statuses": {"ok": 4, "invalid_signature": 1, "unknown_module": 1,
+                   "bad_request": 2},
+      "grades": 4,
+      "published": 4})
+
+
+  def test_workers(self):
+    runner, summary = self.run_backfill(workers=2)
+    self.assert_all_published(runner.publisher.grades)
+    self.assertEqual(summary["records"], 8)
+
+
+  def test_dry_run(self):
+    runner, summary = self.run_backfill(dry_run=True,
+                                        checkpoint_path=self.checkpoint_path)
+    self.assertEqual(runner.publisher.grades, [])
+    self.assertEqual(summary["grades"], 4)
+    self.assertEqual(summary["published"], 0)
+    self.assertFalse(os.path.exists(self.checkpoint_path))
+
+
+  def test_resume_scan(self):
+    calls = []
+    merge = Backfill.merge
+    def merge_once(runner, statuses, grades):
+      if calls:
+        raise KeyboardInterrupt()
+      calls.append(1)
+      merge(runner, statuses, grades)
+
+    with patch.object(backfill, "CHUNK_SIZE", 3):
+      with patch.object(Backfill, "merge", merge_once):
+        with self.assertRaises(KeyboardInterrupt):
+          self.run_backfill(checkpoint_path=self.checkpoint_path,
+                            checkpoint_every=1)
+
+      runner, summary = self.run_backfill(
+          checkpoint_path=self.checkpoint_path, checkpoint_every=1)
+    self.assert_all_published(runner.publisher.grades)
+    self.assertEqual(summary["records"], 8)
+
+
+  def test_resume_publishing(self):
+    publisher = FakePublisher(fail_after=3)
+    with self.assertRaises(IOError):
+      self.run_backfill(checkpoint_path=self.checkpoint_path,
+                        checkpoint_every=1, publisher=publisher)
+
+    runner, summary = self.run_backfill(
+        checkpoint_path=self.checkpoint_path, checkpoint_every=1)
+    self.assert_all_published(publisher.grades + runner.publisher.grades)
+    self.assertEqual(len(runner.publisher.grades), 1)
+    self.assertEqual(summary["records"], 8)
+
+
+  def test_checkpoint_for_another_input(self):
+    self.run_backfill(checkpoint_path=self.checkpoint_path)
+    runner = Backfill(BLOCKS, self.path("other.jsonl"),
+                      checkpoint_path=self.checkpoint_path,
+                      log=io.StringIO())
+    with self.assertRaises(ValueError):
+      runner.run()
+
+
+  def test_main(self):
+    blocks_path = self.path("blocks.json")
+    with open(blocks_path, "w") as f:
+      json.dump(BLOCKS, f)
+    output_path = self.path("grades.jsonl")
+
+    with patch("sys.stderr", io.StringIO()) as log:
+      self.assertEqual(main([self.input_path, "--blocks", blocks_path,
+                             "--workers", "1", "--output", output_path]), 0)
+    self.assertIn("8 records verified", log.getvalue())
+    with open(output_path) as f:
+      events = [json.loads(line) for line in f]
+    self.assert_all_published([(event["user_id"], event["usage_id"],
+                                event["value"]) for event in events])
+
+
+if __name__ == "__main__":
+  unittest.main()
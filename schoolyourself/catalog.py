@@ -0,0 +1,180 @@
+"""A process-wide catalog of School Yourself modules, for authoring.
+
+Instead of typing a module's ID, title and description into every
+block by hand, Studio authors search the catalog and pick a module
+from it. The catalog is a JSON list of modules, such as
+
+    [{"id": "geometry/lines_rays", "title": "Lines and rays",
+      "description": "..."}, ...]
+
+read from data/catalog.json in our package, or from the file named by
+the SCHOOLYOURSELF_CATALOG environment variable. It is loaded and
+indexed the first time anybody searches it, and shared by every block
+in the process from then on (including the workers of a server that
+forks after loading it).
+
+The index is a sorted list of (token, module) pairs, where the tokens
+are the module ID itself, the parts of the ID and the words of the
+title. A search bisects it for the range of tokens that start with a
+query word, so it only ever looks at the modules that can match.
+"""
+
+from __future__ import absolute_import
+import bisect
+import importlib.resources
+import json
+import os
+import re
+import threading
+
+
+CATALOG_ENV = "SCHOOLYOURSELF_CATALOG"
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text):
+  """Returns the lowercase words in the text, in order."""
+  return _WORD.findall(text.lower())
+
+
+class ModuleCatalog(object):
+    """The list of modules that authors can choose from, with an index
+    for type-ahead search.
+
+    All methods are safe to call from multiple threads. The catalog is
+    only loaded once; the other threads wait for it under the lock.
+    """
+
+    def __init__(self, path=None, package=__package__,
+                 resource="data/catalog.json"):
+      self.path = path
+      self.package = package
+      self.resource = resource
+      self._modules = None  # Module ID -> module dict
+      self._keys = None  # Sorted tokens...
+      self._postings = None  # ...and the module ID for each of them.
+      self._tokens = None  # Module ID -> tokens
+      self._ids = None  # Lowercase module ID -> module ID
+      self._lock = threading.Lock()
+
+
+    def _load(self):
+      if self._modules is not None:
+        return
+
+      with self._lock:
+        if self._modules is None:
+          self._index(self._read())
+
+
+    def _read(self):
+      path = self.path or os.environ.get(CATALOG_ENV, None)
+      if path:
+        with open(path, "rb") as f:
+          contents = f.read()
+      else:
+        contents = importlib.resources.files(self.package).joinpath(
+            self.resource).read_bytes()
+      return json.loads(contents.decode("utf8"))
+
+
+    def _index(self, entries):
+      # Called with the lock held. The attributes are only assigned
+      # once everything is built, since _load() checks them without it.
+      modules = {}
+      tokens = {}
+      ids = {}
+      pairs = []
+      for entry in entries:
+        module = { "id": entry["id"],
+                   "title": entry.get("title", ""),
+                   "description": entry.get("description", "") }
+        module_id = module["id"]
+        if module_id in modules:
+          continue
+        modules[module_id] = module
+        ids.setdefault(module_id.lower(), module_id)
+
+        words = set(tokenize(module_id) + tokenize(module["title"]))
+        words.add(module_id.lower())
+        tokens[module_id] = tuple(words)
+        pairs.extend((word, module_id) for word in words)
+
+      pairs.sort()
+      self._keys = [pair[0] for pair in pairs]
+      self._postings = [pair[1] for pair in pairs]
+      self._tokens = tokens
+      self._ids = ids
+      self._modules = modules
+
+
+    def get(self, module_id):
+      """Returns the module with the given ID, or None."""
+      self._load()
+      return self._modules.get(module_id, None)
+
+
+    def search(self, query, limit=10):
+      """Returns up to limit modules that match every word of the query,
+      as a list of dicts with "id", "title" and "description" keys.
+
+      A query word matches a module if it is a prefix of a word in the
+      module's ID or title, or of the whole ID. A module whose ID is
+      exactly the query comes first; the rest are ordered by the
+      matching word and then by ID.
+      """
+      self._load()
+      query = query.strip().lower()
+      words = tokenize(query)
+      # Words with a slash can also be the start of a whole ID, such as
+      # "algebra/multi".
+      words.extend(chunk for chunk in query.split() if "/" in chunk)
+      if not words or limit <= 0:
+        return []
+
+      # Walk the narrowest range, and check the other words against
+      # each module's tokens.
+      ranges = []
+      for word in words:
+        start = bisect.bisect_left(self._keys, word)
+        end = bisect.bisect_left(self._keys, word + "\uffff", start)
+        ranges.append((end - start, start, end, word))
+      ranges.sort()
+      _, start, end, word = ranges[0]
+      others = [other for _, _, _, other in ranges[1:]
+                if not word.startswith(other)]
+
+      results = []
+      exact = self._ids.get(query, None)
+      if exact is not None:
+        results.append(self._modules[exact])
+
+      seen = set(module["id"] for module in results)
+      for i in range(start, end):
+        if len(results) >= limit:
+          break
+        module_id = self._postings[i]
+        if module_id in seen:
+          continue
+        seen.add(module_id)
+        tokens = self._tokens[module_id]
+        if all(any(token.startswith(other) for token in tokens)
+               for other in others):
+          results.append(self._modules[module_id])
+      return [dict(module) for module in results[:limit]]
+
+
+    def __len__(self):
+      self._load()
+      return len(self._modules)
+
+
+    def reload(self):
+      """Forgets the loaded catalog, so that the next lookup reads it
+      again (from a new path, for example)."""
+      with self._lock:
+        self._modules = None
+
+
+catalog = ModuleCatalog()
@@ -0,0 +1,365 @@
+"""This file contains a unit test for the module catalog and the Studio
+handlers that use it."""
+
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from webob import Request
+from xblock.core import XBlock
+from xblock.exceptions import NoSuchUsage
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+from xblock.test.toy_runtime import TOYRUNTIME_KVS, ToyRuntime
+
+from . import schoolyourself
+from .catalog import CATALOG_ENV, ModuleCatalog, tokenize
+from .course_config_test import FakeUsageKey
+from .render_cache import render_cache
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+MODULES = [
+  {"id": "geometry/lines_rays", "title": "Lines and rays",
+   "description": "Points, lines and rays"},
+  {"id": "geometry/angles", "title": "Angles", "description": ""},
+  {"id": "algebra/multiplication", "title": "Multiplication",
+   "description": "Multiplying positive numbers, in any order"},
+  {"id": "algebra/multiplication_negative",
+   "title": "Multiplying negative numbers", "description": ""},
+]
+
+
+def post(handler, data):
+  response = handler(Request.blank("/", method="POST",
+                                   body=json.dumps(data).encode("utf8")))
+  return json.loads(response.body.decode("utf8"))
+
+
+class ModuleCatalogTest(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    self.path = os.path.join(directory, "catalog.json")
+    with open(self.path, "w") as f:
+      json.dump(MODULES, f)
+    self.catalog = ModuleCatalog(path=self.path)
+
+
+  def search_ids(self, query, limit=10):
+    return [module["id"] for module in self.catalog.search(query, limit)]
+
+
+  def test_tokenize(self):
+    self.assertEqual(tokenize("geometry/Lines_rays"),
+                     ["geometry", "lines", "rays"])
+
+
+  def test_search(self):
+    self.assertEqual(self.search_ids("mult"),
+                     ["algebra/multiplication",
+                      "algebra/multiplication_negative"])
+    self.assertEqual(self.search_ids("Multiplying neg"),
+                     ["algebra/multiplication_negative"])
+    self.assertEqual(self.search_ids("rays geo"), ["geometry/lines_rays"])
+    self.assertEqual(self.search_ids("algebra/multiplication_n"),
+                     ["algebra/multiplication_negative"])
+    self.assertEqual(self.search_ids("mult", limit=1),
+                     ["algebra/multiplication"])
+    self.assertEqual(self.search_ids("trigonometry"), [])
+    self.assertEqual(self.search_ids(" "), [])
+
+
+  def test_exact_id_comes_first(self):
+    self.assertEqual(self.search_ids("Geometry/Angles")[0], "geometry/angles")
+    self.assertEqual(self.search_ids("geometry")[0], "geometry/angles")
+
+
+  def test_get(self):
+    self.assertEqual(self.catalog.get("geometry/angles")["title"], "Angles")
+    self.assertEqual(self.catalog.get("geometry/nope"), None)
+    self.assertEqual(len(self.catalog), 4)
+
+
+  def test_loaded_once(self):
+    self.catalog.search("mult")
+    with patch.object(self.catalog, "_read") as read:
+      self.catalog.search("geo")
+      self.assertFalse(read.called)
+
+    self.catalog.reload()
+    with patch.object(self.catalog, "_read", return_value=[]) as read:
+      self.assertEqual(self.catalog.search("geo"), [])
+      self.assertTrue(read.called)
+
+
+  def test_environment_and_bundled_catalog(self):
+    with patch.dict(os.environ, {CATALOG_ENV: self.path}):
+      self.assertEqual(len(ModuleCatalog()), 4)
+
+    with patch.dict(os.environ, {CATALOG_ENV: ""}):
+      bundled = ModuleCatalog()
+      self.assertEqual(bundled.get("algebra/multiplication")["title"],
+                       "Multiplication")
+
+
+class CatalogHandlerTest(unittest.TestCase):
+  def setUp(self):
+    render_cache.clear()
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, "catalog.json")
+    with open(path, "w") as f:
+      json.dump(MODULES, f)
+    patcher = patch.object(schoolyourself, "catalog", ModuleCatalog(path))
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+    self.runtime = Mock()
+    self.block = SchoolYourselfReviewXBlock(self.runtime, DictFieldData({}),
+                                            ScopeIds("foo", "bar", "baz", "x"))
+    self.lesson = SchoolYourselfLessonXBlock(
+        self.runtime, DictFieldData({}), ScopeIds("foo", "bar", "lesson", "y"))
+    self.lesson.save = Mock()
+    self.other_course = SchoolYourselfLessonXBlock(
+        self.runtime, DictFieldData({}),
+        ScopeIds("foo", "bar", "lesson",
+                 FakeUsageKey("v", "course-v1:SY+Geometry+2026")))
+    self.blocks = {"y": self.lesson, "z": Mock(), "v": self.other_course}
+    self.runtime.get_block.side_effect = self.get_block
+
+
+  def get_block(self, usage_id):
+    if usage_id not in self.blocks:
+      raise NoSuchUsage(repr(usage_id))
+    return self.blocks[usage_id]
+
+
+  def test_catalog_search(self):
+    response = post(self.block.catalog_search, {"query": "lines"})
+    self.assertEqual(response["modules"], [MODULES[0]])
+
+    response = post(self.block.catalog_search, {"query": "a", "limit": 1000})
+    self.assertEqual(len(response["modules"]), 4)
+
+    response = post(self.block.catalog_search, {"query": "a", "limit": "x"})
+    self.assertEqual(len(response["modules"]), 4)
+
+
+  def test_catalog_apply(self):
+    self.block.save = Mock()
+    response = post(self.block.catalog_apply, {"blocks": [
+      {"usage_id": "y", "module_id": "geometry/lines_rays"},
+      {"usage_id": "x", "module_id": "geometry/angles"},
+      {"usage_id": "y", "module_id": "geometry/nope"},
+      {"usage_id": "z", "module_id": "geometry/angles"},
+      {"usage_id": "w", "module_id": "geometry/angles"},
+    ]})
+    self.assertEqual([result["status"] for result in response["results"]],
+                     ["ok", "ok", "unknown module",
+                      "not a School Yourself block", "unknown block"])
+
+    self.assertEqual(self.lesson.module_id, "geometry/lines_rays")
+    self.assertEqual(self.lesson.module_title, "Lines and rays")
+    self.assertEqual(self.lesson.module_description, "Points, lines and rays")
+    self.assertEqual(self.lesson.display_name, "Lesson: Lines and rays")
+    self.assertTrue(self.lesson.save.called)
+
+    self.assertEqual(self.block.module_id, "geometry/angles")
+    self.assertEqual(self.block.display_name, "Review: Angles")
+    self.assertTrue(self.block.save.called)
+
+
+  def test_only_this_course(self):
+    response = post(self.block.catalog_apply, {"blocks": [
+      {"usage_id": "v", "module_id": "geometry/angles"},
+    ]})
+    self.assertEqual(response["results"][0]["status"], "another course")
+    self.assertEqual(self.other_course.module_id, "intro/intro_module")
+
+    # Blocks of the same course are fine.
+    self.block.scope_ids = ScopeIds(
+        "foo", "bar", "baz", FakeUsageKey("x", "course-v1:SY+Geometry+2026"))
+    self.other_course.save = Mock()
+    response = post(self.block.catalog_apply, {"blocks": [
+      {"usage_id": "v", "module_id": "geometry/angles"},
+      {"usage_id": "y", "module_id": "geometry/angles"},
+    ]})
+    self.assertEqual([result["status"] for result in response["results"]],
+                     ["ok", "another course"])
+    self.assertEqual(self.other_course.module_id, "geometry/angles")
+
+
+  def test_bad_entries(self):
+    response = post(self.block.catalog_apply, {"blocks": [
+      "y", None, {"usage_id": ["y"], "module_id": "geometry/angles"},
+      {"usage_id": "y", "module_id": {"id": "geometry/angles"}},
+      {"usage_id": "y", "module_id": "geometry/lines_rays"},
+    ]})
+    self.assertEqual([result["status"] for result in response["results"]],
+                     ["bad entry", "bad entry", "bad entry", "bad entry",
+                      "ok"])
+    self.assertEqual(post(self.block.catalog_apply, ["y"]), {"results": []})
+    self.assertEqual(post(self.block.catalog_apply, {"blocks": "y"}),
+                     {"results": []})
+
+
+class InvalidKey(Exception):
+  pass
+
+
+class ItemNotFound(Exception):
+  pass
+
+
+def parse_usage_key(usage_id):
+  """Parses "block-v1:ORG+COURSE+RUN+type@...+block@..." usage IDs,
+  enough for the course to be found from them."""
+  if not usage_id.startswith("block-v1:") or "+type@" not in usage_id:
+    raise InvalidKey(usage_id)
+  course = usage_id[len("block-v1:"):].split("+type@")[0]
+  return FakeUsageKey(usage_id, "course-v1:" + course)
+
+
+def usage_id(course, block_type, name):
+  return "block-v1:%s+type@%s+block@%s" % (course, block_type, name)
+
+
+class FakeModulestore(object):
+  """The parts of Studio's modulestore that catalog_apply() uses."""
+  def __init__(self, blocks):
+    self.blocks = blocks
+    self.updated = []
+
+  def get_item(self, usage_key):
+    if usage_key not in self.blocks:
+      raise ItemNotFound(usage_key)
+    return self.blocks[usage_key]
+
+  def update_item(self, block, user_id):
+    self.updated.append((block, user_id))
+
+
+class StudioCatalogApplyTest(unittest.TestCase):
+  """Runs catalog_apply with usage keys and a modulestore, like Studio."""
+
+  def setUp(self):
+    render_cache.clear()
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, "catalog.json")
+    with open(path, "w") as f:
+      json.dump(MODULES, f)
+
+    self.runtime = Mock()
+    user = self.runtime.service.return_value.get_current_user.return_value
+    user.opt_attrs = {"edx-platform.user_id": 7}
+    self.block = self.make_block(SchoolYourselfReviewXBlock, "SY+Algebra+2026",
+                                 "schoolyourself_review", "review")
+    self.lesson = self.make_block(SchoolYourselfLessonXBlock,
+                                  "SY+Algebra+2026", "schoolyourself_lesson",
+                                  "lesson")
+    self.other_course = self.make_block(
+        SchoolYourselfLessonXBlock, "SY+Geometry+2026",
+        "schoolyourself_lesson", "lesson")
+    self.store = FakeModulestore(dict(
+        (block.scope_ids.usage_id, block)
+        for block in [self.block, self.lesson, self.other_course]))
+
+    for name, value in [("catalog", ModuleCatalog(path)),
+                        ("UsageKey", Mock(from_string=parse_usage_key)),
+                        ("modulestore", lambda: self.store),
+                        ("BLOCK_LOOKUP_ERRORS",
+                         (NoSuchUsage, InvalidKey, ItemNotFound))]:
+      patcher = patch.object(schoolyourself, name, value)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+
+  def make_block(self, block_class, course, block_type, name):
+    return block_class(self.runtime, DictFieldData({}),
+                       ScopeIds("student", block_type, name, parse_usage_key(
+                           usage_id(course, block_type, name))))
+
+
+  def test_written_back_to_the_modulestore(self):
+    lesson_id = usage_id("SY+Algebra+2026", "schoolyourself_lesson", "lesson")
+    response = post(self.block.catalog_apply, {"blocks": [
+      {"usage_id": lesson_id, "module_id": "geometry/lines_rays"},
+      {"usage_id": str(self.block.scope_ids.usage_id),
+       "module_id": "geometry/angles"},
+      {"usage_id": usage_id("SY+Geometry+2026", "schoolyourself_lesson",
+                            "lesson"), "module_id": "geometry/angles"},
+      {"usage_id": usage_id("SY+Algebra+2026", "schoolyourself_lesson",
+                            "nope"), "module_id": "geometry/angles"},
+      {"usage_id": "lesson", "module_id": "geometry/angles"},
+    ]})
+    self.assertEqual([result["status"] for result in response["results"]],
+                     ["ok", "ok", "another course", "unknown block",
+                      "unknown block"])
+
+    self.assertEqual(self.lesson.module_id, "geometry/lines_rays")
+    self.assertEqual(self.block.module_id, "geometry/angles")
+    self.assertEqual(self.other_course.module_id, "intro/intro_module")
+    # Studio saves the block whose handler ran; the rest are up to us.
+    self.assertEqual(self.store.updated, [(self.lesson, 7)])
+    self.assertFalse(self.runtime.get_block.called)
+
+
+class CatalogApplyPersistenceTest(unittest.TestCase):
+  """Runs catalog_apply in a runtime that keeps the fields in a
+  key-value store, like the workbench, and reads the blocks back from a
+  fresh runtime."""
+
+  def setUp(self):
+    render_cache.clear()
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, "catalog.json")
+    with open(path, "w") as f:
+      json.dump(MODULES, f)
+    patcher = patch.object(schoolyourself, "catalog", ModuleCatalog(path))
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.addCleanup(TOYRUNTIME_KVS.clear)
+
+
+  def create_block(self, runtime, block_type):
+    def_id = runtime.id_generator.create_definition(block_type)
+    return runtime.id_generator.create_usage(def_id)
+
+
+  @XBlock.register_temp_plugin(SchoolYourselfLessonXBlock,
+                               "schoolyourself_lesson")
+  @XBlock.register_temp_plugin(SchoolYourselfReviewXBlock,
+                               "schoolyourself_review")
+  def test_changes_are_stored(self):
+    runtime = ToyRuntime("staff")
+    review_id = self.create_block(runtime, "schoolyourself_review")
+    lesson_id = self.create_block(runtime, "schoolyourself_lesson")
+
+    review = runtime.get_block(review_id)
+    response = post(review.catalog_apply, {"blocks": [
+      {"usage_id": review_id, "module_id": "geometry/angles"},
+      {"usage_id": lesson_id, "module_id": "geometry/lines_rays"},
+    ]})
+    self.assertEqual([result["status"] for result in response["results"]],
+                     ["ok", "ok"])
+
+    fresh = ToyRuntime("staff")
+    review = fresh.get_block(review_id)
+    self.assertEqual(review.module_id, "geometry/angles")
+    self.assertEqual(review.display_name, "Review: Angles")
+    lesson = fresh.get_block(lesson_id)
+    self.assertEqual(lesson.module_id, "geometry/lines_rays")
+    self.assertEqual(lesson.module_title, "Lines and rays")
+    self.assertEqual(lesson.display_name, "Lesson: Lines and rays")
+
+
+if __name__ == "__main__":
+  unittest.main()
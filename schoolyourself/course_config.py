@@ -0,0 +1,106 @@
+"""Course-level School Yourself configuration, shared by every block.
+
+The base URL, shared key and partner ID are fields of every lesson and
+review block, so every render and every grade verification reads them
+from the field data, and rotating the shared key means editing every
+block in the course. Instead, they can be set once in the runtime's
+XBlock settings (XBLOCK_SETTINGS in the LMS and Studio):
+
+    XBLOCK_SETTINGS = {
+      "SchoolYourself": {
+        "base_url": "https://schoolyourself.org",
+        "shared_key": "...",
+        "partner_id": "edx",
+        "courses": {
+          "course-v1:SchoolYourself+Algebra+2026": {"shared_key": "..."},
+        },
+      },
+    }
+
+The values at the top apply to every course, and the ones under
+"courses" to that course only, on top of them. Whatever neither of
+them sets still comes from the block's own fields, so courses that
+don't use this keep working as they are.
+
+A course's configuration is resolved the first time one of its blocks
+needs it, and shared by every block in the process from then on. Call
+course_config.invalidate() after changing the settings of a running
+process.
+"""
+
+from __future__ import absolute_import
+import collections
+import threading
+
+
+# The block fields that the course configuration can set.
+CONFIG_FIELDS = ("base_url", "shared_key", "partner_id")
+
+
+def resolve_config(bucket, course_id=None):
+  """Returns the {field: value} configuration of a course, from the
+  School Yourself settings bucket described above. Only the fields in
+  CONFIG_FIELDS that are set to strings are included."""
+  if not isinstance(bucket, dict):
+    return {}
+
+  config = {}
+  courses = bucket.get("courses", None)
+  course = courses.get(course_id, None) if isinstance(courses, dict) else None
+  for values in (bucket, course):
+    if not isinstance(values, dict):
+      continue
+    for name in CONFIG_FIELDS:
+      value = values.get(name, None)
+      if isinstance(value, str):
+        config[name] = value
+  return config
+
+
+class CourseConfigCache(object):
+    """Maps a course ID to its resolved configuration.
+
+    The least recently used courses are dropped once there are more
+    than max_courses of them. All methods are safe to call from
+    multiple threads.
+    """
+
+    def __init__(self, max_courses=1000):
+      self.max_courses = max_courses
+      self._courses = collections.OrderedDict()  # Course ID -> config
+      self._lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+
+
+    def get(self, course_id, load):
+      """Returns the configuration of the course, calling load() to
+      resolve it if it isn't cached yet."""
+      with self._lock:
+        config = self._courses.get(course_id, None)
+        if config is not None:
+          self._courses.move_to_end(course_id)
+          self.hits += 1
+          return config
+        self.misses += 1
+
+      # Two threads may both load the same course; they get the same
+      # answer, so that's harmless.
+      config = load()
+      with self._lock:
+        self._courses[course_id] = config
+        if len(self._courses) > self.max_courses:
+          self._courses.popitem(last=False)
+      return config
+
+
+    def invalidate(self, course_id=None):
+      """Forgets one course's configuration, or every course's."""
+      with self._lock:
+        if course_id is None:
+          self._courses.clear()
+        else:
+          self._courses.pop(course_id, None)
+
+
+course_config = CourseConfigCache()
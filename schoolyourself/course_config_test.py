@@ -0,0 +1,190 @@
+"""This file contains unit tests for the course-level configuration and
+the blocks that use it."""
+
+from __future__ import absolute_import
+import unittest
+
+from mock import Mock
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from .course_config import CourseConfigCache, course_config, resolve_config
+from .render_cache import render_cache
+from .replay_cache import replay_cache
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+from .signing import signer
+
+
+SETTINGS = {
+  "base_url": "https://sy.example.com",
+  "shared_key": "course key",
+  "courses": {
+    "course-v1:SY+Algebra+2026": {"shared_key": "algebra key",
+                                  "partner_id": "algebra"},
+    "course-v1:SY+Broken+2026": "not a dict",
+  },
+}
+
+
+class FakeUsageKey(str):
+  """A usage ID that knows its course, like the LMS's usage keys."""
+  def __new__(cls, usage_id, course_key):
+    key = str.__new__(cls, usage_id)
+    key.course_key = course_key
+    return key
+
+
+class ResolveConfigTest(unittest.TestCase):
+  def test_resolve(self):
+    self.assertEqual(resolve_config(SETTINGS), {
+      "base_url": "https://sy.example.com", "shared_key": "course key"})
+    self.assertEqual(resolve_config(SETTINGS, "course-v1:SY+Algebra+2026"), {
+      "base_url": "https://sy.example.com", "shared_key": "algebra key",
+      "partner_id": "algebra"})
+    self.assertEqual(resolve_config(SETTINGS, "course-v1:SY+Broken+2026"),
+                     resolve_config(SETTINGS))
+
+
+  def test_ignores_anything_else(self):
+    self.assertEqual(resolve_config(None), {})
+    self.assertEqual(resolve_config(Mock()), {})
+    self.assertEqual(resolve_config({"shared_key": 5, "module_id": "x",
+                                     "courses": []}), {})
+
+
+class CourseConfigCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = CourseConfigCache(max_courses=2)
+    self.load = Mock(side_effect=lambda: {"shared_key": "key"})
+
+
+  def test_loaded_once(self):
+    self.assertEqual(self.cache.get("a", self.load), {"shared_key": "key"})
+    self.assertEqual(self.cache.get("a", self.load), {"shared_key": "key"})
+    self.assertEqual(self.load.call_count, 1)
+    self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+
+  def test_lru(self):
+    self.cache.get("a", self.load)
+    self.cache.get("b", self.load)
+    self.cache.get("a", self.load)
+    self.cache.get("c", self.load)
+    self.cache.get("a", self.load)
+    self.assertEqual(self.load.call_count, 3)
+    self.cache.get("b", self.load)
+    self.assertEqual(self.load.call_count, 4)
+
+
+  def test_invalidate(self):
+    self.cache.get("a", self.load)
+    self.cache.get("b", self.load)
+    self.cache.invalidate("a")
+    self.cache.get("b", self.load)
+    self.assertEqual(self.load.call_count, 2)
+    self.cache.get("a", self.load)
+    self.assertEqual(self.load.call_count, 3)
+
+    self.cache.invalidate()
+    self.cache.get("a", self.load)
+    self.cache.get("b", self.load)
+    self.assertEqual(self.load.call_count, 5)
+
+
+class CourseConfigBlockTest(unittest.TestCase):
+  def setUp(self):
+    render_cache.clear()
+    replay_cache.clear()
+    course_config.invalidate()
+    self.addCleanup(course_config.invalidate)
+
+    self.runtime = Mock()
+    self.runtime.handler_url.return_value = "/handler/mastery"
+    self.runtime.local_resource_url.return_value = "/icon.png"
+    self.settings = self.runtime.service.return_value
+    self.settings.get_settings_bucket.return_value = SETTINGS
+
+
+  def make_block(self, block_class, course_key, **fields):
+    return block_class(self.runtime, DictFieldData(fields),
+                       ScopeIds("foo", "bar", "x",
+                                FakeUsageKey("x", course_key)))
+
+
+  def test_course_values_win(self):
+    block = self.make_block(SchoolYourselfReviewXBlock,
+                            "course-v1:SY+Algebra+2026",
+                            shared_key="block key", partner_id="block")
+    self.assertEqual(block.get_shared_key(), "algebra key")
+    self.assertEqual(block.get_partner_id(), "algebra")
+    self.assertEqual(block.get_base_url(), "https://sy.example.com")
+
+    # Anything the course doesn't set comes from the block.
+    block = self.make_block(SchoolYourselfReviewXBlock,
+                            "course-v1:SY+Other+2026", partner_id="block")
+    self.assertEqual(block.get_shared_key(), "course key")
+    self.assertEqual(block.get_partner_id(), "block")
+
+    self.runtime.service.assert_called_with(block, "settings")
+
+
+  def test_block_fields_without_settings(self):
+    self.settings.get_settings_bucket.return_value = None
+    block = self.make_block(SchoolYourselfLessonXBlock, None,
+                            shared_key="block key")
+    self.assertEqual(block.get_shared_key(), "block key")
+    self.assertEqual(block.get_base_url(), "https://schoolyourself.org")
+    self.assertEqual(block.get_partner_id(), "edx")
+
+
+  def test_resolved_once_per_course(self):
+    for i in range(3):
+      block = self.make_block(SchoolYourselfLessonXBlock,
+                              "course-v1:SY+Algebra+2026")
+      block.student_view()
+      block.get_shared_key()
+    self.assertEqual(self.settings.get_settings_bucket.call_count, 1)
+
+    course_config.invalidate("course-v1:SY+Algebra+2026")
+    self.settings.get_settings_bucket.return_value = {"shared_key": "new"}
+    self.assertEqual(block.get_shared_key(), "new")
+
+
+  def test_grades_and_views_use_course_values(self):
+    block = self.make_block(SchoolYourselfReviewXBlock,
+                            "course-v1:SY+Algebra+2026",
+                            module_id="algebra/multiplication",
+                            shared_key="block key")
+    self.assertEqual(block.handle_grade_json(signer.mastery_message(
+        "algebra key", "debug", {"algebra/multiplication": 0.7})), 1.0)
+    self.assertEqual(block.handle_grade_json(signer.mastery_message(
+        "block key", "debug", {"algebra/multiplication": 0.35})),
+                     "invalid_signature")
+
+    html = block.student_view().body_html()
+    self.assertIn("https://sy.example.com/review/embed?", html)
+    self.assertIn("partner=algebra", html)
+    self.assertIn("partner_signature=%s" % signer.partner_signature(
+        "algebra key", "debug"), html)
+
+
+  def test_studio(self):
+    block = self.make_block(SchoolYourselfLessonXBlock,
+                            "course-v1:SY+Algebra+2026",
+                            shared_key="block key", base_url="http://old")
+    html = block.studio_view().body_html()
+    self.assertNotIn("block key", html)
+    self.assertIn("Set for the whole course", html)
+
+    block.studio_submit.__wrapped__(block, {
+      "module_id": "geometry/lines_rays", "shared_key": "typed key",
+      "base_url": "http://typed", "partner_id": "typed"})
+    self.assertEqual(block.module_id, "geometry/lines_rays")
+    self.assertEqual(block.shared_key, "block key")
+    self.assertEqual(block.base_url, "http://old")
+    self.assertEqual(block.partner_id, "edx")
+
+
+if __name__ == "__main__":
+  unittest.main()
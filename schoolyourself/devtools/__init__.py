@@ -0,0 +1,3 @@
+"""Tools for running the School Yourself XBlocks locally: a stand-in for
+the School Yourself server (mock_server) and a load generator that
+drives simulated students against a workbench (loadgen)."""
@@ -0,0 +1,309 @@
+"""A load generator for the review block's handlers.
+
+It plays a population of simulated students against a review block in a
+running workbench (or any runtime with the same handler URLs). Each
+request either posts a signed mastery report to handle_grade, the way
+the review player's postMessage() ends up doing, or reads the student's
+mastery back from the block's mastery handler. Like the review view,
+the students revalidate the mastery they have already read with
+If-None-Match, and the 304s are reported as "not_modified".
+
+Requests are sent at a fixed rate no matter how long the earlier ones
+take, so when the handlers fall behind, that shows up as latency rather
+than as a lower request rate. Latencies are measured from when each
+request was due to go out.
+
+Usage:
+  python -m schoolyourself.devtools.loadgen --usage-id USAGE_ID \\
+      --key KEY [--url http://localhost:8000] [--students 5000] \\
+      [--rate 200] [--duration 60] [--mastery-ratio 0.1]
+
+The block's shared key has to be KEY, and for the mastery handler to
+work, its base URL has to point at a School Yourself server that knows
+the key, such as schoolyourself.devtools.mock_server.
+"""
+
+from __future__ import absolute_import, print_function
+import argparse
+import collections
+import concurrent.futures
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+
+from ..signing import signer
+
+
+# Where the workbench serves a block's handlers.
+WORKBENCH_HANDLER_URL = "{url}/handler/{usage_id}/{handler}/?student={student}"
+
+# Outcomes that are not errors.
+OK_OUTCOMES = ("ok", "not_modified")
+
+
+class SimulatedStudent(object):
+    """A student whose mastery of the module creeps up as they practice."""
+
+    def __init__(self, student_id, rng):
+      self.student_id = student_id
+      self.level = 0.0
+      self.rng = rng
+      # The ETag of the last mastery response this student got.
+      self.mastery_etag = None
+
+
+    def practice(self):
+      """Answers a question, and returns the new mastery level."""
+      step = 0.05 if self.rng.random() < 0.7 else -0.05
+      self.level = round(min(max(self.level + step, 0.0), 1.0), 2)
+      return self.level
+
+
+class Results(object):
+    """Latencies and outcomes of the requests, per handler."""
+
+    def __init__(self):
+      self.latencies = collections.defaultdict(list)  # Handler -> [secs]
+      self.outcomes = collections.Counter()  # (Handler, outcome) -> n
+      self.elapsed = 0.0
+      self._lock = threading.Lock()
+
+
+    def record(self, handler, outcome, latency):
+      with self._lock:
+        self.latencies[handler].append(latency)
+        self.outcomes[(handler, outcome)] += 1
+
+
+    def count(self, handler=None):
+      return sum(n for (name, _), n in self.outcomes.items()
+                 if handler is None or name == handler)
+
+
+    def errors(self):
+      """Returns {(handler, outcome): n} for the error outcomes."""
+      return dict((key, n) for key, n in self.outcomes.items()
+                  if key[1] not in OK_OUTCOMES)
+
+
+    def percentiles(self, handler, fractions=(0.5, 0.9, 0.99, 0.999)):
+      """Returns [(fraction, seconds)] and the maximum, for one handler."""
+      latencies = sorted(self.latencies[handler])
+      if not latencies:
+        return [], None
+      return ([(fraction, latencies[min(len(latencies) - 1,
+                                        int(fraction * len(latencies)))])
+               for fraction in fractions],
+              latencies[-1])
+
+
+    def report(self, out=sys.stdout):
+      total = self.count()
+      print("%d requests in %.1fs: %.1f/s" % (
+          total, self.elapsed, total / self.elapsed if self.elapsed else 0),
+            file=out)
+      for handler in sorted(self.latencies):
+        points, high = self.percentiles(handler)
+        print("  %-14s %7d  %s  max %.1fms" % (
+            handler, self.count(handler),
+            "  ".join("p%g %.1fms" % (fraction * 100, latency * 1000)
+                      for fraction, latency in points),
+            high * 1000), file=out)
+
+      for (handler, outcome), n in sorted(self.outcomes.items()):
+        if outcome in OK_OUTCOMES:
+          print("  %-14s %-24s %d" % (handler, outcome, n), file=out)
+
+      errors = self.errors()
+      print("errors: %d" % sum(errors.values()), file=out)
+      for (handler, outcome), n in sorted(errors.items()):
+        print("  %-14s %-24s %d" % (handler, outcome, n), file=out)
+
+
+class LoadGenerator(object):
+    """Sends requests for the simulated students at a fixed rate.
+
+    Args:
+        handler_url: A format string for a handler's URL, with {handler}
+            and {student} fields.
+        shared_key: The shared key that the block verifies grades with.
+        module_id: The module that the block is configured with.
+        students: How many students to simulate.
+        rate: Requests per second.
+        mastery_ratio: The fraction of requests that read mastery back
+            instead of posting a grade.
+        extra_tags: How many other tags each mastery report carries.
+        concurrency: The most requests that can be in flight at once.
+        message_version: The version of the signed mastery messages to
+            send (1 or 2; see signing.py).
+    """
+
+    def __init__(self, handler_url, shared_key, module_id, students=1000,
+                 rate=100.0, mastery_ratio=0.1, extra_tags=0,
+                 concurrency=32, timeout=10.0, seed=0, message_version=1):
+      self.handler_url = handler_url
+      self.shared_key = shared_key
+      self.module_id = module_id
+      self.rate = rate
+      self.mastery_ratio = mastery_ratio
+      self.extra_tags = extra_tags
+      self.concurrency = concurrency
+      self.timeout = timeout
+      self.message_version = message_version
+      self.rng = random.Random(seed)
+      self.students = [SimulatedStudent("loadgen-student-%d" % i, self.rng)
+                       for i in range(students)]
+      self._connections = threading.local()
+
+
+    def run(self, num_requests):
+      """Sends num_requests requests, and returns the Results."""
+      results = Results()
+      started = time.perf_counter()
+      with concurrent.futures.ThreadPoolExecutor(self.concurrency) as pool:
+        for i in range(num_requests):
+          due = started + i / self.rate
+          # The requests are built here, in one thread, so the students
+          # don't need any locking.
+          request = self.next_request()
+          delay = due - time.perf_counter()
+          if delay > 0:
+            time.sleep(delay)
+          pool.submit(self.send, results, due, *request)
+      results.elapsed = time.perf_counter() - started
+      return results
+
+
+    def next_request(self):
+      """Returns the (handler, student, method, url, body) of the next
+      request."""
+      student = self.rng.choice(self.students)
+      if self.rng.random() < self.mastery_ratio:
+        url = self.format_url("mastery", student.student_id)
+        return "mastery", student, "GET", url, None
+
+      mastery = dict(("loadgen/tag_%d" % i, self.rng.randint(0, 100) / 100.0)
+                     for i in range(self.extra_tags))
+      mastery[self.module_id] = student.practice()
+      message = signer.mastery_message(self.shared_key, student.student_id,
+                                       mastery, self.message_version)
+      url = self.format_url("handle_grade", student.student_id)
+      return ("handle_grade", student, "POST", url,
+              json.dumps(message).encode("utf8"))
+
+
+    def format_url(self, handler, student_id):
+      return self.handler_url.format(
+          handler=handler, student=urllib.parse.quote(student_id))
+
+
+    def send(self, results, due, handler, student, method, url, body):
+      headers = {}
+      if body:
+        headers["Content-Type"] = "application/json"
+      etag = student.mastery_etag
+      if handler == "mastery" and etag:
+        headers["If-None-Match"] = etag
+
+      try:
+        status, response_headers, response = self.request(method, url, body,
+                                                           headers)
+        if handler == "mastery" and status == 200:
+          student.mastery_etag = response_headers.get("ETag", None)
+        outcome = classify(handler, status, response)
+      except Exception as e:  # pylint: disable=broad-except
+        outcome = type(e).__name__
+      results.record(handler, outcome, time.perf_counter() - due)
+
+
+    def request(self, method, url, body, headers):
+      """Sends a request over this thread's keep-alive connection, and
+      returns the (status, headers, body)."""
+      parsed = urllib.parse.urlsplit(url)
+      connection = getattr(self._connections, "connection", None)
+      if connection is None:
+        connection_class = (http.client.HTTPSConnection
+                            if parsed.scheme == "https"
+                            else http.client.HTTPConnection)
+        connection = connection_class(parsed.netloc, timeout=self.timeout)
+        self._connections.connection = connection
+
+      path = parsed.path + ("?" + parsed.query if parsed.query else "")
+      try:
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+      except Exception:
+        connection.close()
+        self._connections.connection = None
+        raise
+
+
+def classify(handler, status, body):
+  """Turns a handler's response into an outcome: "ok", "not_modified",
+  the error that handle_grade returned (e.g. "invalid_signature"), or
+  "http_<status>"."""
+  if status == 304:
+    return "not_modified"
+  if status != 200:
+    return "http_%d" % status
+  if handler == "handle_grade":
+    try:
+      grade = json.loads(body.decode("utf8"))
+    except ValueError:
+      return "bad_response"
+    if isinstance(grade, str):
+      return grade
+  return "ok"
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description="Drives simulated students against a review block.")
+  parser.add_argument("--url", default="http://localhost:8000",
+                      help="Where the workbench is running.")
+  parser.add_argument("--usage-id", required=True,
+                      help="The review block's usage ID in the workbench.")
+  parser.add_argument("--handler-url",
+                      help="A format string for handler URLs, with {handler} "
+                           "and {student} fields, for runtimes other than "
+                           "the workbench.")
+  parser.add_argument("--key", required=True,
+                      help="The shared key configured in the block.")
+  parser.add_argument("--module-id", default="algebra/multiplication",
+                      help="The module configured in the block.")
+  parser.add_argument("--students", type=int, default=1000)
+  parser.add_argument("--rate", type=float, default=100.0,
+                      help="Requests per second.")
+  parser.add_argument("--duration", type=float, default=30.0,
+                      help="How long to run, in seconds.")
+  parser.add_argument("--mastery-ratio", type=float, default=0.1,
+                      help="The fraction of requests that read mastery.")
+  parser.add_argument("--extra-tags", type=int, default=0,
+                      help="How many other tags to put in each report.")
+  parser.add_argument("--concurrency", type=int, default=32)
+  parser.add_argument("--message-version", type=int, choices=(1, 2),
+                      default=1,
+                      help="The version of the mastery messages to send.")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args(argv)
+
+  handler_url = args.handler_url or WORKBENCH_HANDLER_URL.replace(
+      "{url}", args.url.rstrip("/")).replace("{usage_id}", args.usage_id)
+  generator = LoadGenerator(handler_url, args.key, args.module_id,
+                            students=args.students, rate=args.rate,
+                            mastery_ratio=args.mastery_ratio,
+                            extra_tags=args.extra_tags,
+                            concurrency=args.concurrency, seed=args.seed,
+                            message_version=args.message_version)
+  results = generator.run(int(args.rate * args.duration))
+  results.report()
+  return 1 if results.errors() else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,163 @@
+"""This file contains a unit test for the load generator, run against a
+review block served by a minimal stand-in for the workbench."""
+
+from __future__ import absolute_import
+import io
+import json
+import threading
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mock import Mock
+from webob import Request
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from ..mastery_cache import mastery_cache
+from ..schoolyourself_review import SchoolYourselfReviewXBlock
+from .loadgen import LoadGenerator, Results, classify
+from .mock_server import MockSchoolYourselfServer
+
+
+class FakeWorkbench(object):
+  """Serves one review block's handle_grade and mastery handlers at the
+  workbench's handler URLs. Every student shares the block, which is
+  good enough for counting responses."""
+  def __init__(self, block):
+    self.lock = threading.Lock()
+
+    workbench = self
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+      disable_nagle_algorithm = True
+
+      def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with workbench.lock:
+          result = block.handle_grade_json(json.loads(body.decode("utf8")))
+        self.respond(200, json.dumps(result).encode("utf8"))
+
+      def do_GET(self):
+        query = urllib.parse.urlparse(self.path).query
+        headers = {}
+        if "If-None-Match" in self.headers:
+          headers["If-None-Match"] = self.headers["If-None-Match"]
+        with workbench.lock:
+          response = block.mastery(Request.blank("/?" + query,
+                                                 headers=headers))
+        self.respond(response.status_int, response.body, response.etag)
+
+      def respond(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+          self.send_header("ETag", '"%s"' % etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, *args):
+        pass
+
+    self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    self.server.daemon_threads = True
+    self.handler_url = ("http://127.0.0.1:%d/handler/x/{handler}/"
+                        "?student={student}" % self.server.server_address[1])
+    thread = threading.Thread(target=self.server.serve_forever,
+                              args=(0.05,))
+    thread.daemon = True
+    thread.start()
+
+
+  def stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+
+class LoadGeneratorTest(unittest.TestCase):
+  def setUp(self):
+    self.upstream = MockSchoolYourselfServer("key").start()
+    self.addCleanup(self.upstream.stop)
+    mastery_cache.invalidate()
+    self.addCleanup(mastery_cache.invalidate)
+
+    block = SchoolYourselfReviewXBlock(Mock(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+    block.base_url = self.upstream.base_url
+    self.workbench = FakeWorkbench(block)
+    self.addCleanup(self.workbench.stop)
+
+
+  def test_run(self):
+    generator = LoadGenerator(self.workbench.handler_url, "key",
+                              "algebra/multiplication", students=10,
+                              rate=1000, mastery_ratio=0.2, extra_tags=3,
+                              concurrency=4)
+    results = generator.run(100)
+
+    self.assertEqual(results.count(), 100)
+    self.assertEqual(results.errors(), {})
+    self.assertGreater(results.count("mastery"), 0)
+    self.assertGreater(results.count("handle_grade"), 0)
+
+    out = io.StringIO()
+    results.report(out)
+    self.assertIn("100 requests", out.getvalue())
+    self.assertIn("errors: 0", out.getvalue())
+
+
+  def test_v2_messages(self):
+    generator = LoadGenerator(self.workbench.handler_url, "key",
+                              "algebra/multiplication", students=10,
+                              rate=1000, mastery_ratio=0, extra_tags=3,
+                              concurrency=4, message_version=2)
+    results = generator.run(20)
+    self.assertEqual(results.errors(), {})
+    self.assertEqual(results.count("handle_grade"), 20)
+
+
+  def test_mastery_is_revalidated(self):
+    generator = LoadGenerator(self.workbench.handler_url, "key",
+                              "algebra/multiplication", students=2,
+                              rate=1000, mastery_ratio=1, concurrency=1)
+    results = generator.run(20)
+    self.assertEqual(results.errors(), {})
+    self.assertEqual(results.outcomes[("mastery", "ok")], 2)
+    self.assertEqual(results.outcomes[("mastery", "not_modified")], 18)
+
+
+  def test_errors_are_broken_down(self):
+    generator = LoadGenerator(self.workbench.handler_url, "wrong key",
+                              "algebra/multiplication", students=2,
+                              rate=1000, mastery_ratio=0)
+    results = generator.run(5)
+    self.assertEqual(results.errors(),
+                     {("handle_grade", "invalid_signature"): 5})
+
+    self.workbench.stop()
+    results = generator.run(1)
+    self.assertEqual(results.count(), 1)
+    self.assertNotIn(("handle_grade", "ok"), results.outcomes)
+
+
+  def test_classify(self):
+    self.assertEqual(classify("handle_grade", 200, b"0.5"), "ok")
+    self.assertEqual(classify("handle_grade", 200, b'"bad_request"'),
+                     "bad_request")
+    self.assertEqual(classify("mastery", 502, b""), "http_502")
+
+
+  def test_percentiles(self):
+    results = Results()
+    for i in range(100):
+      results.record("mastery", "ok", i / 1000.0)
+    points, high = results.percentiles("mastery", (0.5, 0.99))
+    self.assertEqual(points, [(0.5, 0.05), (0.99, 0.099)])
+    self.assertEqual(high, 0.099)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,295 @@
+"""A local stand-in for the School Yourself server.
+
+It serves the endpoints that the blocks point at, so that a workbench
+can exercise the whole review loop offline:
+
+  /review/embed       A review "player" with buttons for answering a
+                      question right or wrong. Every answer changes the
+                      student's mastery and sends a signed mastery
+                      report to the parent page with postMessage(), just
+                      like the real review player.
+  /review/answer      What those buttons call to get the signed report.
+  /page/embed         A placeholder lesson player.
+  /page/screenshot/*  A placeholder screenshot.
+  /progress/mastery   The student's mastery of the "tags" param, as a
+                      JSON list of [tag, mastery] pairs. Responses have
+                      an ETag, and requests with a matching
+                      If-None-Match get a 304 (counted in not_modified).
+
+Mastery reports are signed with SigningService.mastery_message(), the
+same code that the review block verifies them with, in version 1 of
+the format unless --message-version says otherwise. Requests that carry
+a partner_user_id must also carry its partner_signature.
+
+Usage:
+  python -m schoolyourself.devtools.mock_server [--port 8001] [--key KEY]
+      [--message-version 2]
+
+Then set a block's base URL to http://localhost:8001 and its shared
+key to KEY in studio.
+"""
+
+from __future__ import absolute_import, print_function
+import argparse
+import hashlib
+import html
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..signing import signer
+
+
+# How much a right answer adds to (and a wrong one takes away from) the
+# mastery of the module being reviewed.
+ANSWER_STEP = 0.1
+
+# A 1x1 grey PNG, for /page/screenshot.
+SCREENSHOT_PNG = bytes.fromhex(
+  "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753"
+  "de0000000c49444154789c633873e60c0004cc0265399a652c0000000049454e"
+  "44ae426082")
+
+REVIEW_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Review: %(module)s</title></head>
+<body>
+<h1>Review: %(module)s</h1>
+<p>Mastery: <span id="mastery">%(mastery).2f</span></p>
+<button id="right">Answer correctly</button>
+<button id="wrong">Answer incorrectly</button>
+<script>
+function answer(correct) {
+  var xhr = new XMLHttpRequest();
+  xhr.open('GET', %(answer_url)s + '&correct=' + (correct ? 1 : 0), true);
+  xhr.onreadystatechange = function() {
+    if (xhr.readyState === 4 && xhr.status === 200) {
+      var message = JSON.parse(xhr.responseText);
+      document.getElementById('mastery').innerHTML =
+          message.mastery[%(module_json)s].toFixed(2);
+      window.parent.postMessage(message, '*');
+    }
+  };
+  xhr.send();
+}
+document.getElementById('right').onclick = function() { answer(true); };
+document.getElementById('wrong').onclick = function() { answer(false); };
+</script>
+</body>
+</html>
+"""
+
+LESSON_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Lesson: %(module)s</title></head>
+<body><h1>Lesson: %(module)s</h1></body>
+</html>
+"""
+
+
+class MockSchoolYourselfServer(object):
+    """The mock server, running in a background thread.
+
+    Mastery levels are kept in memory per partner_user_id, and every
+    request is recorded in self.requests as a (path, params) pair.
+    """
+
+    def __init__(self, shared_key="key", host="127.0.0.1", port=0,
+                 message_version=1):
+      self.shared_key = shared_key
+      self.message_version = message_version
+      self.requests = []
+      self.not_modified = 0
+      self._mastery = {}  # User ID -> {tag: mastery}
+      self._lock = threading.Lock()
+
+      mock = self
+      class Handler(_Handler):
+        server_mock = mock
+
+      self.server = ThreadingHTTPServer((host, port), Handler)
+      self.server.daemon_threads = True
+      self.base_url = "http://%s:%d" % (host, self.server.server_address[1])
+      self.thread = None
+
+
+    def start(self):
+      # A short poll interval makes stop() quick, which tests like.
+      self.thread = threading.Thread(target=self.server.serve_forever,
+                                     args=(0.05,),
+                                     name="schoolyourself-mock-server")
+      self.thread.daemon = True
+      self.thread.start()
+      return self
+
+
+    def stop(self):
+      self.server.shutdown()
+      self.server.server_close()
+
+
+    def record_request(self, path, params):
+      with self._lock:
+        self.requests.append((path, params))
+
+
+    def record_not_modified(self):
+      with self._lock:
+        self.not_modified += 1
+
+
+    def get_mastery(self, user_id, tags):
+      """Returns the user's {tag: mastery} for the given tags, with 0 for
+      tags the user hasn't practiced (and for an anonymous user)."""
+      with self._lock:
+        mastery = self._mastery.get(user_id, {})
+        return dict((tag, mastery.get(tag, 0.0)) for tag in tags)
+
+
+    def set_mastery(self, user_id, mastery):
+      """Updates some of the user's mastery levels."""
+      with self._lock:
+        self._mastery.setdefault(user_id, {}).update(mastery)
+
+
+    def answer(self, user_id, module_id, correct):
+      """Records an answer to a question in the given module, and
+      returns the new level."""
+      with self._lock:
+        mastery = self._mastery.setdefault(user_id, {})
+        level = mastery.get(module_id, 0.0)
+        level += ANSWER_STEP if correct else -ANSWER_STEP
+        mastery[module_id] = round(min(max(level, 0.0), 1.0), 2)
+        return mastery[module_id]
+
+
+    def grade_message(self, user_id, mastery):
+      """Returns the signed message that the review player would send
+      the review block for the given {tag: mastery} report."""
+      return signer.mastery_message(self.shared_key, user_id, mastery,
+                                    self.message_version)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_mock = None  # Set by MockSchoolYourselfServer.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+      url = urllib.parse.urlparse(self.path)
+      params = dict(urllib.parse.parse_qsl(url.query))
+      mock = self.server_mock
+      mock.record_request(url.path, params)
+
+      if url.path.startswith("/page/screenshot/"):
+        return self.respond(200, "image/png", SCREENSHOT_PNG)
+
+      routes = {
+        "/review/embed": self.review_embed,
+        "/review/answer": self.review_answer,
+        "/page/embed": self.page_embed,
+        "/progress/mastery": self.progress_mastery,
+      }
+      route = routes.get(url.path, None)
+      if route is None:
+        return self.respond(404, "text/plain", b"Not found")
+
+      user_id = params.get("partner_user_id", None)
+      if user_id is not None:
+        expected = signer.partner_signature(mock.shared_key, user_id)
+        if params.get("partner_signature", None) != expected:
+          return self.respond(403, "text/plain", b"Bad partner_signature")
+      return route(user_id, params)
+
+
+    def review_embed(self, user_id, params):
+      module_id = params.get("module", "")
+      answer_url = "/review/answer?" + urllib.parse.urlencode(params)
+      mastery = self.server_mock.get_mastery(user_id, [module_id])
+      page = REVIEW_PAGE % {
+        "module": html.escape(module_id),
+        "module_json": script_json(module_id),
+        "mastery": mastery[module_id],
+        "answer_url": script_json(answer_url),
+      }
+      return self.respond(200, "text/html", page.encode("utf8"))
+
+
+    def review_answer(self, user_id, params):
+      module_id = params.get("module", None)
+      if not user_id or not module_id:
+        return self.respond(400, "text/plain", b"Need a user and a module")
+
+      mock = self.server_mock
+      mock.answer(user_id, module_id, params.get("correct", "1") == "1")
+      message = mock.grade_message(user_id,
+                                   mock.get_mastery(user_id, [module_id]))
+      return self.respond_json(message)
+
+
+    def page_embed(self, user_id, params):
+      page = LESSON_PAGE % {"module": html.escape(params.get("id", ""))}
+      return self.respond(200, "text/html", page.encode("utf8"))
+
+
+    def progress_mastery(self, user_id, params):
+      tags = [tag for tag in params.get("tags", "").split(",") if tag]
+      mastery = self.server_mock.get_mastery(user_id, tags)
+      body = json.dumps([[tag, mastery[tag]] for tag in tags]).encode("utf8")
+      etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+      if etag in self.headers.get("If-None-Match", "").split(", "):
+        self.server_mock.record_not_modified()
+        return self.respond(304, None, b"", {"ETag": etag})
+      return self.respond(200, "application/json", body, {"ETag": etag})
+
+
+    def respond_json(self, data):
+      return self.respond(200, "application/json",
+                          json.dumps(data).encode("utf8"))
+
+
+    def respond(self, status, content_type, body, headers=None):
+      self.send_response(status)
+      if content_type is not None:
+        self.send_header("Content-Type", content_type)
+      for name, value in (headers or {}).items():
+        self.send_header(name, value)
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+
+    def log_message(self, *args):
+      pass
+
+
+def script_json(value):
+  """Encodes a value as JSON that is safe to put inside a <script>."""
+  return json.dumps(value).replace("<", "\\u003c")
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description="Runs a local stand-in for the School Yourself server.")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8001)
+  parser.add_argument("--key", default="key",
+                      help="The shared key configured in the blocks.")
+  parser.add_argument("--message-version", type=int, choices=(1, 2),
+                      default=1,
+                      help="The version of the mastery messages to send.")
+  args = parser.parse_args(argv)
+
+  mock = MockSchoolYourselfServer(args.key, args.host, args.port,
+                                  args.message_version)
+  print("Serving School Yourself endpoints on %s" % mock.base_url)
+  try:
+    mock.server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    mock.server.server_close()
+
+
+if __name__ == "__main__":
+  main()
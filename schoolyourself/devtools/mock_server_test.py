@@ -0,0 +1,115 @@
+"""This file contains a unit test for the mock School Yourself server."""
+
+from __future__ import absolute_import
+import json
+import unittest
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from mock import Mock
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from ..schoolyourself_review import SchoolYourselfReviewXBlock
+from ..signing import signer
+from .mock_server import MockSchoolYourselfServer
+
+
+class MockSchoolYourselfServerTest(unittest.TestCase):
+  def setUp(self):
+    self.server = MockSchoolYourselfServer("key").start()
+    self.addCleanup(self.server.stop)
+
+
+  def get(self, path, **params):
+    if "partner_user_id" in params:
+      params["partner_signature"] = signer.partner_signature(
+          "key", params["partner_user_id"])
+    url = "%s%s?%s" % (self.server.base_url, path,
+                       urllib.parse.urlencode(params))
+    response = urllib.request.urlopen(url)
+    return response.headers["Content-Type"], response.read()
+
+
+  def test_answers_are_signed_like_handle_grade_expects(self):
+    _, body = self.get("/review/answer", module="algebra/multiplication",
+                       partner_user_id="foo", correct="1")
+    message = json.loads(body.decode("utf8"))
+    self.assertEqual(message["mastery"], {"algebra/multiplication": 0.1})
+
+    block = SchoolYourselfReviewXBlock(Mock(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+    self.assertAlmostEqual(block.handle_grade_json(message), 0.1 / 0.7)
+
+
+  def test_v2_answers(self):
+    self.server.message_version = 2
+    _, body = self.get("/review/answer", module="algebra/multiplication",
+                       partner_user_id="foo", correct="1")
+    message = json.loads(body.decode("utf8"))
+    self.assertEqual(message["version"], 2)
+
+    block = SchoolYourselfReviewXBlock(Mock(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+    self.assertAlmostEqual(block.handle_grade_json(message), 0.1 / 0.7)
+
+
+  def test_progress_mastery(self):
+    self.server.set_mastery("foo", {"algebra/multiplication": 0.35})
+    _, body = self.get("/progress/mastery", partner_user_id="foo",
+                       tags="algebra/multiplication,other")
+    self.assertEqual(json.loads(body.decode("utf8")),
+                     [["algebra/multiplication", 0.35], ["other", 0.0]])
+    self.assertEqual(self.server.requests[-1][0], "/progress/mastery")
+
+
+  def test_progress_mastery_etag(self):
+    self.server.set_mastery("foo", {"algebra/multiplication": 0.35})
+    url = "%s/progress/mastery?%s" % (self.server.base_url,
+                                      urllib.parse.urlencode({
+        "tags": "algebra/multiplication",
+        "partner_user_id": "foo",
+        "partner_signature": signer.partner_signature("key", "foo")}))
+    etag = urllib.request.urlopen(url).headers["ETag"]
+
+    request = urllib.request.Request(url, headers={"If-None-Match": etag})
+    with self.assertRaises(urllib.error.HTTPError) as context:
+      urllib.request.urlopen(request)
+    self.assertEqual(context.exception.code, 304)
+    self.assertEqual(self.server.not_modified, 1)
+
+    self.server.set_mastery("foo", {"algebra/multiplication": 0.7})
+    response = urllib.request.urlopen(request)
+    self.assertNotEqual(response.headers["ETag"], etag)
+
+
+  def test_embeds_and_screenshot(self):
+    content_type, body = self.get("/review/embed", module="a<b",
+                                  partner_user_id="foo")
+    self.assertEqual(content_type, "text/html")
+    self.assertIn(b"Review: a&lt;b", body)
+    self.assertIn(b"postMessage", body)
+
+    _, body = self.get("/page/embed", id="geometry/lines_rays")
+    self.assertIn(b"geometry/lines_rays", body)
+
+    content_type, body = self.get("/page/screenshot/geometry/lines_rays")
+    self.assertEqual(content_type, "image/png")
+    self.assertTrue(body.startswith(b"\x89PNG"))
+
+
+  def test_bad_partner_signature(self):
+    url = "%s/progress/mastery?partner_user_id=foo&partner_signature=x" % (
+        self.server.base_url)
+    with self.assertRaises(urllib.error.HTTPError) as context:
+      urllib.request.urlopen(url)
+    self.assertEqual(context.exception.code, 403)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,45 @@
+"""This file contains a test that keeps the package cheap to import."""
+
+from __future__ import absolute_import
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that are slow to import and that we only need later, if at all.
+HEAVY_MODULES = ["mako", "pkg_resources", "six"]
+
+
+def modules_loaded_by(statement):
+  """Runs the statement in a fresh interpreter, and returns which of
+  HEAVY_MODULES (plus xblock) were imported as a result."""
+  script = ("import sys; %s; print(','.join(m for m in %r "
+            "if m in sys.modules))" % (statement, HEAVY_MODULES + ["xblock"]))
+  output = subprocess.check_output([sys.executable, "-c", script], cwd=ROOT)
+  return [m for m in output.decode("utf8").strip().split(",") if m]
+
+
+class ImportTest(unittest.TestCase):
+  def test_package_import_is_lazy(self):
+    self.assertEqual(modules_loaded_by("import schoolyourself"), [])
+
+
+  def test_block_import_skips_heavy_modules(self):
+    loaded = modules_loaded_by(
+        "from schoolyourself import SchoolYourselfReviewXBlock, "
+        "SchoolYourselfLessonXBlock")
+    self.assertIn("xblock", loaded)
+    self.assertNotIn("mako", loaded)
+    self.assertNotIn("pkg_resources", loaded)
+
+
+  def test_unknown_attribute(self):
+    import schoolyourself
+    self.assertRaises(AttributeError, getattr, schoolyourself, "NoSuchBlock")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,226 @@
+// Copyright 2014 School Yourself. All Rights Reserved.
+
+/**
+ * @fileoverview Just enough of a DOM to run player_viewport.js (or the
+ *   compiled sylib.js) under node, without a browser. Style writes,
+ *   event listeners and animation frames can be counted, and the window
+ *   can be "resized" from a test.
+ */
+
+var vm = require('vm');
+
+
+/**
+ * @param {Object} env The environment that the element belongs to.
+ * @param {string} tagName
+ * @constructor
+ */
+function Element(env, tagName) {
+  this.env_ = env;
+  this.tagName = tagName.toUpperCase();
+  this.attributes_ = {};
+  this.children = [];
+  this.childNodes = this.children;
+  this.parentNode = null;
+  this.listeners_ = {};
+
+  var values = {};
+  var style = {
+    setProperty: function(name, value) {
+      env.styleWrites++;
+      values[name] = value;
+    },
+    getPropertyValue: function(name) {
+      return values.hasOwnProperty(name) ? values[name] : '';
+    }
+  };
+  this.style = new Proxy(style, {
+    set: function(target, name, value) {
+      env.styleWrites++;
+      values[name] = value;
+      return true;
+    },
+    get: function(target, name) {
+      return target.hasOwnProperty(name) ? target[name] : values[name];
+    }
+  });
+}
+
+Element.prototype.setAttribute = function(name, value) {
+  this.attributes_[name] = String(value);
+};
+
+Element.prototype.getAttribute = function(name) {
+  return this.attributes_.hasOwnProperty(name) ?
+      this.attributes_[name] : null;
+};
+
+Element.prototype.removeAttribute = function(name) {
+  delete this.attributes_[name];
+};
+
+Element.prototype.appendChild = function(child) {
+  child.parentNode = this;
+  this.children.push(child);
+  return child;
+};
+
+Element.prototype.removeChild = function(child) {
+  this.children.splice(this.children.indexOf(child), 1);
+  child.parentNode = null;
+  return child;
+};
+
+Element.prototype.focus = function() {};
+
+Element.prototype.addEventListener = function(type, fn) {
+  (this.listeners_[type] = this.listeners_[type] || []).push(fn);
+};
+
+Element.prototype.removeEventListener = function(type, fn) {
+  var listeners = this.listeners_[type] || [];
+  var index = listeners.indexOf(fn);
+  if (index != -1) {
+    listeners.splice(index, 1);
+  }
+};
+
+/**
+ * Returns the number of listeners on this element, for all event types.
+ */
+Element.prototype.listenerCount = function() {
+  var count = 0;
+  for (var type in this.listeners_) {
+    count += this.listeners_[type].length;
+  }
+  return count;
+};
+
+Element.prototype.dispatch = function(type) {
+  var listeners = (this.listeners_[type] || []).slice();
+  for (var i = 0; i < listeners.length; ++i) {
+    listeners[i]({type: type, target: this});
+  }
+};
+
+// Every element is as big as the window, which is all the viewport
+// looks at.
+Object.defineProperty(Element.prototype, 'offsetWidth', {
+  get: function() { return this.env_.width; }
+});
+Object.defineProperty(Element.prototype, 'offsetHeight', {
+  get: function() { return this.env_.height; }
+});
+
+
+/**
+ * Creates a fresh window/document pair and a vm context to run scripts
+ * in.
+ *
+ * @param {{resizeObserver: boolean}=} opt_options Whether the window
+ *   has a ResizeObserver (the default), or only resize events.
+ */
+function createEnvironment(opt_options) {
+  var options = opt_options || {};
+  var env = {
+    width: 1280,
+    height: 800,
+    styleWrites: 0,
+    frames_: [],
+    observers_: []
+  };
+
+  var window = new Element(env, 'window');
+  window.window = window;
+  window.document = {
+    body: new Element(env, 'body'),
+    createElement: function(tagName) {
+      return new Element(env, tagName);
+    }
+  };
+  window.navigator = {};
+  window.performance = {mark: function() {}, measure: function() {}};
+  window.setTimeout = setTimeout;
+  window.clearTimeout = clearTimeout;
+
+  var nextFrame = 1;
+  window.requestAnimationFrame = function(fn) {
+    env.frames_.push({id: nextFrame, fn: fn});
+    return nextFrame++;
+  };
+  window.cancelAnimationFrame = function(id) {
+    env.frames_ = env.frames_.filter(function(frame) {
+      return frame.id != id;
+    });
+  };
+
+  if (options.resizeObserver !== false) {
+    window.ResizeObserver = function(callback) {
+      this.callback_ = callback;
+      this.elements_ = [];
+      env.observers_.push(this);
+    };
+    window.ResizeObserver.prototype.observe = function(element) {
+      this.elements_.push(element);
+      // Real observers report the initial size right away, too.
+      this.callback_([{target: element}], this);
+    };
+    window.ResizeObserver.prototype.disconnect = function() {
+      this.elements_ = [];
+    };
+  }
+
+  env.window = window;
+  env.context = vm.createContext(window);
+
+  /**
+   * Runs a script in the environment's global scope.
+   */
+  env.run = function(source, filename) {
+    vm.runInContext(source, env.context, {filename: filename});
+  };
+
+  /**
+   * Changes the window size, and tells whoever is listening.
+   */
+  env.resize = function(width, height) {
+    env.width = width;
+    env.height = height;
+    window.dispatch('resize');
+    for (var i = 0; i < env.observers_.length; ++i) {
+      var observer = env.observers_[i];
+      if (observer.elements_.length) {
+        observer.callback_(observer.elements_.map(function(element) {
+          return {target: element};
+        }), observer);
+      }
+    }
+  };
+
+  /**
+   * Runs the pending animation frame callbacks, and returns how many
+   * there were.
+   */
+  env.flushFrames = function() {
+    var frames = env.frames_;
+    env.frames_ = [];
+    for (var i = 0; i < frames.length; ++i) {
+      frames[i].fn(0);
+    }
+    return frames.length;
+  };
+
+  /**
+   * Returns the number of observers that are still observing something.
+   */
+  env.activeObservers = function() {
+    return env.observers_.filter(function(observer) {
+      return observer.elements_.length > 0;
+    }).length;
+  };
+
+  return env;
+}
+
+
+exports.createEnvironment = createEnvironment;
@@ -7,7 +7,10 @@
  *
  * The viewport will automatically resize itself so that it fits in the
  * window, while preserving the aspect ratio specified by the maxWidth
- * and maxHeight parameters that you pass in.
+ * and maxHeight parameters that you pass in. While it is open, it
+ * watches the curtain's size (with a ResizeObserver where available,
+ * and window resize events otherwise), and handles each burst of
+ * changes once per animation frame.
  *
  * The PlayerViewportBuilder class is defined at the bottom of this
  * file, which just has a single static method which creates any
@@ -66,9 +69,65 @@ schoolyourself.PlayerViewport = function(curtainElement, contentContainer,
    * @type {?Element}
    */
   this.currentFrame_ = null;
+
+  /**
+   * The width, height and transform that resize() last applied, so that
+   * it can leave the styles alone when they wouldn't change.
+   * @type {?string}
+   */
+  this.appliedLayout_ = null;
+
+  /**
+   * The pending animation frame request from scheduleResize_(), or null.
+   * @type {?number}
+   */
+  this.resizeRequest_ = null;
+
+  /**
+   * What watches for size changes while the viewport is open: a
+   * ResizeObserver, or true if we are listening to window resize
+   * events instead. Null while the viewport is closed.
+   * @type {ResizeObserver|boolean|null}
+   */
+  this.resizeWatcher_ = null;
+
+  this.onResize_ = bind(this, this.scheduleResize_);
 };
 
 
+/**
+ * The most frames that can be warmed up ahead of time on a page, across
+ * all of the viewports.
+ * @const
+ */
+schoolyourself.PlayerViewport.MAX_WARM_FRAMES = 2;
+
+/**
+ * A rough guess at how much memory a loaded player takes, and how much
+ * we are willing to spend on frames that might never be opened. The
+ * budget is halved on devices that report less than 4GB of memory.
+ * @const
+ */
+schoolyourself.PlayerViewport.WARM_FRAME_BYTES = 24 * 1024 * 1024;
+schoolyourself.PlayerViewport.WARM_BUDGET_BYTES = 48 * 1024 * 1024;
+
+/**
+ * How long a tile has to stay on screen before we warm up its frame,
+ * so that scrolling past tiles doesn't load all of them.
+ * @const
+ */
+schoolyourself.PlayerViewport.VISIBLE_WARM_DELAY_MS = 1000;
+
+/**
+ * The frames that have been warmed up, least recently wanted first, as
+ * {viewport, url, frame, loaded} objects. Each one sits hidden in its
+ * viewport's scaler until openFrame() is called with its URL.
+ * @type {Array.<Object>}
+ * @private
+ */
+schoolyourself.PlayerViewport.warmFrames_ = [];
+
+
 schoolyourself.PlayerViewport.prototype.resize = function() {
   if (!this.isOpen_) {
     return;
@@ -96,8 +155,6 @@ schoolyourself.PlayerViewport.prototype.resize = function() {
 
   width = Math.floor(width);
   height = Math.floor(height);
-  this.contentContainer_.style.width = width + 'px';
-  this.contentContainer_.style.height = height + 'px';
 
   var scaleWidthFactor = this.maxWidth_ / width;
   var scaleHeightFactor = this.maxHeight_ / height;
@@ -110,43 +167,244 @@ schoolyourself.PlayerViewport.prototype.resize = function() {
     transformString = 'scale(' + (1/scaleHeightFactor) + ')';
   }
 
+  // Writing the styles invalidates the layout, so don't do it if
+  // nothing would change.
+  var layout = width + ' ' + height + ' ' + transformString;
+  if (layout == this.appliedLayout_) {
+    return;
+  }
+  this.appliedLayout_ = layout;
+
+  this.contentContainer_.style.width = width + 'px';
+  this.contentContainer_.style.height = height + 'px';
   setPrefixedStyleProperty(this.scaler_, 'transform', transformString);
   setPrefixedStyleProperty(this.scaler_, 'transform-origin', '0 0');
 };
 
 
+/**
+ * Calls resize() in the next animation frame, once no matter how many
+ * times this is called before then.
+ * @private
+ */
+schoolyourself.PlayerViewport.prototype.scheduleResize_ = function() {
+  if (this.resizeRequest_ !== null) {
+    return;
+  }
+  var self = this;
+  this.resizeRequest_ = requestFrame(function() {
+    self.resizeRequest_ = null;
+    self.resize();
+  });
+};
+
+
+/**
+ * Starts watching for size changes. Called when the viewport opens.
+ * @private
+ */
+schoolyourself.PlayerViewport.prototype.watchSize_ = function() {
+  if (this.resizeWatcher_) {
+    return;
+  }
+  if (window.ResizeObserver) {
+    this.resizeWatcher_ = new ResizeObserver(this.onResize_);
+    this.resizeWatcher_.observe(this.curtain_);
+  } else {
+    window.addEventListener('resize', this.onResize_, false);
+    this.resizeWatcher_ = true;
+  }
+};
+
+
+/**
+ * Stops watching for size changes. Called when the viewport closes.
+ * @private
+ */
+schoolyourself.PlayerViewport.prototype.unwatchSize_ = function() {
+  if (this.resizeWatcher_ === true) {
+    window.removeEventListener('resize', this.onResize_, false);
+  } else if (this.resizeWatcher_) {
+    this.resizeWatcher_.disconnect();
+  }
+  this.resizeWatcher_ = null;
+  if (this.resizeRequest_ !== null) {
+    cancelFrame(this.resizeRequest_);
+    this.resizeRequest_ = null;
+  }
+};
+
+
 schoolyourself.PlayerViewport.prototype.isOpen = function() {
   return this.isOpen_;
 };
 
 
 schoolyourself.PlayerViewport.prototype.open = function() {
-  this.resize();
   addClassName(this.curtain_, 'open');
   this.isOpen_ = true;
+  this.watchSize_();
+  this.resize();
 };
 
 
 /**
  * This is another version of open() which creates an iframe pointing
- * at the given url and places it into the scaler.
+ * at the given url and places it into the scaler. If warmFrame() has
+ * already loaded that url, that frame is shown instead.
+ *
+ * The time from here until the frame has loaded is recorded as a
+ * "schoolyourself.viewport.ready.warm" or ".cold" performance measure.
  * @param {string} url
  * @export
  */
 schoolyourself.PlayerViewport.prototype.openFrame = function(url) {
-  var iframe = createDom('iframe', this.scaler_, 'player-viewport-frame');
-  iframe.setAttribute('tabindex', 0);
-  iframe.focus();
-  iframe.src = url;
-  iframe.scrolling = 'no';
+  mark('schoolyourself.viewport.open');
+  var warm = this.takeWarmFrame_(url);
+  var iframe;
+  if (warm) {
+    iframe = warm.frame;
+    removeClassName(iframe, 'player-viewport-warm');
+    iframe.removeAttribute('aria-hidden');
+    iframe.setAttribute('tabindex', 0);
+    iframe.focus();
+  } else {
+    iframe = createDom('iframe', this.scaler_, 'player-viewport-frame');
+    iframe.setAttribute('tabindex', 0);
+    iframe.focus();
+    iframe.src = url;
+    iframe.scrolling = 'no';
+  }
   this.currentFrame_ = iframe;
 
+  var measureName = 'schoolyourself.viewport.ready.' +
+      (warm ? 'warm' : 'cold');
+  if (warm && warm.loaded) {
+    measure(measureName, 'schoolyourself.viewport.open');
+  } else {
+    iframe.addEventListener('load', function onLoad() {
+      iframe.removeEventListener('load', onLoad, false);
+      measure(measureName, 'schoolyourself.viewport.open');
+    }, false);
+  }
+
   addClassName(this.curtain_, 'open');
   this.isOpen_ = true;
+  this.watchSize_();
   this.resize();
 };
 
 
+/**
+ * Starts loading the given url in a hidden frame, so that openFrame()
+ * can show it right away. Only a few frames are kept warm on a page,
+ * and the least recently wanted one makes room for a new one. Nothing
+ * is warmed up while the viewport is open, or if the browser asks us to
+ * save data.
+ * @param {string} url
+ * @export
+ */
+schoolyourself.PlayerViewport.prototype.warmFrame = function(url) {
+  var warmFrames = schoolyourself.PlayerViewport.warmFrames_;
+  for (var i = 0; i < warmFrames.length; ++i) {
+    if (warmFrames[i].viewport == this && warmFrames[i].url == url) {
+      warmFrames.push(warmFrames.splice(i, 1)[0]);
+      return;
+    }
+  }
+
+  var limit = schoolyourself.PlayerViewport.warmFrameLimit_();
+  if (this.isOpen_ || limit < 1) {
+    return;
+  }
+  while (warmFrames.length >= limit) {
+    var evicted = warmFrames.shift();
+    evicted.frame.parentNode.removeChild(evicted.frame);
+  }
+
+  var iframe = createDom('iframe', this.scaler_,
+                         'player-viewport-frame player-viewport-warm');
+  iframe.setAttribute('tabindex', -1);
+  iframe.setAttribute('aria-hidden', 'true');
+  iframe.src = url;
+  iframe.scrolling = 'no';
+
+  var entry = {viewport: this, url: url, frame: iframe, loaded: false};
+  iframe.addEventListener('load', function onLoad() {
+    iframe.removeEventListener('load', onLoad, false);
+    entry.loaded = true;
+  }, false);
+  warmFrames.push(entry);
+};
+
+
+/**
+ * Warms up the frame for the given url when the user shows interest in
+ * the element that opens it: when it is hovered or focused, or after it
+ * has been on screen for a little while.
+ * @param {Element} element The tile that opens the url when clicked.
+ * @param {string} url
+ * @export
+ */
+schoolyourself.PlayerViewport.prototype.warmFrameOnInterest = function(
+    element, url) {
+  var warm = bind(this, function() {
+    this.warmFrame(url);
+  });
+  element.addEventListener('mouseenter', warm, false);
+  element.addEventListener('focus', warm, true);
+
+  if (!window.IntersectionObserver) {
+    return;
+  }
+  var timer = null;
+  var observer = new IntersectionObserver(function(entries) {
+    var visible = entries[entries.length - 1].isIntersecting;
+    clearTimeout(timer);
+    timer = visible ? setTimeout(function() {
+      observer.disconnect();
+      warm();
+    }, schoolyourself.PlayerViewport.VISIBLE_WARM_DELAY_MS) : null;
+  }, {threshold: 0.5});
+  observer.observe(element);
+};
+
+
+/**
+ * Removes the warm frame for the given url from the list and returns
+ * its entry, or returns null if there isn't one.
+ * @private
+ */
+schoolyourself.PlayerViewport.prototype.takeWarmFrame_ = function(url) {
+  var warmFrames = schoolyourself.PlayerViewport.warmFrames_;
+  for (var i = 0; i < warmFrames.length; ++i) {
+    if (warmFrames[i].viewport == this && warmFrames[i].url == url) {
+      return warmFrames.splice(i, 1)[0];
+    }
+  }
+  return null;
+};
+
+
+/**
+ * Returns how many frames can be kept warm on this device.
+ * @private
+ */
+schoolyourself.PlayerViewport.warmFrameLimit_ = function() {
+  var connection = navigator.connection;
+  if (connection && connection.saveData) {
+    return 0;
+  }
+  var budget = schoolyourself.PlayerViewport.WARM_BUDGET_BYTES;
+  if (navigator.deviceMemory && navigator.deviceMemory < 4) {
+    budget /= 2;
+  }
+  return Math.min(schoolyourself.PlayerViewport.MAX_WARM_FRAMES,
+                  Math.floor(budget /
+                             schoolyourself.PlayerViewport.WARM_FRAME_BYTES));
+};
+
+
 /**
  * If we have an onclose handler, this will call that first, and we will
  * only actually close the window if it returns true.
@@ -163,7 +421,14 @@ schoolyourself.PlayerViewport.prototype.close = function() {
   }
 
   this.isOpen_ = false;
-  this.scaler_.innerHTML = '';
+  this.unwatchSize_();
+  // Clear out the scaler, except for the frames that are still warm.
+  var children = this.scaler_.children;
+  for (var i = children.length - 1; i >= 0; --i) {
+    if (!hasClassName(children[i], 'player-viewport-warm')) {
+      this.scaler_.removeChild(children[i]);
+    }
+  }
   removeClassName(this.curtain_, 'open');
   this.currentFrame_ = null;
   for (var i = 0; i < this.afterClose_.length; ++i) {
@@ -251,6 +516,5 @@ schoolyourself.PlayerViewportBuilder.insert = function(maxWidth, maxHeight) {
                                                    scaler,
                                                    maxWidth, maxHeight);
   xButton.onclick = bind(viewport, viewport.close);
-  window.addEventListener('resize', bind(viewport, viewport.resize), false);
   return viewport;
 };
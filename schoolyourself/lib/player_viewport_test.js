@@ -0,0 +1,125 @@
+// Copyright 2014 School Yourself. All Rights Reserved.
+
+/**
+ * @fileoverview Tests for the viewport's resizing, run under node with
+ *   the DOM shim:
+ *
+ *     node schoolyourself/lib/player_viewport_test.js
+ *
+ *   Every test runs against both the readable sources in this directory
+ *   and the compiled public/sylib.js, with and without ResizeObserver.
+ */
+
+var assert = require('assert');
+var fs = require('fs');
+var path = require('path');
+
+var createEnvironment = require('./dom_shim').createEnvironment;
+
+var SOURCES = {
+  'lib': ['util.js', 'player_viewport.js'].map(function(name) {
+    return path.join(__dirname, name);
+  }),
+  'sylib.js': [path.join(__dirname, '..', 'public', 'sylib.js')]
+};
+
+
+function setUp(sources, resizeObserver) {
+  var env = createEnvironment({resizeObserver: resizeObserver});
+  sources.forEach(function(filename) {
+    env.run(fs.readFileSync(filename, 'utf8'), filename);
+  });
+  env.viewport = env.window.schoolyourself.PlayerViewportBuilder.insert(
+      1024, 768);
+  return env;
+}
+
+
+var TESTS = {
+  'a burst of resizes writes the styles once': function(env) {
+    env.viewport.openFrame('http://example.com/');
+    env.flushFrames();
+    env.styleWrites = 0;
+
+    for (var i = 0; i < 20; ++i) {
+      env.resize(1000 - i * 10, 700 - i * 10);
+    }
+    assert.equal(env.flushFrames(), 1);
+    // Width and height, then transform and transform-origin with all
+    // five prefixes.
+    assert.equal(env.styleWrites, 12);
+  },
+
+  'unchanged sizes write nothing': function(env) {
+    env.viewport.openFrame('http://example.com/');
+    env.flushFrames();
+    env.styleWrites = 0;
+
+    for (var i = 0; i < 20; ++i) {
+      env.resize(1280, 800);
+      env.flushFrames();
+    }
+    assert.equal(env.styleWrites, 0);
+  },
+
+  'nothing is watched while closed': function(env) {
+    var listeners = env.window.listenerCount();
+    env.viewport.openFrame('http://example.com/');
+    env.viewport.close();
+    assert.equal(env.window.listenerCount(), listeners);
+    assert.equal(env.activeObservers(), 0);
+
+    env.styleWrites = 0;
+    env.resize(640, 480);
+    assert.equal(env.flushFrames(), 0);
+    assert.equal(env.styleWrites, 0);
+  },
+
+  'closing cancels a pending resize': function(env) {
+    env.viewport.openFrame('http://example.com/');
+    env.resize(640, 480);
+    env.viewport.close();
+    assert.equal(env.flushFrames(), 0);
+  },
+
+  'reopening resizes only if the size changed': function(env) {
+    env.viewport.openFrame('http://example.com/');
+    env.viewport.close();
+
+    env.styleWrites = 0;
+    env.viewport.openFrame('http://example.com/');
+    env.flushFrames();
+    assert.equal(env.styleWrites, 0);
+    env.viewport.close();
+
+    env.resize(640, 480);
+    env.viewport.openFrame('http://example.com/');
+    assert.equal(env.styleWrites, 12);
+  }
+};
+
+
+function main() {
+  var failures = 0;
+  var count = 0;
+  Object.keys(SOURCES).forEach(function(sourceName) {
+    [true, false].forEach(function(resizeObserver) {
+      Object.keys(TESTS).forEach(function(testName) {
+        var name = sourceName + (resizeObserver ? '' : ', no ResizeObserver') +
+            ': ' + testName;
+        count++;
+        try {
+          TESTS[testName](setUp(SOURCES[sourceName], resizeObserver));
+        } catch (e) {
+          failures++;
+          console.log('FAIL ' + name + '\n' + e.stack);
+        }
+      });
+    });
+  });
+  console.log((count - failures) + ' of ' + count + ' tests passed');
+  process.exitCode = failures ? 1 : 0;
+}
+
+
+main();
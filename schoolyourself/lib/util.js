@@ -129,6 +129,57 @@ function addHeightFixSpan(container) {
 }
 
 
+/**
+ * Calls fn before the next repaint, and returns an ID that can be passed
+ * to cancelFrame(). Falls back to a timeout in old browsers.
+ * @param {function()} fn
+ * @return {number}
+ */
+function requestFrame(fn) {
+  if (window.requestAnimationFrame) {
+    return window.requestAnimationFrame(fn);
+  }
+  return window.setTimeout(fn, 16);
+}
+
+
+/**
+ * Cancels a call scheduled with requestFrame().
+ * @param {number} id
+ */
+function cancelFrame(id) {
+  if (window.cancelAnimationFrame) {
+    window.cancelAnimationFrame(id);
+  } else {
+    window.clearTimeout(id);
+  }
+}
+
+
+/**
+ * Records a performance mark, in browsers that support them.
+ * @param {string} name
+ */
+function mark(name) {
+  if (window.performance && performance.mark) {
+    performance.mark(name);
+  }
+}
+
+
+/**
+ * Records a performance measure from the given mark until now, in
+ * browsers that support them.
+ * @param {string} name
+ * @param {string} startMark
+ */
+function measure(name, startMark) {
+  if (window.performance && performance.measure) {
+    performance.measure(name, startMark);
+  }
+}
+
+
 /**
  * @const
  * @private
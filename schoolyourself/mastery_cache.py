@@ -0,0 +1,99 @@
+"""A per-user, in-process cache of School Yourself mastery levels.
+
+The review block's mastery bar used to be filled in by a cross-origin
+request from the browser to the School Yourself server. Instead, the
+block now serves mastery levels from this cache through its "mastery"
+handler. The cache is filled with the signed mastery levels that the
+iframe already sends to handle_grade, and only falls back to asking the
+School Yourself server when it doesn't know the answer.
+"""
+
+from __future__ import absolute_import
+import collections
+import threading
+import time
+
+
+class MasteryCache(object):
+    """Maps (namespace, user ID) to the mastery levels of that user.
+
+    The namespace is whatever distinguishes one School Yourself server
+    from another (the blocks use their base_url), since user IDs are
+    only meaningful within one. Every mastery level expires ttl seconds
+    after it was stored, and the least recently used users are dropped
+    once there are more than max_users of them.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, ttl=300, max_users=10000):
+      self.ttl = ttl
+      self.max_users = max_users
+      # (Namespace, user ID) -> {tag: (mastery, expiry time)}
+      self._users = collections.OrderedDict()
+      self._lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+
+
+    def get(self, namespace, user_id, tags, now=None):
+      """Returns a {tag: mastery} dict for the given tags, or None unless
+      every one of them is cached and fresh."""
+      if now is None:
+        now = time.time()
+
+      key = (namespace, user_id)
+      with self._lock:
+        entries = self._users.get(key, None)
+        result = {}
+        if entries is not None:
+          self._users.move_to_end(key)
+          for tag in tags:
+            entry = entries.get(tag, None)
+            if entry is None or entry[1] <= now:
+              break
+            result[tag] = entry[0]
+
+        if entries is None or len(result) != len(tags):
+          self.misses += 1
+          return None
+
+        self.hits += 1
+        return result
+
+
+    def update(self, namespace, user_id, mastery, now=None):
+      """Stores the mastery levels in the given {tag: mastery} dict."""
+      if now is None:
+        now = time.time()
+      expiry = now + self.ttl
+
+      key = (namespace, user_id)
+      with self._lock:
+        entries = self._users.get(key, None)
+        if entries is None:
+          entries = {}
+          self._users[key] = entries
+          if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        else:
+          self._users.move_to_end(key)
+          # Take the opportunity to drop anything that has expired.
+          for tag in [tag for tag, entry in entries.items()
+                      if entry[1] <= now]:
+            del entries[tag]
+
+        for tag, value in mastery.items():
+          entries[tag] = (value, expiry)
+
+
+    def invalidate(self, namespace=None, user_id=None):
+      """Forgets one user's mastery levels, or everything."""
+      with self._lock:
+        if user_id is None:
+          self._users.clear()
+        else:
+          self._users.pop((namespace, user_id), None)
+
+
+mastery_cache = MasteryCache()
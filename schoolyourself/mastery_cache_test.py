@@ -0,0 +1,163 @@
+"""This file contains unit tests for the mastery cache and the review
+block's mastery handler."""
+
+from __future__ import absolute_import
+import json
+import unittest
+
+from mock import Mock
+from webob import Request
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from .devtools.mock_server import MockSchoolYourselfServer
+from .mastery_cache import MasteryCache, mastery_cache
+from .metrics import Aggregator, configure, metrics
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+class MasteryCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = MasteryCache(ttl=10, max_users=2)
+
+
+  def test_get_and_update(self):
+    self.assertIsNone(self.cache.get("sy", "foo", ["a"], now=0))
+    self.cache.update("sy", "foo", {"a": 0.5, "b": 0.1}, now=0)
+    self.assertEqual(self.cache.get("sy", "foo", ["a", "b"], now=1),
+                     {"a": 0.5, "b": 0.1})
+
+    # Everything has to be there for a hit.
+    self.assertIsNone(self.cache.get("sy", "foo", ["a", "c"], now=1))
+    # Users are separate, and so are servers.
+    self.assertIsNone(self.cache.get("sy", "bar", ["a"], now=1))
+    self.assertIsNone(self.cache.get("other", "foo", ["a"], now=1))
+
+    self.assertEqual((self.cache.hits, self.cache.misses), (1, 4))
+
+
+  def test_expiry(self):
+    self.cache.update("sy", "foo", {"a": 0.5}, now=0)
+    self.cache.update("sy", "foo", {"b": 0.5}, now=5)
+    self.assertEqual(self.cache.get("sy", "foo", ["a", "b"], now=9),
+                     {"a": 0.5, "b": 0.5})
+    self.assertIsNone(self.cache.get("sy", "foo", ["a"], now=10))
+    self.assertEqual(self.cache.get("sy", "foo", ["b"], now=10), {"b": 0.5})
+
+
+  def test_lru(self):
+    self.cache.update("sy", "a", {"x": 1.0}, now=0)
+    self.cache.update("sy", "b", {"x": 1.0}, now=0)
+    self.cache.get("sy", "a", ["x"], now=0)
+    self.cache.update("sy", "c", {"x": 1.0}, now=0)
+
+    self.assertIsNotNone(self.cache.get("sy", "a", ["x"], now=0))
+    self.assertIsNone(self.cache.get("sy", "b", ["x"], now=0))
+
+
+  def test_invalidate(self):
+    self.cache.update("sy", "a", {"x": 1.0}, now=0)
+    self.cache.update("sy", "b", {"x": 1.0}, now=0)
+    self.cache.invalidate("sy", "a")
+    self.assertIsNone(self.cache.get("sy", "a", ["x"], now=0))
+    self.assertIsNotNone(self.cache.get("sy", "b", ["x"], now=0))
+    self.cache.invalidate()
+    self.assertIsNone(self.cache.get("sy", "b", ["x"], now=0))
+
+
+class MasteryHandlerTest(unittest.TestCase):
+  def setUp(self):
+    self.server = MockSchoolYourselfServer("key").start()
+    self.server.set_mastery("debug", {"algebra/multiplication": 0.35})
+    self.addCleanup(self.server.stop)
+    mastery_cache.invalidate()
+    self.addCleanup(mastery_cache.invalidate)
+
+    self.block = SchoolYourselfReviewXBlock(Mock(), DictFieldData({}),
+                                            ScopeIds("foo", "bar", "baz", "x"))
+    self.block.base_url = self.server.base_url
+    self.block.module_id = "algebra/multiplication"
+    self.block.shared_key = "key"
+
+
+  def get_mastery(self, query=""):
+    response = self.block.mastery(Request.blank("/" + query))
+    return response.status_int, json.loads(response.body.decode("utf8"))
+
+
+  def test_fetches_on_miss_then_caches(self):
+    self.assertEqual(self.get_mastery(),
+                     (200, [["algebra/multiplication", 0.35]]))
+    self.assertEqual(len(self.server.requests), 1)
+    path, params = self.server.requests[0]
+    self.assertEqual(path, "/progress/mastery")
+    self.assertEqual(params["tags"], "algebra/multiplication")
+    self.assertEqual(params["partner_user_id"], "debug")
+    self.assertIn("partner_signature", params)
+
+    self.server.set_mastery("debug", {"algebra/multiplication": 0.7})
+    self.assertEqual(self.get_mastery(),
+                     (200, [["algebra/multiplication", 0.35]]))
+    self.assertEqual(len(self.server.requests), 1)
+
+
+  def test_etag(self):
+    sink = Aggregator()
+    previous = metrics.sink
+    configure(sink)
+    self.addCleanup(configure, previous)
+    response = self.block.mastery(Request.blank("/"))
+    etag = response.headers["ETag"]
+
+    response = self.block.mastery(Request.blank(
+        "/", headers={"If-None-Match": etag}))
+    self.assertEqual(response.status_int, 304)
+    self.assertEqual(response.body, b"")
+    self.assertEqual(response.headers["ETag"], etag)
+    self.assertEqual(sink.summary()["counts"]["mastery.not_modified"], 1)
+
+    # A new level means a new ETag.
+    self.block.remember_mastery({"algebra/multiplication": 0.7})
+    response = self.block.mastery(Request.blank(
+        "/", headers={"If-None-Match": etag}))
+    self.assertEqual(response.status_int, 200)
+    self.assertNotEqual(response.headers["ETag"], etag)
+
+
+  def test_multiple_tags(self):
+    self.assertEqual(self.get_mastery("?tags=algebra/multiplication,other"),
+                     (200, [["algebra/multiplication", 0.35],
+                            ["other", 0]]))
+    self.assertEqual(self.server.requests[0][1]["tags"],
+                     "algebra/multiplication,other")
+
+
+  def test_filled_by_handle_grade(self):
+    self.assertEqual(self.block.handle_grade_json(
+        {"mastery": {"algebra/multiplication": 0.7},
+         "user_id": "foo",
+         "signature": "f0cc345470c322e0c6f41d541fe2b736"}), 1.0)
+
+    self.assertEqual(self.get_mastery(),
+                     (200, [["algebra/multiplication", 0.7]]))
+    self.assertEqual(self.server.requests, [])
+
+
+  def test_unsigned_mastery_is_not_cached(self):
+    self.assertEqual(self.block.handle_grade_json(
+        {"mastery": {"algebra/multiplication": 0.7},
+         "user_id": "foo",
+         "signature": "asdf"}), "invalid_signature")
+
+    self.assertEqual(self.get_mastery(),
+                     (200, [["algebra/multiplication", 0.35]]))
+    self.assertEqual(len(self.server.requests), 1)
+
+
+  def test_upstream_down(self):
+    self.server.stop()
+    self.assertEqual(self.block.mastery(Request.blank("/")).status_int, 502)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,231 @@
+"""Optional timing instrumentation for the School Yourself XBlocks.
+
+The blocks time the phases of their hot paths (template load and
+render, URL/signature generation, fragment assembly, and the parse,
+verify and publish steps of grading) and count outcomes such as
+"invalid_signature", suppressed grade events, grade queue overflows and
+mastery 304s, and report gauges such as the depth of the
+asynchronous grade queue. Where those measurements go is decided by the
+SCHOOLYOURSELF_METRICS environment variable:
+
+  (unset)               Disabled. Timers and counters are no-ops.
+  memory                Aggregated in-process; see metrics.sink.summary().
+  file:/path/to/file    Appended to a file, one JSON object per line.
+  udp:host:port         Sent as StatsD packets, e.g. to a local agent.
+
+Instrumentation can also be turned on from code with configure().
+"""
+
+from __future__ import absolute_import
+import json
+import os
+import socket
+import threading
+import time
+
+
+METRICS_ENV = "SCHOOLYOURSELF_METRICS"
+
+# Every metric name gets this prefix when it leaves the process.
+PREFIX = "schoolyourself."
+
+
+class Aggregator(object):
+    """A sink that keeps count/total/min/max per timer, a total per
+    counter, and the last value of each gauge, in memory."""
+
+    def __init__(self):
+      self._timings = {}
+      self._counts = {}
+      self._gauges = {}
+      self._lock = threading.Lock()
+
+
+    def timing(self, name, seconds):
+      with self._lock:
+        stats = self._timings.get(name, None)
+        if stats is None:
+          self._timings[name] = [1, seconds, seconds, seconds]
+        else:
+          stats[0] += 1
+          stats[1] += seconds
+          stats[2] = min(stats[2], seconds)
+          stats[3] = max(stats[3], seconds)
+
+
+    def increment(self, name, amount=1):
+      with self._lock:
+        self._counts[name] = self._counts.get(name, 0) + amount
+
+
+    def gauge(self, name, value):
+      with self._lock:
+        self._gauges[name] = value
+
+
+    def summary(self):
+      """Returns {"timings": {name: {...}}, "counts": {name: n},
+      "gauges": {name: value}}, with the timings in milliseconds."""
+      with self._lock:
+        timings = dict(
+          (name, { "count": count,
+                   "mean_ms": total / count * 1000,
+                   "min_ms": low * 1000,
+                   "max_ms": high * 1000 })
+          for name, (count, total, low, high) in self._timings.items())
+        return { "timings": timings, "counts": dict(self._counts),
+                 "gauges": dict(self._gauges) }
+
+
+    def reset(self):
+      with self._lock:
+        self._timings.clear()
+        self._counts.clear()
+        self._gauges.clear()
+
+
+class FileSink(object):
+    """A sink that appends every measurement to a file as a JSON line."""
+
+    def __init__(self, path):
+      self.path = path
+      self._lock = threading.Lock()
+
+
+    def _write(self, record):
+      line = json.dumps(record, sort_keys=True) + "\n"
+      with self._lock:
+        with open(self.path, "a") as f:
+          f.write(line)
+
+
+    def timing(self, name, seconds):
+      self._write({ "time": time.time(), "type": "timing",
+                    "name": PREFIX + name, "ms": seconds * 1000 })
+
+
+    def increment(self, name, amount=1):
+      self._write({ "time": time.time(), "type": "count",
+                    "name": PREFIX + name, "value": amount })
+
+
+    def gauge(self, name, value):
+      self._write({ "time": time.time(), "type": "gauge",
+                    "name": PREFIX + name, "value": value })
+
+
+class UDPSink(object):
+    """A sink that sends StatsD packets. Sending is fire-and-forget, so
+    an absent or slow receiver never holds up a request."""
+
+    def __init__(self, host, port):
+      self.address = (host, int(port))
+      self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+
+    def _send(self, packet):
+      try:
+        self._socket.sendto(packet.encode("utf8"), self.address)
+      except (IOError, OSError):
+        pass
+
+
+    def timing(self, name, seconds):
+      self._send("%s%s:%.3f|ms" % (PREFIX, name, seconds * 1000))
+
+
+    def increment(self, name, amount=1):
+      self._send("%s%s:%d|c" % (PREFIX, name, amount))
+
+
+    def gauge(self, name, value):
+      self._send("%s%s:%d|g" % (PREFIX, name, value))
+
+
+class _NullTimer(object):
+    """What timer() hands out when instrumentation is disabled."""
+
+    def __enter__(self):
+      return self
+
+
+    def __exit__(self, *exc_info):
+      return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    def __init__(self, sink, name):
+      self.sink = sink
+      self.name = name
+
+
+    def __enter__(self):
+      self.started = time.perf_counter()
+      return self
+
+
+    def __exit__(self, *exc_info):
+      self.sink.timing(self.name, time.perf_counter() - self.started)
+      return False
+
+
+class Metrics(object):
+    """The front end that the blocks talk to.
+
+    When no sink is configured, timer() returns a shared do-nothing
+    context manager and increment() returns right away, so leaving the
+    calls in the hot paths costs next to nothing.
+    """
+
+    def __init__(self, sink=None):
+      self.sink = sink
+
+
+    @property
+    def enabled(self):
+      return self.sink is not None
+
+
+    def timer(self, name):
+      """Returns a context manager that records how long its body takes."""
+      if self.sink is None:
+        return _NULL_TIMER
+      return _Timer(self.sink, name)
+
+
+    def increment(self, name, amount=1):
+      if self.sink is not None:
+        self.sink.increment(name, amount)
+
+
+    def gauge(self, name, value):
+      """Records the current value of something, such as a queue depth."""
+      if self.sink is not None:
+        self.sink.gauge(name, value)
+
+
+def sink_from_spec(spec):
+  """Creates a sink from a SCHOOLYOURSELF_METRICS-style string, or
+  returns None if the spec is empty."""
+  if not spec:
+    return None
+  if spec == "memory":
+    return Aggregator()
+  if spec.startswith("file:"):
+    return FileSink(spec[len("file:"):])
+  if spec.startswith("udp:"):
+    host, _, port = spec[len("udp:"):].rpartition(":")
+    return UDPSink(host or "127.0.0.1", port)
+  raise ValueError("Unknown %s setting: %r" % (METRICS_ENV, spec))
+
+
+metrics = Metrics(sink_from_spec(os.environ.get(METRICS_ENV, "")))
+
+
+def configure(sink):
+  """Sends all measurements to the given sink from now on. Pass None to
+  turn instrumentation off."""
+  metrics.sink = sink
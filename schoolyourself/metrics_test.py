@@ -0,0 +1,155 @@
+"""This file contains a unit test for the timing instrumentation."""
+
+from __future__ import absolute_import
+import json
+import os
+import socket
+import tempfile
+import unittest
+
+from mock import Mock
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from .metrics import (Aggregator, FileSink, Metrics, UDPSink, configure,
+                      metrics, sink_from_spec)
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .render_cache import render_cache
+from .replay_cache import replay_cache
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+class MetricsTest(unittest.TestCase):
+  def test_disabled(self):
+    disabled = Metrics()
+    self.assertFalse(disabled.enabled)
+    # No per-call objects when instrumentation is off.
+    self.assertIs(disabled.timer("a"), disabled.timer("b"))
+    with disabled.timer("a"):
+      disabled.increment("b")
+
+
+  def test_aggregator(self):
+    sink = Aggregator()
+    enabled = Metrics(sink)
+    with enabled.timer("phase"):
+      pass
+    sink.timing("phase", 0.002)
+    enabled.increment("outcome")
+    enabled.increment("outcome", 2)
+    enabled.gauge("depth", 4)
+    enabled.gauge("depth", 2)
+
+    summary = sink.summary()
+    self.assertEqual(summary["counts"], {"outcome": 3})
+    self.assertEqual(summary["gauges"], {"depth": 2})
+    self.assertEqual(summary["timings"]["phase"]["count"], 2)
+    self.assertAlmostEqual(summary["timings"]["phase"]["max_ms"], 2.0)
+
+    sink.reset()
+    self.assertEqual(sink.summary(),
+                     {"timings": {}, "counts": {}, "gauges": {}})
+
+
+  def test_file_sink(self):
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    self.addCleanup(os.remove, path)
+
+    sink = FileSink(path)
+    sink.timing("phase", 0.5)
+    sink.increment("outcome")
+    sink.gauge("depth", 3)
+    with open(path) as f:
+      records = [json.loads(line) for line in f]
+
+    self.assertEqual([(r["type"], r["name"]) for r in records],
+                     [("timing", "schoolyourself.phase"),
+                      ("count", "schoolyourself.outcome"),
+                      ("gauge", "schoolyourself.depth")])
+    self.assertEqual(records[0]["ms"], 500)
+
+
+  def test_udp_sink(self):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.addCleanup(receiver.close)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+
+    sink = UDPSink("127.0.0.1", receiver.getsockname()[1])
+    sink.increment("outcome")
+    sink.timing("phase", 0.25)
+    sink.gauge("depth", 3)
+    self.assertEqual(receiver.recv(1024), b"schoolyourself.outcome:1|c")
+    self.assertEqual(receiver.recv(1024), b"schoolyourself.phase:250.000|ms")
+    self.assertEqual(receiver.recv(1024), b"schoolyourself.depth:3|g")
+
+
+  def test_sink_from_spec(self):
+    self.assertIsNone(sink_from_spec(""))
+    self.assertIsInstance(sink_from_spec("memory"), Aggregator)
+    self.assertEqual(sink_from_spec("file:/tmp/x").path, "/tmp/x")
+    self.assertEqual(sink_from_spec("udp:localhost:8125").address,
+                     ("localhost", 8125))
+    self.assertRaises(ValueError, sink_from_spec, "carrier-pigeon")
+
+
+class InstrumentedBlocksTest(unittest.TestCase):
+  def setUp(self):
+    self.sink = Aggregator()
+    previous = metrics.sink
+    configure(self.sink)
+    self.addCleanup(configure, previous)
+
+
+  def test_student_view_phases(self):
+    render_cache.clear()
+    block = SchoolYourselfLessonXBlock(Mock(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.student_view()
+    self.assertEqual(sorted(self.sink.summary()["timings"]),
+                     ["lesson.student_view.fragment",
+                      "lesson.student_view.urls",
+                      "student_view.fill",
+                      "student_view.sign",
+                      "template.load",
+                      "template.render"])
+
+
+  def test_handle_grade_outcomes(self):
+    block = SchoolYourselfReviewXBlock(Mock(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+    replay_cache.clear()
+
+    block.handle_grade_json("foo")
+    block.handle_grade_json({})
+    block.handle_grade_json({"mastery": {"algebra/multiplication": 0.7},
+                             "user_id": "foo",
+                             "signature": "asdf"})
+    block.handle_grade_json({"mastery": {"algebra/multiplication": 0.7},
+                             "user_id": "foo",
+                             "signature": "f0cc345470c322e0c6f41d541fe2b736"})
+    block.handle_grade_json({"mastery": {"algebra/multiplication": 0.7},
+                             "user_id": "foo",
+                             "signature": "f0cc345470c322e0c6f41d541fe2b736"})
+
+    summary = self.sink.summary()
+    self.assertEqual(summary["counts"],
+                     {"handle_grade.bad_request": 1,
+                      "handle_grade.forbidden": 1,
+                      "handle_grade.invalid_signature": 1,
+                      "handle_grade.ok": 1,
+                      "handle_grade.duplicate": 1,
+                      "handle_grade.published": 1,
+                      "handle_grade.publish_suppressed": 1})
+    self.assertEqual(summary["timings"]["handle_grade.parse"]["count"], 4)
+    self.assertEqual(summary["timings"]["handle_grade.verify"]["count"], 2)
+    # The repeat isn't verified again, but still goes to publish_grade()
+    # (which skips it, since the grade didn't change).
+    self.assertEqual(summary["timings"]["handle_grade.publish"]["count"], 2)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,25 @@
+"""This file runs the player viewport's JavaScript tests, if node is
+installed."""
+
+from __future__ import absolute_import
+import os
+import shutil
+import subprocess
+import unittest
+
+
+TEST_SCRIPT = os.path.join(os.path.dirname(__file__), "lib",
+                           "player_viewport_test.js")
+
+
+@unittest.skipIf(shutil.which("node") is None, "node is not installed")
+class PlayerViewportTest(unittest.TestCase):
+  def test_player_viewport(self):
+    process = subprocess.run(["node", TEST_SCRIPT], stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    self.assertEqual(process.returncode, 0, process.stdout)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,300 @@
+"""Opt-in, sampled profiling of the School Yourself blocks.
+
+When student_view or handle_grade gets slow in production, turning
+this on shows where the time and the memory go, without patching
+anything. It is controlled by environment variables:
+
+  SCHOOLYOURSELF_PROFILE          The fraction of invocations to
+                                  profile, such as 0.01. Unset or 0
+                                  turns profiling off.
+  SCHOOLYOURSELF_PROFILE_DIR      Where the captures go (default:
+                                  schoolyourself-profiles in the
+                                  temporary directory).
+  SCHOOLYOURSELF_PROFILE_MAX_MB   How much room the captures may take
+                                  up (default: 100). The oldest ones
+                                  are deleted to stay under it.
+
+Profiling can also be turned on from code with configure().
+
+The profiled methods are student_view, studio_view, studio_submit and
+handle_grade_json. A sampled invocation runs under cProfile and
+tracemalloc and leaves two files behind, NAME.pstats (for pstats.Stats)
+and NAME.snapshot (for tracemalloc.Snapshot.load()). NAME starts with
+the time, so the names sort oldest first, and ends with the handler,
+the block's usage ID and its module ID. Unless tracemalloc was already
+running, the snapshot only holds what the invocation allocated and
+didn't free. Only one invocation per process is profiled at a time.
+
+To merge the captures into a report of the top hotspots, run
+
+  python -m schoolyourself.profiling DIRECTORY [--top 20]
+      [--handler student_view]
+"""
+
+from __future__ import absolute_import, print_function
+import collections
+import functools
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# cProfile, pstats and argparse are only imported when they are needed,
+# since the blocks import this module whether or not they profile.
+
+
+PROFILE_ENV = "SCHOOLYOURSELF_PROFILE"
+PROFILE_DIR_ENV = "SCHOOLYOURSELF_PROFILE_DIR"
+PROFILE_MAX_MB_ENV = "SCHOOLYOURSELF_PROFILE_MAX_MB"
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(),
+                                 "schoolyourself-profiles")
+DEFAULT_MAX_MB = 100
+
+# How many frames tracemalloc keeps per allocation.
+TRACEBACK_FRAMES = 10
+
+CAPTURE_EXTENSIONS = (".pstats", ".snapshot")
+
+# Anything else in a tag becomes "_". Dashes separate the tags.
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.+]+")
+
+
+def capture_tag(value, limit=60):
+  """Returns a value as it appears in the name of a capture."""
+  return _UNSAFE.sub("_", str(value))[:limit] or "_"
+
+
+def parse_capture_name(name):
+  """Returns the (handler, usage ID, module ID) tags of a capture, from
+  its file name, or None if it isn't one."""
+  base, extension = os.path.splitext(os.path.basename(name))
+  parts = base.split("-")
+  if extension not in CAPTURE_EXTENSIONS or len(parts) != 6:
+    return None
+  return tuple(parts[3:])
+
+
+class Profiler(object):
+    """Decides which invocations to profile, and keeps their captures.
+
+    Nothing is profiled while rate is 0, and the profiled methods only
+    check that before calling straight through.
+    """
+
+    def __init__(self, rate=0.0, directory=None, max_mb=DEFAULT_MAX_MB,
+                 random=random.random):
+      self.rate = rate
+      self.directory = directory or DEFAULT_DIRECTORY
+      self.max_bytes = int(max_mb * 1024 * 1024)
+      self._random = random
+      self._busy = threading.Lock()
+      self._count = 0
+      self.captures = 0
+
+
+    @property
+    def enabled(self):
+      return self.rate > 0
+
+
+    def sample(self):
+      """Returns whether to profile this invocation."""
+      return self.rate > 0 and self._random() < self.rate
+
+
+    def profile(self, tags, function, *args, **kwargs):
+      """Calls function(*args, **kwargs) under the profilers, and saves a
+      capture with the given tags. If another invocation is already
+      being profiled, this one just runs."""
+      if not self._busy.acquire(False):
+        return function(*args, **kwargs)
+      try:
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+          profile.enable()
+        except ValueError:
+          # Some other profiler is running (there can only be one on
+          # recent Pythons).
+          return function(*args, **kwargs)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+          tracemalloc.start(TRACEBACK_FRAMES)
+        try:
+          return function(*args, **kwargs)
+        finally:
+          profile.disable()
+          snapshot = tracemalloc.take_snapshot().filter_traces(
+              [tracemalloc.Filter(False, tracemalloc.__file__)])
+          if started_tracing:
+            tracemalloc.stop()
+          self.save(tags, profile, snapshot)
+      finally:
+        self._busy.release()
+
+
+    def save(self, tags, profile, snapshot):
+      """Writes a capture and makes room for it. A full or read-only
+      disk loses the capture, but never fails the request."""
+      self._count += 1
+      name = "-".join(["%013d" % (time.time() * 1000), str(os.getpid()),
+                       "%06d" % self._count] +
+                      [capture_tag(tag) for tag in tags])
+      path = os.path.join(self.directory, name)
+      try:
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(path + ".pstats")
+        snapshot.dump(path + ".snapshot")
+        self.captures += 1
+        self.rotate()
+      except (IOError, OSError):
+        pass
+
+
+    def rotate(self):
+      """Deletes the oldest captures until they fit in max_bytes."""
+      sizes = []
+      for name in os.listdir(self.directory):
+        if parse_capture_name(name) is None:
+          continue
+        try:
+          sizes.append((name, os.path.getsize(
+              os.path.join(self.directory, name))))
+        except OSError:
+          pass  # Another process rotated it away.
+
+      total = sum(size for _, size in sizes)
+      for name, size in sorted(sizes):
+        if total <= self.max_bytes:
+          break
+        try:
+          os.remove(os.path.join(self.directory, name))
+        except OSError:
+          pass
+        total -= size
+
+
+def profiler_from_environment(environ=os.environ):
+  rate = float(environ.get(PROFILE_ENV, "") or 0)
+  return Profiler(rate, environ.get(PROFILE_DIR_ENV, "") or None,
+                  float(environ.get(PROFILE_MAX_MB_ENV, "") or
+                        DEFAULT_MAX_MB))
+
+
+profiler = profiler_from_environment()
+
+
+def configure(rate, directory=None, max_mb=DEFAULT_MAX_MB):
+  """Profiles the given fraction of invocations from now on, keeping
+  the captures in directory. Pass a rate of 0 to turn profiling off."""
+  profiler.rate = rate
+  profiler.directory = directory or DEFAULT_DIRECTORY
+  profiler.max_bytes = int(max_mb * 1024 * 1024)
+
+
+def profiled(handler):
+  """Decorates a block method so that the profiler samples it, tagged
+  with the handler name and the block's usage and module IDs."""
+  def decorator(method):
+    @functools.wraps(method)
+    def wrapper(block, *args, **kwargs):
+      if not profiler.sample():
+        return method(block, *args, **kwargs)
+      tags = (handler, block.scope_ids.usage_id,
+              getattr(block, "module_id", ""))
+      return profiler.profile(tags, method, block, *args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def find_captures(paths, handler=None):
+  """Returns the sorted capture files in the given files and
+  directories, optionally only those of one handler."""
+  names = []
+  for path in paths:
+    if os.path.isdir(path):
+      names.extend(os.path.join(path, name) for name in os.listdir(path))
+    else:
+      names.append(path)
+
+  captures = []
+  for name in sorted(names):
+    tags = parse_capture_name(name)
+    if tags is not None and (handler is None or tags[0] == handler):
+      captures.append(name)
+  return captures
+
+
+def summarize(paths, top=20, handler=None, out=sys.stdout):
+  """Merges captures and prints the top functions by their own time,
+  and the top lines by the memory they allocated.
+
+  Returns:
+      The number of invocations that were merged.
+  """
+  captures = find_captures(paths, handler)
+  stats_files = [name for name in captures if name.endswith(".pstats")]
+  snapshot_files = [name for name in captures if name.endswith(".snapshot")]
+
+  handlers = collections.Counter(parse_capture_name(name)[0]
+                                 for name in stats_files)
+  print("%d captures: %s" % (len(stats_files), ", ".join(
+      "%s: %d" % item for item in sorted(handlers.items()))), file=out)
+  if stats_files:
+    import pstats
+    # function -> (primitive calls, calls, own time, cumulative time,
+    # callers), summed over the captures.
+    functions = pstats.Stats(*stats_files).stats
+    print("\nTop %d functions by own time, over %d captures:" % (
+        top, len(stats_files)), file=out)
+    print("%10s %12s %12s  %s" % ("calls", "own ms", "cum ms", "function"),
+          file=out)
+    for function, (_, calls, own, cumulative, _) in sorted(
+        functions.items(), key=lambda item: -item[1][2])[:top]:
+      print("%10d %12.3f %12.3f  %s" % (
+          calls, own * 1000, cumulative * 1000, pstats.func_std_string(
+              function)), file=out)
+
+  if snapshot_files:
+    print(file=out)
+    sizes = collections.Counter()
+    counts = collections.Counter()
+    for name in snapshot_files:
+      for stat in tracemalloc.Snapshot.load(name).statistics("lineno"):
+        frame = stat.traceback[0]
+        line = "%s:%d" % (frame.filename, frame.lineno)
+        sizes[line] += stat.size
+        counts[line] += stat.count
+    print("Top %d lines by memory allocated, over %d captures:" % (
+        top, len(snapshot_files)), file=out)
+    for line, size in sizes.most_common(top):
+      print("%10.1f KiB %8d blocks  %s" % (size / 1024.0, counts[line], line),
+            file=out)
+  return len(stats_files)
+
+
+def main(argv=None):
+  import argparse
+  parser = argparse.ArgumentParser(
+      description="Merges School Yourself profiling captures into a "
+                  "report of the top hotspots.")
+  parser.add_argument("paths", nargs="*", default=[DEFAULT_DIRECTORY],
+                      help="Capture directories or files (default: %s)." %
+                           DEFAULT_DIRECTORY)
+  parser.add_argument("--top", type=int, default=20,
+                      help="How many functions and lines to show.")
+  parser.add_argument("--handler",
+                      help="Only merge the captures of this handler, such "
+                           "as student_view.")
+  args = parser.parse_args(argv)
+  return 0 if summarize(args.paths, args.top, args.handler) else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,202 @@
+"""This file contains a unit test for the sampled profiling hooks."""
+
+from __future__ import absolute_import
+import io
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+from mock import Mock
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from . import profiling
+from .profiling import (Profiler, capture_tag, find_captures,
+                        parse_capture_name, profiler_from_environment,
+                        summarize)
+from .render_cache import render_cache
+from .replay_cache import replay_cache
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+from .signing import signer
+
+
+def allocate(n):
+  return [str(i) for i in range(n)]
+
+
+class ProfilerTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+
+
+  def captures(self):
+    return sorted(os.listdir(self.directory))
+
+
+  def test_disabled(self):
+    disabled = Profiler()
+    self.assertFalse(disabled.enabled)
+    self.assertFalse(disabled.sample())
+
+
+  def test_sampling(self):
+    values = iter([0.5, 0.05, 0.1])
+    sampled = Profiler(0.1, random=lambda: next(values))
+    self.assertEqual([sampled.sample() for i in range(3)],
+                     [False, True, False])
+
+
+  def test_environment(self):
+    environment = profiler_from_environment({
+      "SCHOOLYOURSELF_PROFILE": "0.25",
+      "SCHOOLYOURSELF_PROFILE_DIR": self.directory,
+      "SCHOOLYOURSELF_PROFILE_MAX_MB": "1"})
+    self.assertEqual(environment.rate, 0.25)
+    self.assertEqual(environment.directory, self.directory)
+    self.assertEqual(environment.max_bytes, 1024 * 1024)
+    self.assertFalse(profiler_from_environment({}).enabled)
+
+
+  def test_tags(self):
+    self.assertEqual(capture_tag("block-v1:SY+Algebra/x y"),
+                     "block_v1_SY+Algebra_x_y")
+    self.assertEqual(capture_tag(""), "_")
+    self.assertEqual(parse_capture_name(
+        "/tmp/0000000000001-42-1-student_view-x-algebra_multiplication"
+        ".pstats"), ("student_view", "x", "algebra_multiplication"))
+    self.assertIsNone(parse_capture_name("notes.txt"))
+    self.assertIsNone(parse_capture_name("1-2.pstats"))
+
+
+  def test_capture(self):
+    profiler = Profiler(1.0, self.directory)
+    tracing = tracemalloc.is_tracing()
+    result = profiler.profile(("handler", "block-v1:x", "a/b"),
+                              allocate, 1000)
+    self.assertEqual(len(result), 1000)
+    self.assertEqual(tracemalloc.is_tracing(), tracing)
+
+    names = self.captures()
+    self.assertEqual(len(names), 2)
+    self.assertTrue(
+        names[0].endswith("-000001-handler-block_v1_x-a_b.pstats"))
+    self.assertTrue(names[1].endswith(".snapshot"))
+
+    stats = pstats.Stats(os.path.join(self.directory, names[0]))
+    self.assertIn("allocate", [function for _, _, function in stats.stats])
+    snapshot = tracemalloc.Snapshot.load(
+        os.path.join(self.directory, names[1]))
+    self.assertTrue(snapshot.statistics("lineno"))
+
+
+  def test_exceptions_still_captured(self):
+    profiler = Profiler(1.0, self.directory)
+    with self.assertRaises(ZeroDivisionError):
+      profiler.profile(("handler", "x", "y"), lambda: 1 / 0)
+    self.assertEqual(len(self.captures()), 2)
+
+
+  def test_one_at_a_time(self):
+    profiler = Profiler(1.0, self.directory)
+    self.assertEqual(profiler.profile(
+        ("outer", "x", "y"), profiler.profile, ("inner", "x", "y"),
+        allocate, 10), allocate(10))
+    self.assertEqual(profiler.captures, 1)
+    self.assertEqual([parse_capture_name(name)[0]
+                      for name in self.captures()], ["outer", "outer"])
+
+
+  def test_rotation(self):
+    profiler = Profiler(1.0, self.directory)
+    profiler.profile(("first", "x", "y"), allocate, 10)
+    profiler.max_bytes = sum(
+        os.path.getsize(os.path.join(self.directory, name))
+        for name in self.captures()) + 1000
+    with open(os.path.join(self.directory, "notes.txt"), "w") as f:
+      f.write("x" * 100000)
+
+    profiler.profile(("second", "x", "y"), allocate, 10)
+    names = self.captures()
+    self.assertIn("notes.txt", names)
+    self.assertEqual(set(parse_capture_name(name)[0]
+                         for name in names if name != "notes.txt"),
+                     set(["second"]))
+
+
+  def test_unwritable_directory(self):
+    path = os.path.join(self.directory, "file")
+    with open(path, "w") as f:
+      f.write("in the way")
+    profiler = Profiler(1.0, path)
+    self.assertEqual(profiler.profile(("a", "b", "c"), allocate, 1), ["0"])
+    self.assertEqual(profiler.captures, 0)
+
+
+class ProfiledBlockTest(unittest.TestCase):
+  def setUp(self):
+    render_cache.clear()
+    replay_cache.clear()
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    profiling.configure(1.0, self.directory)
+    self.addCleanup(profiling.configure, 0)
+
+    runtime = Mock()
+    runtime.handler_url.return_value = "/handler/mastery"
+    runtime.local_resource_url.return_value = "/icon.png"
+    self.review = SchoolYourselfReviewXBlock(
+        runtime, DictFieldData({"module_id": "algebra/multiplication",
+                                "shared_key": "key"}),
+        ScopeIds("foo", "bar", "baz", "review"))
+    self.lesson = SchoolYourselfLessonXBlock(
+        runtime, DictFieldData({}), ScopeIds("foo", "bar", "baz", "lesson"))
+
+
+  def test_handlers(self):
+    self.review.student_view()
+    self.review.studio_view()
+    self.assertEqual(self.review.handle_grade_json(signer.mastery_message(
+        "key", "debug", {"algebra/multiplication": 0.7})), 1.0)
+    self.lesson.studio_submit.__wrapped__(
+        self.lesson, {"module_id": "geometry/lines_rays"})
+    self.assertEqual(self.lesson.module_id, "geometry/lines_rays")
+
+    self.assertEqual(
+        [parse_capture_name(name) for name in find_captures([self.directory])
+         if name.endswith(".pstats")],
+        [("student_view", "review", "algebra_multiplication"),
+         ("studio_view", "review", "algebra_multiplication"),
+         ("handle_grade_json", "review", "algebra_multiplication"),
+         ("studio_submit", "lesson", "intro_intro_module")])
+
+
+  def test_summarize(self):
+    self.review.student_view()
+    self.lesson.student_view()
+    self.review.handle_grade_json({})
+
+    out = io.StringIO()
+    self.assertEqual(summarize([self.directory], top=5, out=out), 3)
+    report = out.getvalue()
+    self.assertIn("3 captures: handle_grade_json: 1, student_view: 2",
+                  report)
+    self.assertIn("Top 5 functions by own time, over 3 captures", report)
+    self.assertIn("Top 5 lines by memory allocated, over 3 captures",
+                  report)
+
+    out = io.StringIO()
+    self.assertEqual(summarize([self.directory], top=1000,
+                               handler="student_view", out=out), 2)
+    self.assertIn("(render_student_view)", out.getvalue())
+    self.assertNotIn("(handle_grade_json)", out.getvalue())
+    self.assertEqual(summarize([os.path.join(self.directory, "nothing")],
+                               out=io.StringIO()), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
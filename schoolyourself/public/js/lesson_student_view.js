@@ -3,6 +3,8 @@ function SchoolYourselfLessonStudentView(runtime, element) {
   $(function ($) {
     $('.schoolyourself-lesson-player', element).click(function(eventObject) {
       viewport.openFrame(this.getAttribute('data-url'));
+    }).each(function() {
+      viewport.warmFrameOnInterest(this, this.getAttribute('data-url'));
     });
   });
 }
@@ -0,0 +1,428 @@
+function SchoolYourselfReviewStudentView(runtime, element) {
+  var viewport = schoolyourself.PlayerViewportBuilder.insert(1024, 768);
+  $(function ($) {
+    $('.schoolyourself-lesson-player', element).click(function(eventObject) {
+      viewport.openFrame(this.getAttribute('data-url'));
+    }).each(function() {
+      viewport.warmFrameOnInterest(this, this.getAttribute('data-url'));
+    });
+
+    var submitter = new SchoolYourselfGradeSubmitter(
+        runtime.handlerUrl(element, 'handle_grade'));
+    window.addEventListener('message', function(event) {
+      var frame = viewport.frame();
+      if (!frame || event.source != frame.contentWindow) {
+        return;
+      }
+      submitter.add(event.data);
+    }, false);
+    window.addEventListener('pagehide', function() {
+      submitter.sendBeacon();
+    }, false);
+
+    var player = $('.schoolyourself-lesson-player', element)[0];
+    schoolyourselfMastery.register(element,
+                                   player.getAttribute('data-module-id'),
+                                   player.getAttribute('data-mastery-url'),
+                                   player.getAttribute('data-user-key'),
+                                   player.getAttribute('data-mastery'));
+    viewport.addAfterCloseHandler(function() {
+      // The mastery handler learns about new levels from handle_grade,
+      // so refresh the bar once the last grade has gone through.
+      submitter.flush(function() {
+        schoolyourselfMastery.refresh();
+      });
+    });
+  });
+}
+
+
+/**
+ * Sends the mastery messages that the iframe posts to the block's
+ * handle_grade handler.
+ *
+ * The iframe posts a message after every question, and each one
+ * carries the student's whole mastery level, so only the newest one
+ * matters. Messages are held back until none has arrived for a little
+ * while, and then only the newest is sent. There is never more than one
+ * request in flight, so the grades arrive in order, and a failed
+ * request is retried with exponential backoff unless a newer message
+ * has arrived in the meantime.
+ *
+ * @param {string} handlerUrl The URL of the handle_grade handler.
+ * @constructor
+ */
+function SchoolYourselfGradeSubmitter(handlerUrl) {
+  this.handlerUrl_ = handlerUrl;
+
+  /**
+   * The newest message that hasn't been sent yet, or null.
+   * @type {?Object}
+   */
+  this.pending_ = null;
+
+  /**
+   * The timeout that will send the pending message, or null.
+   * @type {?number}
+   */
+  this.timer_ = null;
+
+  this.inFlight_ = false;
+  this.failures_ = 0;
+
+  /**
+   * Callbacks passed to flush() that are waiting for everything to be
+   * sent.
+   * @type {Array.<function()>}
+   */
+  this.idleCallbacks_ = [];
+}
+
+
+/**
+ * How long to wait for more messages before sending one, in ms.
+ */
+SchoolYourselfGradeSubmitter.DEBOUNCE_MS = 2000;
+
+/**
+ * How long to wait before retrying the first failed request, in ms. The
+ * wait doubles with every failure, up to MAX_BACKOFF_MS.
+ */
+SchoolYourselfGradeSubmitter.BACKOFF_MS = 1000;
+SchoolYourselfGradeSubmitter.MAX_BACKOFF_MS = 30000;
+
+/**
+ * How many times in a row a request can fail before we stop retrying
+ * on our own. Whatever is pending is still sent by the next flush().
+ */
+SchoolYourselfGradeSubmitter.MAX_RETRIES = 5;
+
+
+/**
+ * Queues a message, replacing any message that hasn't been sent yet.
+ * @param {Object} message A signed mastery message from the iframe.
+ */
+SchoolYourselfGradeSubmitter.prototype.add = function(message) {
+  this.pending_ = message;
+  this.failures_ = 0;
+  this.schedule_(SchoolYourselfGradeSubmitter.DEBOUNCE_MS);
+};
+
+
+/**
+ * Sends the pending message right away (or as soon as the request in
+ * flight is done).
+ * @param {function()=} opt_done Called once nothing is left to send.
+ */
+SchoolYourselfGradeSubmitter.prototype.flush = function(opt_done) {
+  if (opt_done) {
+    this.idleCallbacks_.push(opt_done);
+  }
+  this.schedule_(0);
+};
+
+
+/**
+ * Sends the pending message with navigator.sendBeacon(), which works
+ * even while the page is being unloaded.
+ *
+ * Nothing is sent while another request is in flight: the beacon could
+ * overtake it, and the server would then publish the older grade last.
+ * The pending message goes out once that request is done instead, if
+ * the page is still around by then.
+ */
+SchoolYourselfGradeSubmitter.prototype.sendBeacon = function() {
+  if (this.inFlight_) {
+    return;
+  }
+  if (!this.pending_ || !navigator.sendBeacon) {
+    this.flush();
+    return;
+  }
+
+  var blob = new Blob([JSON.stringify(this.pending_)],
+                      {type: 'application/json'});
+  if (navigator.sendBeacon(this.handlerUrl_, blob)) {
+    this.pending_ = null;
+    clearTimeout(this.timer_);
+    this.timer_ = null;
+  } else {
+    this.flush();
+  }
+};
+
+
+SchoolYourselfGradeSubmitter.prototype.schedule_ = function(delay) {
+  clearTimeout(this.timer_);
+  var self = this;
+  this.timer_ = setTimeout(function() {
+    self.timer_ = null;
+    self.send_();
+  }, delay);
+};
+
+
+SchoolYourselfGradeSubmitter.prototype.send_ = function() {
+  if (this.inFlight_) {
+    // The pending message goes out when the request in flight is done.
+    return;
+  }
+  if (!this.pending_) {
+    this.notifyIdle_();
+    return;
+  }
+
+  var message = this.pending_;
+  this.pending_ = null;
+  this.inFlight_ = true;
+
+  var self = this;
+  $.ajax({
+    type: 'POST',
+    url: this.handlerUrl_,
+    data: JSON.stringify(message)
+  }).done(function() {
+    self.failures_ = 0;
+  }).fail(function() {
+    // Try again, unless a newer message has come along.
+    if (!self.pending_) {
+      self.pending_ = message;
+    }
+    self.failures_++;
+  }).always(function() {
+    self.inFlight_ = false;
+    if (!self.pending_) {
+      self.notifyIdle_();
+    } else if (self.failures_) {
+      if (self.failures_ <= SchoolYourselfGradeSubmitter.MAX_RETRIES) {
+        self.schedule_(Math.min(
+            SchoolYourselfGradeSubmitter.BACKOFF_MS *
+                Math.pow(2, self.failures_ - 1),
+            SchoolYourselfGradeSubmitter.MAX_BACKOFF_MS));
+      } else {
+        self.notifyIdle_();
+      }
+    } else if (self.timer_ === null) {
+      // A message arrived and its wait ran out while we were busy.
+      self.send_();
+    }
+  });
+};
+
+
+SchoolYourselfGradeSubmitter.prototype.notifyIdle_ = function() {
+  var callbacks = this.idleCallbacks_;
+  this.idleCallbacks_ = [];
+  for (var i = 0; i < callbacks.length; ++i) {
+    callbacks[i]();
+  }
+};
+
+
+/**
+ * Fetches the mastery levels for all of the review blocks on the page
+ * with a single request, instead of one request per block.
+ *
+ * Every review block registers itself when it gets initialized, and
+ * the first registration schedules a fetch for the end of the current
+ * tick, by which time the other blocks on the page have registered
+ * too. Any block's mastery handler can answer for all of the modules,
+ * so the request goes to the first block's handler with all of the
+ * module IDs in the "tags" param.
+ *
+ * Usually the server has already drawn the bar from the last level
+ * that the block verified, and the fetch only refreshes it in the
+ * background. Otherwise, the last levels we got are kept in
+ * sessionStorage, per user and module, so that the bars can be painted
+ * as soon as the blocks register. The fetch then revalidates them with
+ * If-None-Match, and a bar is only redrawn if its level actually
+ * changed.
+ *
+ * This script is included once per review block, so only the first
+ * copy of it creates the coordinator.
+ */
+var schoolyourselfMastery = window.schoolyourselfMastery || {
+  /**
+   * The registered blocks, as {element, moduleId, masteryUrl, userKey,
+   * mastery} objects, where mastery is the level the bar shows.
+   */
+  blocks_: [],
+
+  /**
+   * True if a fetch has been scheduled but hasn't been sent yet.
+   */
+  scheduled_: false,
+
+  /**
+   * @param {?string} renderedMastery The level that the server drew the
+   *     bar with, if any (the data-mastery attribute).
+   */
+  register: function(element, moduleId, masteryUrl, userKey,
+                     renderedMastery) {
+    var block = {element: element,
+                 moduleId: moduleId,
+                 masteryUrl: masteryUrl,
+                 userKey: userKey,
+                 mastery: null};
+    this.blocks_.push(block);
+
+    if (renderedMastery) {
+      block.mastery = parseFloat(renderedMastery);
+    } else {
+      var saved = this.load_('level', userKey, moduleId);
+      if (saved !== null) {
+        this.render_(block, saved);
+      }
+    }
+    this.refresh();
+  },
+
+  /**
+   * Schedules a fetch of every registered block's mastery level. Calls
+   * made before the fetch goes out are folded into it.
+   */
+  refresh: function() {
+    if (this.scheduled_) {
+      return;
+    }
+    this.scheduled_ = true;
+    var self = this;
+    setTimeout(function() {
+      self.scheduled_ = false;
+      self.fetch_();
+    }, 0);
+  },
+
+  fetch_: function() {
+    if (!this.blocks_.length) {
+      return;
+    }
+
+    var tags = [];
+    var seen = {};
+    for (var i = 0; i < this.blocks_.length; ++i) {
+      var moduleId = this.blocks_[i].moduleId;
+      if (!seen.hasOwnProperty(moduleId)) {
+        seen[moduleId] = true;
+        tags.push(moduleId);
+      }
+    }
+    tags = tags.join(',');
+
+    var url = this.blocks_[0].masteryUrl;
+    url += (url.indexOf('?') == -1 ? '?' : '&') +
+        'tags=' + encodeURIComponent(tags);
+
+    // The response to the same request last time, as {etag, masteries}.
+    var userKey = this.blocks_[0].userKey;
+    var cached = this.load_('response', userKey, tags);
+
+    var self = this;
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', url, true);
+    xhr.withCredentials = true;
+    if (cached && cached.etag) {
+      xhr.setRequestHeader('If-None-Match', cached.etag);
+    }
+    xhr.onreadystatechange = function(event) {
+      if (xhr.readyState !== 4) {
+        return;
+      }
+      if (xhr.status === 304 && cached) {
+        self.update_(cached.masteries);
+      } else if (xhr.status === 200) {
+        var masteries = $.parseJSON(xhr.responseText);
+        self.save_('response', userKey, tags,
+                   {etag: xhr.getResponseHeader('ETag'),
+                    masteries: masteries});
+        self.update_(masteries);
+      }
+    };
+    xhr.send();
+  },
+
+  /**
+   * @param {Array.<Array>} masteries A list of [tag, mastery] pairs.
+   */
+  update_: function(masteries) {
+    var masteryByTag = {};
+    for (var i = 0; i < masteries.length; ++i) {
+      masteryByTag[masteries[i][0]] = masteries[i][1];
+    }
+
+    for (var i = 0; i < this.blocks_.length; ++i) {
+      var block = this.blocks_[i];
+      if (masteryByTag.hasOwnProperty(block.moduleId)) {
+        var mastery = masteryByTag[block.moduleId];
+        this.save_('level', block.userKey, block.moduleId, mastery);
+        this.render_(block, mastery);
+      }
+    }
+  },
+
+  render_: function(block, mastery) {
+    if (block.mastery === mastery) {
+      return;
+    }
+    block.mastery = mastery;
+    renderMastery(block.element, mastery);
+  },
+
+  /**
+   * Reads a value saved with save_(), or returns null. Storage can be
+   * full or disabled, in which case we just do without it.
+   */
+  load_: function(kind, userKey, name) {
+    try {
+      var value = window.sessionStorage.getItem(
+          this.storageKey_(kind, userKey, name));
+      return value === null ? null : JSON.parse(value);
+    } catch (e) {
+      return null;
+    }
+  },
+
+  save_: function(kind, userKey, name, value) {
+    try {
+      window.sessionStorage.setItem(this.storageKey_(kind, userKey, name),
+                                    JSON.stringify(value));
+    } catch (e) {
+    }
+  },
+
+  storageKey_: function(kind, userKey, name) {
+    return 'schoolyourself.mastery.' + kind + '.' + userKey + '.' + name;
+  }
+};
+
+
+/**
+ * Updates the mastery bar inside the given block's element.
+ * mastery_bar() in schoolyourself_review.py draws the same bar on the
+ * server, so keep the two in sync.
+ */
+function renderMastery(element, mastery) {
+  // A mastery level of 0.7 gives full credit -- anything beyond that
+  // doesn't count toward anything. So we should show a full, green bar
+  // when scaledMastery >= 0.7.
+  var scaledMastery = mastery / 0.7;
+
+  var right = (100 - (scaledMastery * 100)) + '%';
+
+  var color = '#fcd380';
+  if (!scaledMastery) {
+    var text = 'Get started!';
+  } else if (scaledMastery < 0.5) {
+    var text = 'Keep practicing!';
+  } else if (scaledMastery < 1) {
+    var text = 'Almost there!';
+    var color = '#f0b300';
+  } else {
+    var text = 'Complete!';
+    var color = '#6eb535';
+  }
+
+  $('.schoolyourself-review-mastery-text', element).html(text);
+  $('.schoolyourself-review-mastery-bar-filler', element).css(
+      {'right': right, 'background': color});
+}
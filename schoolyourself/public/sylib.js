@@ -1,7 +1,12 @@
-(function() {function f(a,b){return function(){return b.apply(a,arguments)}}function k(a,b,c){a=document.createElement(a);c&&a.setAttribute("class",c);b&&b.appendChild(a);return a}var l=["","-moz-","-webkit-","-o-","-ms-"];function m(a,b,c){for(var d=0;d<l.length;++d)a.style.setProperty(l[d]+b,c)};var n=this;function p(a,b){var c=a.split("."),d=n;c[0]in d||!d.execScript||d.execScript("var "+c[0]);for(var e;c.length&&(e=c.shift());)c.length||void 0===b?d=d[e]?d[e]:d[e]={}:d[e]=b};schoolyourself=window.schoolyourself||{};schoolyourself.g=function(a,b,c,d,e){this.h=a;this.p=b;this.i=c;this.n=d;this.m=e;this.l=!1;this.q=null;this.j=[];this.k=null};p("schoolyourself.PlayerViewport",schoolyourself.g);
-schoolyourself.g.prototype.resize=function(){if(this.l){var a=Math.min(this.h.offsetWidth,this.n),b=Math.min(this.h.offsetHeight,this.m),c=this.n/this.m;a/b<c?b=a/c:a=c*b;a=Math.floor(a);b=Math.floor(b);this.p.style.width=a+"px";this.p.style.height=b+"px";a=this.n/a;b=this.m/b;m(this.i,"transform",1>=a&&1>=b?"":a>b?"scale("+1/a+")":"scale("+1/b+")");m(this.i,"transform-origin","0 0")}};
-schoolyourself.g.prototype.u=function(a){var b=k("iframe",this.i,"player-viewport-frame");b.setAttribute("tabindex",0);b.focus();b.src=a;b.scrolling="no";this.k=b;a=this.h;b=a.getAttribute("class");if(null===b)a.setAttribute("class","open");else{var c=a.getAttribute("class");null!==c&&-1!=c.split(" ").indexOf("open")||a.setAttribute("class",b+" open")}this.l=!0;this.resize()};schoolyourself.g.prototype.openFrame=schoolyourself.g.prototype.u;
-schoolyourself.g.prototype.close=function(){if(!this.q||this.q()){this.l=!1;this.i.innerHTML="";var a=this.h,b=a.getAttribute("class");if(null!==b){for(var b=b.split(" "),c="",d=0;d<b.length;++d)"open"!=b[d]&&(c+=b[d]+" ");c=c.trim();a.setAttribute("class",c)}this.k=null;for(a=0;a<this.j.length;++a)this.j[a]()}};schoolyourself.g.prototype.s=function(a){this.j.push(a)};schoolyourself.g.prototype.addAfterCloseHandler=schoolyourself.g.prototype.s;schoolyourself.g.prototype.frame=function(){return this.k};
+(function() {function f(a,b){return function(){return b.apply(a,arguments)}}function k(a,b,c){a=document.createElement(a);c&&a.setAttribute("class",c);b&&b.appendChild(a);return a}var l=["","-moz-","-webkit-","-o-","-ms-"];function m(a,b,c){for(var d=0;d<l.length;++d)a.style.setProperty(l[d]+b,c)}function q(a,b){var c=a.getAttribute("class");return null!==c&&-1!=c.split(" ").indexOf(b)}function r(a,b){var c=a.getAttribute("class");if(null!==c){for(var c=c.split(" "),d="",e=0;e<c.length;++e)c[e]!=b&&(d+=c[e]+" ");a.setAttribute("class",d.trim())}}function y(a){return window.requestAnimationFrame?window.requestAnimationFrame(a):window.setTimeout(a,16)}function z(a){window.cancelAnimationFrame?window.cancelAnimationFrame(a):window.clearTimeout(a)}function s(a){window.performance&&performance.mark&&performance.mark(a)}function t(a,b){window.performance&&performance.measure&&performance.measure(a,b)};var n=this;function p(a,b){var c=a.split("."),d=n;c[0]in d||!d.execScript||d.execScript("var "+c[0]);for(var e;c.length&&(e=c.shift());)c.length||void 0===b?d=d[e]?d[e]:d[e]={}:d[e]=b};schoolyourself=window.schoolyourself||{};schoolyourself.g=function(a,b,c,d,e){this.h=a;this.p=b;this.i=c;this.n=d;this.m=e;this.l=!1;this.q=null;this.j=[];this.k=null;this.A=null;this.B=null;this.C=null;this.D=f(this,this.E)};p("schoolyourself.PlayerViewport",schoolyourself.g);
+schoolyourself.g.prototype.resize=function(){if(this.l){var a=Math.min(this.h.offsetWidth,this.n),b=Math.min(this.h.offsetHeight,this.m),c=this.n/this.m;a/b<c?b=a/c:a=c*b;a=Math.floor(a);b=Math.floor(b);var c=this.n/a,d=this.m/b,c=1>=c&&1>=d?"":c>d?"scale("+1/c+")":"scale("+1/d+")",d=a+" "+b+" "+c;d!=this.A&&(this.A=d,this.p.style.width=a+"px",this.p.style.height=b+"px",m(this.i,"transform",c),m(this.i,"transform-origin","0 0"))}};
+schoolyourself.g.prototype.E=function(){if(null===this.B){var a=this;this.B=y(function(){a.B=null;a.resize()})}};schoolyourself.g.prototype.F=function(){this.C||(window.ResizeObserver?(this.C=new ResizeObserver(this.D),this.C.observe(this.h)):(window.addEventListener("resize",this.D,!1),this.C=!0))};schoolyourself.g.prototype.G=function(){!0===this.C?window.removeEventListener("resize",this.D,!1):this.C&&this.C.disconnect();this.C=null;null!==this.B&&(z(this.B),this.B=null)};
+schoolyourself.g.w=[];schoolyourself.g.x=function(){var a=navigator.connection;if(a&&a.saveData)return 0;a=50331648;navigator.deviceMemory&&4>navigator.deviceMemory&&(a/=2);return Math.min(2,Math.floor(a/25165824))};
+schoolyourself.g.prototype.u=function(a){s("schoolyourself.viewport.open");var b=this.v(a),c;b?(c=b.frame,r(c,"player-viewport-warm"),c.removeAttribute("aria-hidden"),c.setAttribute("tabindex",0),c.focus()):(c=k("iframe",this.i,"player-viewport-frame"),c.setAttribute("tabindex",0),c.focus(),c.src=a,c.scrolling="no");this.k=c;var d="schoolyourself.viewport.ready."+(b?"warm":"cold");b&&b.loaded?t(d,"schoolyourself.viewport.open"):c.addEventListener("load",function h(){c.removeEventListener("load",h,!1);t(d,"schoolyourself.viewport.open")},!1);a=this.h;b=a.getAttribute("class");if(null===b)a.setAttribute("class","open");else{var e=a.getAttribute("class");null!==e&&-1!=e.split(" ").indexOf("open")||a.setAttribute("class",b+" open")}this.l=!0;this.F();this.resize()};schoolyourself.g.prototype.openFrame=schoolyourself.g.prototype.u;
+schoolyourself.g.prototype.warmFrame=function(a){for(var b=schoolyourself.g.w,c=0;c<b.length;++c)if(b[c].viewport==this&&b[c].url==a){b.push(b.splice(c,1)[0]);return}c=schoolyourself.g.x();if(!this.l&&!(1>c)){for(;b.length>=c;){var d=b.shift();d.frame.parentNode.removeChild(d.frame)}var e=k("iframe",this.i,"player-viewport-frame player-viewport-warm");e.setAttribute("tabindex",-1);e.setAttribute("aria-hidden","true");e.src=a;e.scrolling="no";var h={viewport:this,url:a,frame:e,loaded:!1};e.addEventListener("load",function g(){e.removeEventListener("load",g,!1);h.loaded=!0},!1);b.push(h)}};
+schoolyourself.g.prototype.warmFrameOnInterest=function(a,b){var c=f(this,function(){this.warmFrame(b)});a.addEventListener("mouseenter",c,!1);a.addEventListener("focus",c,!0);if(window.IntersectionObserver){var d=null,e=new IntersectionObserver(function(a){clearTimeout(d);d=a[a.length-1].isIntersecting?setTimeout(function(){e.disconnect();c()},1E3):null},{threshold:.5});e.observe(a)}};
+schoolyourself.g.prototype.v=function(a){for(var b=schoolyourself.g.w,c=0;c<b.length;++c)if(b[c].viewport==this&&b[c].url==a)return b.splice(c,1)[0];return null};
+schoolyourself.g.prototype.close=function(){if(!this.q||this.q()){this.l=!1;this.G();for(var a=this.i.children,b=a.length-1;0<=b;--b)q(a[b],"player-viewport-warm")||this.i.removeChild(a[b]);var a=this.h,b=a.getAttribute("class");if(null!==b){for(var b=b.split(" "),c="",d=0;d<b.length;++d)"open"!=b[d]&&(c+=b[d]+" ");c=c.trim();a.setAttribute("class",c)}this.k=null;for(a=0;a<this.j.length;++a)this.j[a]()}};schoolyourself.g.prototype.s=function(a){this.j.push(a)};schoolyourself.g.prototype.addAfterCloseHandler=schoolyourself.g.prototype.s;schoolyourself.g.prototype.frame=function(){return this.k};
 schoolyourself.g.prototype.frame=schoolyourself.g.prototype.frame;schoolyourself.o=function(){};
 schoolyourself.o.t=function(a,b){var c=k("div",document.body,"schoolyourself player-viewport-container"),d=k("div",c,"player-viewport-curtain"),e=k("div",d,"player-viewport-content"),c=k("a",d,"player-viewport-x");c.href="#";var h=k("div",e,"player-viewport-scaler");e.style.width=a+"px";e.style.height=b+"px";h.style.width=a+"px";h.style.height=b+"px";var g=k("span");g.style.height="100%";g.style.display="inline-block";g.style.setProperty("vertical-align","middle");g.style.setProperty("font-size",
-"0");d.appendChild(g);d=new schoolyourself.g(d,e,h,a,b);c.onclick=f(d,d.close);window.addEventListener("resize",f(d,d.resize),!1);return d};p("schoolyourself.PlayerViewportBuilder.insert",schoolyourself.o.t);})();
\ No newline at end of file
+"0");d.appendChild(g);d=new schoolyourself.g(d,e,h,a,b);c.onclick=f(d,d.close);return d};p("schoolyourself.PlayerViewportBuilder.insert",schoolyourself.o.t);})();
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""An optional background queue for publishing grades.
+
+Normally the review block calls runtime.publish() for a grade right
+inside the handle_grade request, so the request takes as long as the
+LMS needs to persist the grade. With the queue turned on, the handler
+only verifies the signature and puts the grade on a bounded in-process
+queue, and a background thread publishes it.
+
+While a grade is waiting in the queue, a newer grade for the same user
+and block replaces it, since only the latest one matters.
+
+The queue is turned on with the SCHOOLYOURSELF_ASYNC_GRADES environment
+variable, whose value is the queue size (e.g. "10000"). Note that the
+runtime's publish() then runs outside of the request that produced the
+grade, so only use this with runtimes that allow that.
+"""
+
+from __future__ import absolute_import
+import atexit
+import collections
+import logging
+import os
+import threading
+import time
+
+from .metrics import metrics
+
+
+ASYNC_GRADES_ENV = "SCHOOLYOURSELF_ASYNC_GRADES"
+
+# What put() does when the queue is full:
+OVERFLOW_PUBLISH = "publish"  # Publish in the calling thread instead.
+OVERFLOW_BLOCK = "block"  # Wait for room, then publish in the caller.
+OVERFLOW_DROP = "drop"  # Throw the grade away (and count it).
+
+# What put() did with a grade:
+QUEUED = "queued"  # Waiting for the worker (maybe merged into another).
+PUBLISHED = "published"  # Published in the calling thread.
+DROPPED = "dropped"  # Thrown away; the LMS never hears about it.
+
+log = logging.getLogger(__name__)
+
+
+class GradePublishQueue(object):
+    """A bounded queue of grade events, drained by a worker thread.
+
+    Entries are keyed by (user, block), and a new entry for a key that
+    is already waiting replaces the old one without losing its place.
+    """
+
+    def __init__(self, max_size=10000, overflow=OVERFLOW_PUBLISH,
+                 block_timeout=1.0):
+      if overflow not in (OVERFLOW_PUBLISH, OVERFLOW_BLOCK, OVERFLOW_DROP):
+        raise ValueError("Unknown overflow behavior: %r" % overflow)
+      self.max_size = max_size
+      self.overflow = overflow
+      self.block_timeout = block_timeout
+
+      # (User, block) -> (runtime, block, event)
+      self._pending = collections.OrderedDict()
+      self._in_flight = 0
+      self._condition = threading.Condition()
+      self._thread = None
+      self._stopping = False
+
+
+    def depth(self):
+      """Returns the number of grades waiting to be published."""
+      with self._condition:
+        return len(self._pending)
+
+
+    def put(self, runtime, block, event):
+      """Queues a grade event for runtime.publish(block, "grade", event).
+
+      Returns:
+          QUEUED if the grade was queued (or merged into a queued
+          grade), PUBLISHED if it was published right away, or DROPPED
+          if the queue was full and the overflow behavior is
+          OVERFLOW_DROP. After shutdown(), grades are always published
+          right away, whatever the overflow behavior.
+      """
+      key = (block.scope_ids.user_id, str(block.scope_ids.usage_id))
+      with self._condition:
+        if self._stopping:
+          full = True
+        elif key in self._pending:
+          self._pending[key] = (runtime, block, event)
+          metrics.increment("grade_queue.coalesced")
+          return QUEUED
+        else:
+          full = len(self._pending) >= self.max_size
+          if full and self.overflow == OVERFLOW_BLOCK:
+            deadline = time.time() + self.block_timeout
+            while (len(self._pending) >= self.max_size and
+                   not self._stopping and time.time() < deadline):
+              self._condition.wait(deadline - time.time())
+            full = len(self._pending) >= self.max_size or self._stopping
+
+        stopping = self._stopping
+        if not full:
+          self._pending[key] = (runtime, block, event)
+          self._ensure_worker()
+          self._condition.notify_all()
+          depth = len(self._pending)
+
+      if not full:
+        metrics.increment("grade_queue.enqueued")
+        metrics.gauge("grade_queue.depth", depth)
+        return QUEUED
+
+      if stopping:
+        # There is no worker any more, so this isn't an overflow, and
+        # dropping it would lose the grade for good.
+        self._publish(runtime, block, event)
+        return PUBLISHED
+
+      metrics.increment("grade_queue.overflow")
+      if self.overflow == OVERFLOW_DROP:
+        metrics.increment("grade_queue.dropped")
+        log.warning("Grade queue is full; dropped a grade for %r", key)
+        return DROPPED
+      self._publish(runtime, block, event)
+      return PUBLISHED
+
+
+    def flush(self, timeout=None):
+      """Waits until everything queued so far has been published.
+      Returns False if that didn't happen within the timeout."""
+      deadline = None if timeout is None else time.time() + timeout
+      with self._condition:
+        while self._pending or self._in_flight:
+          if self._thread is None or not self._thread.is_alive():
+            # Nobody is going to drain it, so do it ourselves.
+            self._ensure_worker()
+          remaining = None if deadline is None else deadline - time.time()
+          if remaining is not None and remaining <= 0:
+            return False
+          self._condition.wait(remaining)
+      return True
+
+
+    def shutdown(self, timeout=None):
+      """Publishes everything that is queued and stops the worker. Grades
+      that arrive after this are published synchronously."""
+      flushed = self.flush(timeout)
+      with self._condition:
+        self._stopping = True
+        self._condition.notify_all()
+        thread = self._thread
+      if thread is not None:
+        thread.join(timeout)
+      return flushed
+
+
+    def _ensure_worker(self):
+      # Called with the condition held.
+      if self._stopping:
+        return
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run,
+                                        name="schoolyourself-grades")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def _run(self):
+      while True:
+        with self._condition:
+          while not self._pending and not self._stopping:
+            self._condition.wait()
+          if not self._pending:
+            return
+          _, (runtime, block, event) = self._pending.popitem(last=False)
+          self._in_flight += 1
+          depth = len(self._pending)
+          # There is room now, for anyone waiting in put().
+          self._condition.notify_all()
+
+        metrics.gauge("grade_queue.depth", depth)
+        try:
+          self._publish(runtime, block, event)
+        finally:
+          with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+
+    def _publish(self, runtime, block, event):
+      try:
+        with metrics.timer("grade_queue.publish"):
+          runtime.publish(block, "grade", event)
+        metrics.increment("grade_queue.published")
+      except Exception:  # pylint: disable=broad-except
+        metrics.increment("grade_queue.errors")
+        log.exception("Failed to publish a grade for %r", block.scope_ids)
+
+
+def queue_from_environment():
+  """Creates the process-wide queue if SCHOOLYOURSELF_ASYNC_GRADES asks
+  for one, and makes sure it gets flushed when the process exits."""
+  size = os.environ.get(ASYNC_GRADES_ENV, "")
+  if not size or size == "0":
+    return None
+
+  queue = GradePublishQueue(max_size=int(size))
+  atexit.register(queue.shutdown, 10.0)
+  return queue
+
+
+grade_queue = queue_from_environment()
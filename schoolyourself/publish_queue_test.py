@@ -0,0 +1,246 @@
+"""This file contains a unit test for the background grade queue."""
+
+from __future__ import absolute_import
+import threading
+import unittest
+
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from . import schoolyourself_review
+from .metrics import Aggregator, configure, metrics
+from .publish_queue import (DROPPED, GradePublishQueue, OVERFLOW_BLOCK,
+                            OVERFLOW_DROP, OVERFLOW_PUBLISH, PUBLISHED, QUEUED)
+from .replay_cache import replay_cache
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+class FakeRuntime(object):
+  """A runtime whose publish() records its calls, and can be held up
+  until the test releases it."""
+  def __init__(self):
+    self.published = []
+    self.threads = []
+    self.release = threading.Event()
+    self.release.set()
+    self.entered = threading.Event()
+
+  def publish(self, block, event_type, event):
+    self.entered.set()
+    self.release.wait(5)
+    self.published.append((block.scope_ids.user_id, event_type,
+                           event["value"]))
+    self.threads.append(threading.current_thread())
+
+
+def make_block(user_id, usage_id="usage"):
+  block = Mock()
+  block.scope_ids = ScopeIds(user_id, "type", "def", usage_id)
+  return block
+
+
+class GradePublishQueueTest(unittest.TestCase):
+  def setUp(self):
+    self.runtime = FakeRuntime()
+
+
+  def test_publishes_in_background(self):
+    queue = GradePublishQueue()
+    self.addCleanup(queue.shutdown, 5)
+
+    self.assertEqual(queue.put(self.runtime, make_block("a"), {"value": 0.5}),
+                     QUEUED)
+    self.assertTrue(queue.flush(5))
+    self.assertEqual(self.runtime.published, [("a", "grade", 0.5)])
+    self.assertIsNot(self.runtime.threads[0], threading.current_thread())
+
+
+  def test_coalesces_per_user_and_block(self):
+    queue = GradePublishQueue()
+    self.addCleanup(queue.shutdown, 5)
+
+    # Hold up the worker on a first grade, so the rest pile up.
+    self.runtime.release.clear()
+    queue.put(self.runtime, make_block("x"), {"value": 0.0})
+    self.assertTrue(self.runtime.entered.wait(5))
+
+    queue.put(self.runtime, make_block("a"), {"value": 0.1})
+    queue.put(self.runtime, make_block("b"), {"value": 0.2})
+    queue.put(self.runtime, make_block("a"), {"value": 0.3})
+    queue.put(self.runtime, make_block("a", "other"), {"value": 0.4})
+    self.assertEqual(queue.depth(), 3)
+
+    self.runtime.release.set()
+    self.assertTrue(queue.flush(5))
+    self.assertEqual(self.runtime.published,
+                     [("x", "grade", 0.0), ("a", "grade", 0.3),
+                      ("b", "grade", 0.2), ("a", "grade", 0.4)])
+
+
+  def hold_up_full_queue(self, queue):
+    self.runtime.release.clear()
+    queue.put(self.runtime, make_block("x"), {"value": 0.0})
+    self.assertTrue(self.runtime.entered.wait(5))
+    self.assertEqual(queue.put(self.runtime, make_block("a"), {"value": 0.1}),
+                     QUEUED)
+
+
+  def test_overflow_publish(self):
+    queue = GradePublishQueue(max_size=1, overflow=OVERFLOW_PUBLISH)
+    self.addCleanup(queue.shutdown, 5)
+    self.hold_up_full_queue(queue)
+
+    result = []
+    caller = threading.Thread(target=lambda: result.append(
+        queue.put(self.runtime, make_block("b"), {"value": 0.2})))
+    caller.start()
+    self.runtime.release.set()
+    caller.join(5)
+
+    # The grade that didn't fit got published by the caller itself.
+    self.assertEqual(result, [PUBLISHED])
+    self.assertIn(caller, self.runtime.threads)
+    self.assertTrue(queue.flush(5))
+    self.assertEqual(len(self.runtime.published), 3)
+
+
+  def test_overflow_drop(self):
+    queue = GradePublishQueue(max_size=1, overflow=OVERFLOW_DROP)
+    self.addCleanup(queue.shutdown, 5)
+    sink = Aggregator()
+    previous = metrics.sink
+    configure(sink)
+    self.addCleanup(configure, previous)
+    self.hold_up_full_queue(queue)
+
+    self.assertEqual(queue.put(self.runtime, make_block("b"), {"value": 0.2}),
+                     DROPPED)
+    self.assertEqual(sink.summary()["counts"]["grade_queue.dropped"], 1)
+
+    self.runtime.release.set()
+    self.assertTrue(queue.flush(5))
+    self.assertEqual([user for user, _, _ in self.runtime.published],
+                     ["x", "a"])
+
+
+  def test_overflow_block(self):
+    queue = GradePublishQueue(max_size=1, overflow=OVERFLOW_BLOCK,
+                              block_timeout=5)
+    self.addCleanup(queue.shutdown, 5)
+    self.hold_up_full_queue(queue)
+
+    # Once the worker takes "a" off the queue, there's room for "b".
+    threading.Timer(0.1, self.runtime.release.set).start()
+    self.assertEqual(queue.put(self.runtime, make_block("b"), {"value": 0.2}),
+                     QUEUED)
+    self.assertTrue(queue.flush(5))
+    self.assertEqual([user for user, _, _ in self.runtime.published],
+                     ["x", "a", "b"])
+
+
+  def test_shutdown_flushes(self):
+    queue = GradePublishQueue()
+    for user in ["a", "b", "c"]:
+      queue.put(self.runtime, make_block(user), {"value": 1.0})
+    self.assertTrue(queue.shutdown(5))
+    self.assertEqual(len(self.runtime.published), 3)
+
+    # After shutdown, grades are published synchronously.
+    self.assertEqual(queue.put(self.runtime, make_block("d"), {"value": 1.0}),
+                     PUBLISHED)
+    self.assertEqual(self.runtime.threads[-1], threading.current_thread())
+
+
+  def test_shutdown_publishes_even_with_drop(self):
+    queue = GradePublishQueue(max_size=1, overflow=OVERFLOW_DROP)
+    self.assertTrue(queue.shutdown(5))
+    sink = Aggregator()
+    previous = metrics.sink
+    configure(sink)
+    self.addCleanup(configure, previous)
+
+    self.assertEqual(queue.put(self.runtime, make_block("a"), {"value": 1.0}),
+                     PUBLISHED)
+    self.assertEqual(self.runtime.published, [("a", "grade", 1.0)])
+    self.assertEqual(self.runtime.threads, [threading.current_thread()])
+    self.assertNotIn("grade_queue.dropped", sink.summary()["counts"])
+
+
+  def test_publish_errors_do_not_kill_the_worker(self):
+    queue = GradePublishQueue()
+    self.addCleanup(queue.shutdown, 5)
+    broken = Mock()
+    broken.publish.side_effect = RuntimeError("boom")
+
+    queue.put(broken, make_block("a"), {"value": 1.0})
+    queue.put(self.runtime, make_block("b"), {"value": 1.0})
+    self.assertTrue(queue.flush(5))
+    self.assertEqual(self.runtime.published, [("b", "grade", 1.0)])
+
+
+  def test_unknown_overflow(self):
+    self.assertRaises(ValueError, GradePublishQueue, overflow="explode")
+
+
+class ReviewBlockQueueTest(unittest.TestCase):
+  def setUp(self):
+    replay_cache.clear()
+
+
+  def test_handle_grade_uses_queue(self):
+    runtime = FakeRuntime()
+    block = SchoolYourselfReviewXBlock(runtime, DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+
+    queue = GradePublishQueue()
+    self.addCleanup(queue.shutdown, 5)
+    with patch.object(schoolyourself_review, "grade_queue", queue):
+      self.assertEqual(block.handle_grade_json(
+          {"mastery": {"algebra/multiplication": 0.7},
+           "user_id": "foo",
+           "signature": "f0cc345470c322e0c6f41d541fe2b736"}), 1.0)
+
+    self.assertTrue(queue.flush(5))
+    self.assertEqual(runtime.published, [("foo", "grade", 1.0)])
+    self.assertIsNot(runtime.threads[0], threading.current_thread())
+
+
+
+  def test_dropped_grade_is_tried_again(self):
+    runtime = FakeRuntime()
+    block = SchoolYourselfReviewXBlock(runtime, DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+    message = {"mastery": {"algebra/multiplication": 0.7},
+               "user_id": "foo",
+               "signature": "f0cc345470c322e0c6f41d541fe2b736"}
+
+    # Fill up the queue, so that the first report of the grade is dropped.
+    queue = GradePublishQueue(max_size=1, overflow=OVERFLOW_DROP)
+    self.addCleanup(queue.shutdown, 5)
+    runtime.release.clear()
+    queue.put(runtime, make_block("x"), {"value": 0.0})
+    self.assertTrue(runtime.entered.wait(5))
+    queue.put(runtime, make_block("a"), {"value": 0.1})
+
+    with patch.object(schoolyourself_review, "grade_queue", queue):
+      self.assertEqual(block.handle_grade_json(dict(message)), 1.0)
+      self.assertIsNone(block.last_published_grade)
+
+      runtime.release.set()
+      self.assertTrue(queue.flush(5))
+      self.assertEqual(block.handle_grade_json(dict(message)), 1.0)
+
+    self.assertTrue(queue.flush(5))
+    self.assertEqual(runtime.published, [("x", "grade", 0.0),
+                                         ("a", "grade", 0.1),
+                                         ("foo", "grade", 1.0)])
+    self.assertEqual(block.last_published_grade, 1.0)
+
+
+if __name__ == "__main__":
+  unittest.main()
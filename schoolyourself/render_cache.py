@@ -0,0 +1,105 @@
+"""A process-wide cache of rendered student view fragments.
+
+Almost everything in a block's student view depends only on the block's
+settings and content fields. The only things that differ from student
+to student are a few per-user values, such as the partner_user_id and
+partner_signature URL params. So the blocks render their view once with
+placeholder tokens ("slots") in place of those values, cache the
+result, and for every student after that just substitute the real
+values into the cached HTML.
+"""
+
+from __future__ import absolute_import
+import collections
+import threading
+
+from xblock.fragment import Fragment
+
+
+def slot_token(name):
+  """Returns the placeholder that stands in for the named per-user value.
+
+  The token is made of letters and digits only, so that it comes out
+  unchanged from URL encoding and HTML escaping.
+  """
+  return "SYSLOT%sSYSLOT" % "".join(c for c in name if c.isalnum())
+
+
+class CachedFragment(object):
+    """A rendered fragment with slots for per-user values."""
+
+    def __init__(self, fragment, slot_names):
+      self.fragment_dict = fragment.to_dict()
+      self.tokens = [(name, slot_token(name)) for name in slot_names]
+
+
+    def fill(self, values):
+      """Returns a new Fragment with the slots replaced by the given
+      {slot name: value} values. The values are inserted as-is, so they
+      must already be encoded for wherever the slots appear."""
+      content = self.fragment_dict["content"]
+      for name, token in self.tokens:
+        content = content.replace(token, values[name])
+
+      fragment_dict = dict(self.fragment_dict)
+      fragment_dict["content"] = content
+      return Fragment.from_dict(fragment_dict)
+
+
+class RenderCache(object):
+    """A bounded LRU of CachedFragments.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, max_entries=2000):
+      self.max_entries = max_entries
+      self._entries = collections.OrderedDict()
+      self._lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+
+
+    def get(self, key):
+      with self._lock:
+        entry = self._entries.get(key, None)
+        if entry is None:
+          self.misses += 1
+        else:
+          self.hits += 1
+          self._entries.move_to_end(key)
+        return entry
+
+
+    def put(self, key, entry):
+      with self._lock:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+          self._entries.popitem(last=False)
+
+
+    def discard(self, key):
+      with self._lock:
+        self._entries.pop(key, None)
+
+
+    def clear(self):
+      with self._lock:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self):
+      return len(self._entries)
+
+
+    def hit_ratio(self):
+      """Returns the fraction of lookups that were hits (0 if none)."""
+      with self._lock:
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+render_cache = RenderCache()
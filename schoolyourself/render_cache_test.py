@@ -0,0 +1,136 @@
+"""This file contains a unit test for the rendered student view cache."""
+
+from __future__ import absolute_import
+import unittest
+
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from .render_cache import RenderCache, render_cache
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .schoolyourself_review import SchoolYourselfReviewXBlock
+
+
+class FakeXModuleRuntime(object):
+  def __init__(self, anonymous_student_id):
+    self.anonymous_student_id = anonymous_student_id
+
+
+def make_runtime():
+  runtime = Mock()
+  runtime.local_resource_url.side_effect = (
+      lambda block, uri: "/resource/%s" % uri)
+  runtime.handler_url.side_effect = (
+      lambda block, handler, *args, **kwargs: "/handler/%s" % handler)
+  return runtime
+
+
+class RenderCacheTest(unittest.TestCase):
+  def test_lru(self):
+    cache = RenderCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    self.assertEqual(cache.get("a"), 1)
+    cache.put("c", 3)
+
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual(cache.get("a"), 1)
+    self.assertEqual(cache.get("c"), 3)
+    self.assertEqual(len(cache), 2)
+    self.assertAlmostEqual(cache.hit_ratio(), 0.75)
+
+    cache.discard("a")
+    self.assertIsNone(cache.get("a"))
+    cache.clear()
+    self.assertEqual(len(cache), 0)
+    self.assertEqual(cache.hit_ratio(), 0.0)
+
+
+class CachedStudentViewTest(unittest.TestCase):
+  def setUp(self):
+    render_cache.clear()
+    self.addCleanup(render_cache.clear)
+
+
+  def make_block(self, block_class, user_id):
+    block = block_class(make_runtime(), DictFieldData({}),
+                        ScopeIds("foo", "bar", "baz", "x"))
+    block.module_id = "algebra/multiplication"
+    block.shared_key = "key"
+    block.xmodule_runtime = FakeXModuleRuntime(user_id)
+    return block
+
+
+  def assert_cached_view_matches(self, block_class):
+    first = self.make_block(block_class, "student1")
+    first.student_view()
+
+    # Someone with characters that need escaping in a URL.
+    second = self.make_block(block_class, "student 2&<'\"")
+    with patch.object(block_class, "render_student_view",
+                      wraps=second.render_student_view) as render:
+      cached = second.student_view()
+      self.assertEqual(render.call_count, 0)
+
+    uncached = second.render_student_view(
+        second.get_student_view_user_values())
+    self.assertEqual(cached.content, uncached.content)
+    self.assertEqual(cached.resources, uncached.resources)
+    self.assertEqual(cached.js_init_fn, uncached.js_init_fn)
+    self.assertIn("partner_user_id=student+2%26%3C%27%22", cached.content)
+
+
+  def test_lesson(self):
+    self.assert_cached_view_matches(SchoolYourselfLessonXBlock)
+    self.assertAlmostEqual(render_cache.hit_ratio(), 0.5)
+
+
+  def test_review(self):
+    self.assert_cached_view_matches(SchoolYourselfReviewXBlock)
+    html = self.make_block(SchoolYourselfReviewXBlock,
+                           "student 2&<'\"").student_view().content
+    self.assertIn('data-user-key="student+2%26%3C%27%22"', html)
+
+
+  def test_review_mastery_bar(self):
+    first = self.make_block(SchoolYourselfReviewXBlock, "student1")
+    first.mastery_level = 0.35
+    self.assertIn("Almost there!", first.student_view().content)
+
+    # Same cached rendering, different levels.
+    second = self.make_block(SchoolYourselfReviewXBlock, "student2")
+    html = second.student_view().content
+    self.assertIn('data-mastery=""', html)
+    self.assertNotIn("Almost there!", html)
+    second.mastery_level = 0.7
+    html = second.student_view().content
+    self.assertIn('data-mastery="0.7"', html)
+    self.assertIn('style="right: 0%; background: #6eb535"', html)
+    self.assertEqual(len(render_cache), 1)
+
+
+  def test_no_user(self):
+    block = self.make_block(SchoolYourselfLessonXBlock, None)
+    html = block.student_view().content
+    self.assertNotIn("partner_user_id", html)
+    self.assertEqual(len(render_cache), 0)
+
+
+  def test_settings_change_the_key(self):
+    block = self.make_block(SchoolYourselfLessonXBlock, "student1")
+    block.student_view()
+    old_key = block.student_view_cache_key(
+        block.get_student_view_user_values())
+
+    block.studio_submit.__wrapped__(block, {
+        "module_id": "geometry/lines_rays",
+        "module_title": "Lines and rays"})
+    self.assertIsNone(render_cache.get(old_key))
+    self.assertIn("Lines and rays", block.student_view().content)
+    self.assertNotEqual(block.student_view_cache_key(
+        block.get_student_view_user_values()), old_key)
+
+
+if __name__ == "__main__":
+  unittest.main()
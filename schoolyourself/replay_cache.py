@@ -0,0 +1,111 @@
+"""A cache of the mastery message that handle_grade last accepted.
+
+A signed mastery message never expires, since the signature only covers
+the user ID and the mastery levels, and the review page forwards every
+message the iframe posts. So the same message often arrives several
+times in a row. The review block remembers the signature of the last
+message it accepted for each user, with the mastery level it carried,
+and takes exact repeats of it at their word instead of parsing and
+hashing them again.
+
+Only the last message counts: the same levels can come back after a
+different report (a student who drops from A to B and then gets back
+to A sends A's signature twice), and that has to go through as a
+change like any other.
+"""
+
+from __future__ import absolute_import
+import collections
+import threading
+import time
+
+
+class ReplayCache(object):
+    """Maps a key to the last signature accepted under it, and the value
+    that came with it. Each entry is forgotten ttl seconds after it was
+    added.
+
+    Since every entry lives for the same amount of time, the entries
+    expire in the order they were added, and the oldest ones are the
+    ones that get evicted when there are more than max_entries of them.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, ttl=600, max_entries=100000):
+      self.ttl = ttl
+      self.max_entries = max_entries
+      # Key -> (signature, value, expiry time)
+      self._entries = collections.OrderedDict()
+      self._lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0  # Dropped to make room, before they expired.
+      self.expirations = 0
+
+
+    def get(self, key, signature, now=None):
+      """Returns the value added with the signature, if it is still the
+      last one added under the key, and it was added less than ttl
+      seconds ago. Returns None otherwise."""
+      if now is None:
+        now = time.time()
+
+      with self._lock:
+        entry = self._entries.get(key, None)
+        if entry is not None and entry[0] == signature and entry[2] > now:
+          self.hits += 1
+          return entry[1]
+        self.misses += 1
+        return None
+
+
+    def add(self, key, signature, value, now=None):
+      """Remembers the signature (and the value that goes with it) as the
+      last one accepted under the key."""
+      if now is None:
+        now = time.time()
+
+      with self._lock:
+        self._expire(now)
+        self._entries.pop(key, None)
+        self._entries[key] = (signature, value, now + self.ttl)
+        if len(self._entries) > self.max_entries:
+          self._entries.popitem(last=False)
+          self.evictions += 1
+
+
+    def _expire(self, now):
+      # Called with the lock held.
+      while self._entries:
+        key, entry = next(iter(self._entries.items()))
+        if entry[2] > now:
+          return
+        del self._entries[key]
+        self.expirations += 1
+
+
+    def stats(self):
+      """Returns the hit, miss, eviction and expiration counts and the
+      number of keys, as a dict."""
+      with self._lock:
+        return { "hits": self.hits, "misses": self.misses,
+                 "evictions": self.evictions,
+                 "expirations": self.expirations,
+                 "size": len(self._entries) }
+
+
+    def clear(self):
+      with self._lock:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+    def __len__(self):
+      return len(self._entries)
+
+
+replay_cache = ReplayCache()
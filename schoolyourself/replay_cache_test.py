@@ -0,0 +1,79 @@
+"""This file contains a unit test for the replay cache."""
+
+from __future__ import absolute_import
+import threading
+import unittest
+
+from .replay_cache import ReplayCache
+
+
+class ReplayCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = ReplayCache(ttl=10, max_entries=2)
+
+
+  def test_get(self):
+    self.assertIsNone(self.cache.get("a", "sig", now=0))
+    self.cache.add("a", "sig", 0.5, now=0)
+    self.assertEqual(self.cache.get("a", "sig", now=9), 0.5)
+    self.assertIsNone(self.cache.get("a", "other", now=9))
+    self.assertIsNone(self.cache.get("b", "sig", now=9))
+    self.assertEqual(self.cache.stats(),
+                     {"hits": 1, "misses": 3, "evictions": 0,
+                      "expirations": 0, "size": 1})
+
+
+  def test_only_the_last_signature(self):
+    self.cache.add("a", "first", 0.5, now=0)
+    self.cache.add("a", "second", 0.6, now=1)
+    self.assertIsNone(self.cache.get("a", "first", now=2))
+    self.assertEqual(self.cache.get("a", "second", now=2), 0.6)
+    self.assertEqual(len(self.cache), 1)
+
+
+  def test_expiry(self):
+    self.cache.add("a", "sig", 1, now=0)
+    self.cache.add("b", "sig", 2, now=5)
+    self.assertIsNone(self.cache.get("a", "sig", now=10))
+    self.assertEqual(self.cache.get("b", "sig", now=10), 2)
+
+    self.cache.add("c", "sig", 3, now=10)
+    self.assertEqual(len(self.cache), 2)
+    self.assertEqual(self.cache.stats()["expirations"], 1)
+    self.assertEqual(self.cache.stats()["evictions"], 0)
+
+
+  def test_eviction(self):
+    for key in ["a", "b", "c"]:
+      self.cache.add(key, "sig", key, now=0)
+    self.assertIsNone(self.cache.get("a", "sig", now=0))
+    self.assertEqual(self.cache.get("b", "sig", now=0), "b")
+    self.assertEqual(self.cache.get("c", "sig", now=0), "c")
+    self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    self.cache.clear()
+    self.assertEqual(len(self.cache), 0)
+    self.assertEqual(self.cache.stats()["evictions"], 0)
+
+
+  def test_threads(self):
+    cache = ReplayCache(max_entries=1000)
+    def add(start):
+      for i in range(start, start + 500):
+        cache.add(i, "sig", i)
+        cache.get(i, "sig")
+    threads = [threading.Thread(target=add, args=(i * 500,))
+               for i in range(4)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    stats = cache.stats()
+    self.assertEqual(stats["size"], 1000)
+    self.assertEqual(stats["evictions"], 1000)
+    self.assertEqual(stats["hits"] + stats["misses"], 2000)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -2,17 +2,45 @@
 
 from __future__ import absolute_import
 import hashlib
-import hmac
-import os
-import pkg_resources
-
-from mako.template import Template
+import html
+import importlib.resources
+import urllib.parse
 
 from xblock.core import XBlock
+from xblock.exceptions import NoSuchUsage
 from xblock.fields import Scope, String
 from xblock.fragment import Fragment
 
-
+from .catalog import catalog
+from .course_config import CONFIG_FIELDS, course_config, resolve_config
+from .metrics import metrics
+from .profiling import profiled
+from .render_cache import CachedFragment, render_cache, slot_token
+from .signing import signer
+from .template_cache import registry as template_registry
+
+# Studio and the LMS parse usage IDs into keys, and keep the blocks in
+# the modulestore. The workbench has neither, and doesn't need them.
+try:
+  from opaque_keys import InvalidKeyError
+  from opaque_keys.edx.keys import UsageKey
+except ImportError:
+  InvalidKeyError = UsageKey = None
+try:
+  from xmodule.modulestore.django import modulestore
+  from xmodule.modulestore.exceptions import ItemNotFoundError
+except ImportError:
+  modulestore = ItemNotFoundError = None
+
+# What looking up a block by a usage ID that came in a request can fail
+# with, when the ID is malformed or no block has it.
+BLOCK_LOOKUP_ERRORS = tuple(error for error in (NoSuchUsage, InvalidKeyError,
+                                                ItemNotFoundError)
+                            if error is not None)
+
+
+@XBlock.wants("settings")
+@XBlock.wants("user")
 class SchoolYourselfXBlock(XBlock):
     """Common functionality for the School Yourself XBlocks.
 
@@ -33,7 +61,15 @@ class SchoolYourselfXBlock(XBlock):
     and resume later. Note that a user's grade may *decrease* if they
     master the topic, then come back later and get subsequent
     questions wrong.
+
+    The base URL, shared key and partner ID can also be set for a whole
+    course, in the runtime's settings; see course_config.py. Use
+    get_base_url(), get_shared_key() and get_partner_id() rather than
+    the fields themselves.
     """
+    # Both block types share one bucket of the runtime's XBlock settings.
+    block_settings_key = "SchoolYourself"
+
     display_name = String(
       help="The display name of this component.",
       scope=Scope.settings,
@@ -126,16 +162,44 @@ class SchoolYourselfXBlock(XBlock):
 
     def resource_string(self, path):
       """Handy helper for getting resources from our kit."""
-      data = pkg_resources.resource_string(__name__, path)
-      return data.decode("utf8")
+      return importlib.resources.files(__package__).joinpath(path).read_text(
+          encoding="utf8")
+
+
+    def asset_url(self, path):
+      """Returns the runtime URL for one of the files in public/.
+
+      The path is passed through as it is: the LMS's static pipeline
+      collects public/ under the files' own names (and hashes them and
+      serves them with long-lived cache headers itself), so any other
+      name would not be found there.
+      """
+      return self.runtime.local_resource_url(self, path)
+
+
+    def add_preconnect_hints(self, fragment):
+      """Adds <link> hints to the page's head that get the browser to
+      resolve and connect to the School Yourself server before the
+      student opens the player, instead of after."""
+      url = urllib.parse.urlsplit(self.get_base_url())
+      if not url.netloc:
+        return
+      origin = html.escape("%s://%s" % (url.scheme or "https", url.netloc))
+      fragment.add_resource(
+          '<link rel="preconnect" href="%s">'
+          '<link rel="dns-prefetch" href="%s">' % (origin, origin),
+          "text/html", placement="head")
 
 
     def render_template(self, template_name, context={}):
-      """Another handy helper for rendering Mako templates from our kit."""
+      """Another handy helper for rendering Mako templates from our kit.
 
-      template = Template(self.resource_string(os.path.join("templates",
-                                                            template_name)))
-      return template.render_unicode(**context)
+      The templates are compiled once per process; see template_cache.py.
+      """
+      with metrics.timer("template.load"):
+        template = template_registry.get_template(template_name)
+      with metrics.timer("template.render"):
+        return template.render_unicode(**context)
 
 
     def get_partner_url_params(self, shared_key=None):
@@ -147,25 +211,66 @@ class SchoolYourselfXBlock(XBlock):
       If a shared_key is provided and there is a username to encode,
       we will sign it with the shared key.
       """
-      if not self.partner_id:
-        # Default to "edx" if there's nothing set.
-        partner_id = "edx"
-      else:
-        partner_id = self.partner_id
-
-      url_params = {"partner": partner_id}
+      url_params = {"partner": self.get_partner_id()}
       user_id = self.get_student_id()
       if user_id:
         url_params["partner_user_id"] = user_id
         if shared_key:
-          url_params["partner_signature"] = hmac.new(
-              bytes(shared_key, "utf-8"),
-              bytes(user_id, "utf-8"),
-              digestmod=hashlib.md5).hexdigest()
+          url_params["partner_signature"] = signer.partner_signature(
+              shared_key, user_id)
 
       return url_params
 
 
+    def get_course_id(self):
+      """Returns the ID of this block's course as a string, or None if
+      the runtime doesn't say (like the workbench)."""
+      return course_id_of(self.scope_ids.usage_id)
+
+
+    def get_course_config(self):
+      """Returns the {field: value} configuration of this block's course,
+      which is resolved once per process; see course_config.py."""
+      course_id = self.get_course_id()
+      return course_config.get(course_id,
+                               lambda: self.load_course_config(course_id))
+
+
+    def load_course_config(self, course_id):
+      """Resolves the course configuration from the settings service."""
+      settings = self.runtime.service(self, "settings")
+      bucket = settings.get_settings_bucket(self) if settings else None
+      return resolve_config(bucket, course_id)
+
+
+    def get_config_value(self, name):
+      """Returns the course-level value of one of the CONFIG_FIELDS, or
+      this block's own field when the course doesn't set it."""
+      config = self.get_course_config()
+      if name in config:
+        return config[name]
+      return getattr(self, name)
+
+
+    def get_base_url(self):
+      """Returns the URL of the School Yourself server."""
+      return self.get_config_value("base_url")
+
+
+    def get_shared_key(self):
+      """Returns the key that signs data to and from School Yourself."""
+      return self.get_config_value("shared_key")
+
+
+    def get_partner_id(self):
+      """Returns the partner ID to send in URLs."""
+      partner_id = self.get_config_value("partner_id")
+      if not partner_id:
+        # Default to "edx" if there's nothing set.
+        return "edx"
+      return partner_id
+
+
     def get_display_name(self, module_title):
       """
       This method generates a string that is usable as the display name
@@ -176,12 +281,117 @@ class SchoolYourselfXBlock(XBlock):
       return module_title
 
 
+    # The URL params that carry the per-user values of the student view.
+    USER_URL_PARAMS = ("partner_user_id", "partner_signature")
+
+    # The fields that the student view's HTML depends on, other than the
+    # per-user values. Together they identify a cached rendering.
+    student_view_cache_fields = ("module_id", "module_title",
+                                 "module_description", "base_url",
+                                 "shared_key", "partner_id")
+
+
+    @profiled("student_view")
+    def student_view(self, context=None):
+      """
+      The primary view of the School Yourself blocks, shown to students
+      when viewing courses.
+
+      The subclasses do the actual rendering in render_student_view().
+      The result is cached per block, with slots in place of the values
+      from get_student_view_user_values(), so that showing the block to
+      another student only costs filling those in.
+      """
+      user_values = self.get_student_view_user_values()
+      if "partner_user_id" not in user_values:
+        # Nothing per-user to fill in, and nothing worth caching.
+        return self.render_student_view(user_values)
+
+      key = self.student_view_cache_key(user_values)
+      cached = render_cache.get(key)
+      if cached is None:
+        slots = dict((name, slot_token(name)) for name in user_values)
+        cached = CachedFragment(self.render_student_view(slots), slots)
+        render_cache.put(key, cached)
+
+      with metrics.timer("student_view.fill"):
+        return cached.fill(self.encode_student_view_user_values(user_values))
+
+
+    def render_student_view(self, user_values):
+      """Renders the student view. Subclasses must implement this.
+
+      Args:
+          user_values: The dict returned by get_student_view_user_values(),
+              or the same keys mapped to slot tokens when the result is
+              going to be cached. Anything user-specific in the view
+              must come from here.
+
+      Returns:
+          A Fragment.
+      """
+      raise NotImplementedError()
+
+
+    def get_student_view_user_values(self):
+      """Returns the per-user values in the student view, as a dict.
+
+      By default these are the partner_user_id and partner_signature
+      URL params (when there is a user to sign for). Subclasses that add
+      anything should also extend encode_student_view_user_values().
+      """
+      # This runs for every view, cached or not, outside of the
+      # subclasses' *.student_view.urls timers.
+      with metrics.timer("student_view.sign"):
+        url_params = self.get_partner_url_params(self.get_shared_key())
+      del url_params["partner"]
+      return url_params
+
+
+    def encode_student_view_user_values(self, user_values):
+      """Returns the user values encoded the way they appear in the
+      rendered HTML, so that they can be substituted for the slots."""
+      encoded = dict(user_values)
+      for name in self.USER_URL_PARAMS:
+        if name in encoded:
+          encoded[name] = urllib.parse.quote_plus(encoded[name])
+      return encoded
+
+
+    def student_view_partner_url_params(self, user_values):
+      """Returns the partner URL params for render_student_view(), like
+      get_partner_url_params() but with the user values passed in."""
+      url_params = {"partner": self.get_partner_id()}
+      for name in self.USER_URL_PARAMS:
+        if name in user_values:
+          url_params[name] = user_values[name]
+      return url_params
+
+
+    def student_view_cache_key(self, user_values=()):
+      """Identifies this block's rendered student view in the render
+      cache: it changes whenever any of the fields it depends on do."""
+      digest = hashlib.sha1()
+      for value in ([type(self).__name__, type(self.runtime).__name__,
+                     str(self.scope_ids.usage_id)] + sorted(user_values) +
+                    [self.get_config_value(name) if name in CONFIG_FIELDS
+                     else getattr(self, name)
+                     for name in self.student_view_cache_fields]):
+        digest.update(repr(value).encode("utf8"))
+        digest.update(b"\0")
+      return digest.hexdigest()
+
+
+    @profiled("studio_view")
     def studio_view(self, context=None):
       """
       This is the view that content authors will see when they click on the
       "Edit" button in Studio. It is a form that lets them type in two fields:
       module ID and player type. This is the same for both lessons and
       reviews.
+
+      The fields that the course configuration sets can't be edited
+      here.
       """
       context = {
         "module_id": self.module_id,
@@ -189,11 +399,13 @@ class SchoolYourselfXBlock(XBlock):
         "module_description": self.module_description,
         "shared_key": self.shared_key,
         "base_url": self.base_url,
-        "partner_id": self.partner_id
+        "partner_id": self.partner_id,
+        "course_config": self.get_course_config()
       }
 
       fragment = Fragment(self.render_template("studio_view.html", context))
 
+      fragment.add_css(self.resource_string("static/css/studio_view.css"))
       fragment.add_javascript(
         self.resource_string("static/js/studio_view.js"))
       fragment.initialize_js("SchoolYourselfStudioView")
@@ -201,23 +413,37 @@ class SchoolYourselfXBlock(XBlock):
 
 
     @XBlock.json_handler
+    @profiled("studio_submit")
     def studio_submit(self, data, suffix=""):
       """
       This is the handler that the form in student_view() calls when
       new data is inputted.
+
+      The fields that the course configuration sets are left alone.
       """
+      # Changing any of the fields changes the render cache key, so no
+      # process will serve the old rendering again; this just frees it
+      # up in this one.
+      render_cache.discard(self.student_view_cache_key(
+          self.get_student_view_user_values()))
+
       self.module_id = data.get("module_id", "intro/intro_module")
       self.module_title = data.get("module_title", "Introduction")
       self.module_description = data.get("module_description",
                                          "Welcome to School Yourself!")
-      self.base_url = data.get("base_url",
-                               "https://schoolyourself.org")
-      if "shared_key" in data:
+      config = self.get_course_config()
+      if "base_url" not in config:
+        self.base_url = data.get("base_url",
+                                 "https://schoolyourself.org")
+      if "shared_key" in data and "shared_key" not in config:
+        if data.get("shared_key") != self.shared_key:
+          # Don't keep the old key's signatures around once it's gone.
+          signer.invalidate(self.shared_key)
         self.shared_key = data.get("shared_key")
 
       self.display_name = self.get_display_name(self.module_title)
 
-      if "partner_id" in data:
+      if "partner_id" in data and "partner_id" not in config:
         self.partner_id = data.get("partner_id")
 
       return { "module_id": self.module_id,
@@ -226,3 +452,137 @@ class SchoolYourselfXBlock(XBlock):
                "shared_key": self.shared_key,
                "base_url": self.base_url,
                "partner_id": self.partner_id }
+
+
+    # The most modules that catalog_search returns at once.
+    MAX_CATALOG_RESULTS = 50
+
+
+    @XBlock.json_handler
+    def catalog_search(self, data, suffix=""):
+      """Searches the module catalog, for the type-ahead in studio_view.
+
+      The request is a dict with a "query" string and an optional
+      "limit", and the response has the matching modules under
+      "modules".
+      """
+      try:
+        limit = min(int(data.get("limit", 10)), self.MAX_CATALOG_RESULTS)
+      except (TypeError, ValueError):
+        limit = 10
+      return { "modules": catalog.search(str(data.get("query", "")),
+                                         limit) }
+
+
+    @XBlock.json_handler
+    def catalog_apply(self, data, suffix=""):
+      """Fills in the module ID, title and description of many blocks
+      from the catalog at once.
+
+      The request is a dict with a list of {"usage_id": ...,
+      "module_id": ...} dicts under "blocks". The response has a
+      result for each of them, in the same order, under "results": the
+      "status" is "ok", or says why that block was skipped. Only blocks
+      in this block's course can be changed.
+
+      Studio only writes back the block whose handler is running, so
+      there the other blocks are loaded from the modulestore and
+      written back to it one by one; see save_catalog_block().
+      """
+      blocks = data.get("blocks", None) if isinstance(data, dict) else None
+      results = []
+      for entry in blocks if isinstance(blocks, list) else []:
+        if not isinstance(entry, dict):
+          results.append({ "usage_id": None, "module_id": None,
+                           "status": "bad entry" })
+          continue
+        usage_id = entry.get("usage_id", None)
+        module_id = entry.get("module_id", None)
+        results.append({ "usage_id": usage_id, "module_id": module_id,
+                         "status": self.apply_catalog_entry(usage_id,
+                                                            module_id) })
+      return { "results": results }
+
+
+    def apply_catalog_entry(self, usage_id, module_id):
+      """Fills in one block for catalog_apply(), and returns its status."""
+      if not isinstance(module_id, str) or not (
+          usage_id is None or isinstance(usage_id, str)):
+        return "bad entry"
+      module = catalog.get(module_id)
+      if module is None:
+        return "unknown module"
+
+      if usage_id is None or usage_id == str(self.scope_ids.usage_id):
+        block = self
+      else:
+        try:
+          block = self.get_catalog_block(usage_id)
+        except BLOCK_LOOKUP_ERRORS:
+          return "unknown block"
+        if not isinstance(block, SchoolYourselfXBlock):
+          return "not a School Yourself block"
+        if block.get_course_id() != self.get_course_id():
+          return "another course"
+
+      block.set_module(module)
+      self.save_catalog_block(block)
+      return "ok"
+
+
+    def get_catalog_block(self, usage_id):
+      """Loads another block for catalog_apply(), by the usage ID as it
+      was typed in. Raises one of BLOCK_LOOKUP_ERRORS if there is no
+      such block."""
+      if UsageKey is None:
+        return self.runtime.get_block(usage_id)
+      usage_key = UsageKey.from_string(usage_id)
+      if modulestore is None:
+        return self.runtime.get_block(usage_key)
+      return modulestore().get_item(usage_key)
+
+
+    def save_catalog_block(self, block):
+      """Persists a block that catalog_apply() changed. This block is
+      saved along with the request, but in Studio, the others have to be
+      written back to the modulestore by us."""
+      block.save()
+      if block is not self and modulestore is not None:
+        modulestore().update_item(block, self.get_editor_id())
+
+
+    def get_editor_id(self):
+      """Returns the ID of the Studio user making a change, which the
+      modulestore records with it."""
+      user_service = self.runtime.service(self, "user")
+      if user_service is not None:
+        user = user_service.get_current_user()
+        user_id = user.opt_attrs.get("edx-platform.user_id", None)
+        if user_id is not None:
+          return user_id
+      return self.scope_ids.user_id
+
+
+    def set_module(self, module):
+      """Points the block at a module from the catalog."""
+      render_cache.discard(self.student_view_cache_key(
+          self.get_student_view_user_values()))
+      self.module_id = module["id"]
+      self.module_title = module["title"]
+      self.module_description = module["description"]
+      self.display_name = self.get_display_name(self.module_title)
+
+
+def course_id_of(usage_id):
+  """Returns the course ID of a usage ID as a string, or None if it
+  doesn't have one (the LMS's usage keys do, the workbench's don't)."""
+  course_key = getattr(usage_id, "course_key", None)
+  if course_key is None:
+    return None
+  # The blocks Studio loads from the modulestore have the branch and
+  # version in their keys, which isn't part of the course.
+  if hasattr(course_key, "for_branch"):
+    course_key = course_key.for_branch(None)
+  if hasattr(course_key, "version_agnostic"):
+    course_key = course_key.version_agnostic()
+  return str(course_key)
@@ -1,11 +1,12 @@
 """An XBlock that displays School Yourself lessons."""
 
 from __future__ import absolute_import
-import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
+import urllib.parse
 
 from xblock.core import XBlock
 from xblock.fragment import Fragment
 
+from .metrics import metrics
 from .schoolyourself import SchoolYourselfXBlock
 
 
@@ -21,47 +22,50 @@ class SchoolYourselfLessonXBlock(SchoolYourselfXBlock):
     def get_display_name(self, module_title):
       return "Lesson: %s" % module_title
 
-    def student_view(self, context=None):
+    def render_student_view(self, user_values):
       """
-      The primary view of the SchoolYourselfLessonXBlock, shown to students
-      when viewing courses.
+      Renders the primary view of the SchoolYourselfLessonXBlock, shown to
+      students when viewing courses. See SchoolYourselfXBlock.student_view().
       """
-      # Construct the URL we're going to stuff into the iframe once
-      # it gets launched:
-      url_params = self.get_partner_url_params(self.shared_key)
-      url_params["id"] = self.module_id
+      with metrics.timer("lesson.student_view.urls"):
+        # Construct the URL we're going to stuff into the iframe once
+        # it gets launched:
+        url_params = self.student_view_partner_url_params(user_values)
+        url_params["id"] = self.module_id
 
-      # Set up the screenshot URL:
-      screenshot_url = "%s/page/screenshot/%s" % (self.base_url,
-                                                  self.module_id)
+        # Set up the screenshot URL:
+        base_url = self.get_base_url()
+        screenshot_url = "%s/page/screenshot/%s" % (base_url,
+                                                    self.module_id)
 
-      context = {
-        "iframe_url": "%s/page/embed?%s" % (self.base_url,
-                                            six.moves.urllib.parse.urlencode(url_params)),
-        "screenshot_url": screenshot_url,
-        "title": self.module_title,
-        "description": self.module_description
-      }
+        context = {
+          "iframe_url": "%s/page/embed?%s" % (base_url,
+                                              urllib.parse.urlencode(url_params)),
+          "screenshot_url": screenshot_url,
+          "title": self.module_title,
+          "description": self.module_description
+        }
 
       # Now actually render the fragment, which is just a button with
       # some JS code that handles the click event on that button.
       fragment = Fragment(self.render_template("lesson_student_view.html",
                                                context))
 
-      # Load the common JS/CSS libraries:
-      fragment.add_css_url(
-        self.runtime.local_resource_url(self, "public/sylib.css"))
-      fragment.add_javascript_url(
-        self.runtime.local_resource_url(self, "public/sylib.js"))
+      with metrics.timer("lesson.student_view.fragment"):
+        self.add_preconnect_hints(fragment)
 
-      fragment.add_css_url("//fonts.googleapis.com/css?family=Open+Sans:700,400,300")
+        # Load the common JS/CSS libraries:
+        fragment.add_css_url(self.asset_url("public/sylib.css"))
+        fragment.add_css_url(self.asset_url("public/css/fonts.css"))
+        fragment.add_javascript_url(self.asset_url("public/sylib.js"))
 
-      # And finally the embedded HTML/JS code:
-      fragment.add_javascript(self.resource_string(
-          "static/js/lesson_student_view.js"))
-      fragment.add_css(self.resource_string(
-          "static/css/student_view.css"))
-      fragment.initialize_js("SchoolYourselfLessonStudentView")
+        # And finally the JS/CSS for this view. These are served by URL
+        # rather than inlined, so that a page with many blocks only
+        # downloads them once.
+        fragment.add_javascript_url(
+          self.asset_url("public/js/lesson_student_view.js"))
+        fragment.add_css_url(self.asset_url("public/css/student_view.css"))
+        fragment.initialize_js("SchoolYourselfLessonStudentView")
       return fragment
 
 
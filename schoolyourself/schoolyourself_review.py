@@ -2,14 +2,33 @@
 
 from __future__ import absolute_import
 import hashlib
-import hmac
-import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
+import http.client
+import json
+import time
+import urllib.parse
+import urllib.request
 
+from webob import Response
 from xblock.core import XBlock
-from xblock.fields import Scope, String
+from xblock.fields import Float, Scope, String
 from xblock.fragment import Fragment
 
+from .mastery_cache import mastery_cache
+from .metrics import metrics
+from .profiling import profiled
+from .publish_queue import DROPPED, grade_queue
+from .replay_cache import replay_cache
 from .schoolyourself import SchoolYourselfXBlock
+from .signing import key_fingerprint, signatures_match, signer
+
+
+# The largest number of messages that handle_grade_batch() will accept
+# in one request.
+MAX_GRADE_BATCH_SIZE = 1000
+
+# How long to wait for the School Yourself server when the mastery
+# handler has to ask it, in seconds.
+MASTERY_FETCH_TIMEOUT = 5
 
 
 class SchoolYourselfReviewXBlock(SchoolYourselfXBlock):
@@ -24,61 +43,99 @@ class SchoolYourselfReviewXBlock(SchoolYourselfXBlock):
     has_score = True
     weight = 1.0
 
+    grade_republish_interval = Float(
+      help=("Grades are only published when they change. If this is set, "
+            "an unchanged grade is published again once this many seconds "
+            "have passed since it was last published."),
+      scope=Scope.settings,
+      default=None,
+      display_name="Grade republish interval (seconds)")
+
+    last_published_grade = Float(
+      help="The last scaled grade that we published for this user.",
+      scope=Scope.user_state,
+      default=None)
+
+    last_published_time = Float(
+      help="When last_published_grade was published, in seconds since "
+           "the epoch.",
+      scope=Scope.user_state,
+      default=None)
+
+    mastery_level = Float(
+      help=("The last verified mastery level of this block's module for "
+            "this user, unscaled, which the student view shows in the "
+            "mastery bar."),
+      scope=Scope.user_state,
+      default=None)
+
     def get_display_name(self, module_title):
       return "Review: %s" % module_title
 
-    def student_view(self, context=None):
-      """
-      The primary view of the SchoolYourselfReviewXBlock, shown to students
-      when viewing courses.
-      """
-      # Construct the URL we're going to stuff into the iframe once
-      # it gets launched:
-      partner_url_params = self.get_partner_url_params(self.shared_key)
-
-      iframe_url_params = dict(partner_url_params)
-      iframe_url_params["module"] = self.module_id
-
-      mastery_url_params = dict(partner_url_params)
-      mastery_url_params["tags"] = self.module_id
-
-      # Set up the screenshot URL:
-      screenshot_url = "%s/page/screenshot/%s" % (self.base_url,
-                                                  self.module_id)
+    def get_student_view_user_values(self):
+      user_values = super(SchoolYourselfReviewXBlock,
+                          self).get_student_view_user_values()
 
-      mastery_url = "%s/progress/mastery?%s" % (
-          self.base_url, six.moves.urllib.parse.urlencode(mastery_url_params))
+      # The mastery bar gets filled in from our own handler, which knows
+      # about the levels that handle_grade has seen, rather than by
+      # going to the School Yourself server directly. Some runtimes put
+      # the user in handler URLs, so it is treated as a per-user value.
+      user_values["mastery_url"] = self.runtime.handler_url(self, "mastery")
 
-      context = {
-        "iframe_url": "%s/review/embed?%s" % (
-            self.base_url, six.moves.urllib.parse.urlencode(iframe_url_params)),
-        "title": self.module_title,
-        "icon_url": self.runtime.local_resource_url(self,
-                                                    "public/review_icon.png"),
-        "mastery_url": mastery_url
-      }
+      # The mastery bar is drawn from the last level that handle_grade
+      # verified, so that it shows up without waiting for the handler.
+      user_values.update(mastery_bar(self.mastery_level))
+      return user_values
 
 
+    def render_student_view(self, user_values):
+      """
+      Renders the primary view of the SchoolYourselfReviewXBlock, shown to
+      students when viewing courses. See SchoolYourselfXBlock.student_view().
+      """
+      with metrics.timer("review.student_view.urls"):
+        # Construct the URL we're going to stuff into the iframe once
+        # it gets launched:
+        iframe_url_params = self.student_view_partner_url_params(user_values)
+        iframe_url_params["module"] = self.module_id
+
+        context = {
+          "iframe_url": "%s/review/embed?%s" % (
+              self.get_base_url(),
+              urllib.parse.urlencode(iframe_url_params)),
+          "title": self.module_title,
+          "module_id": self.module_id,
+          "icon_url": self.asset_url("public/review_icon.png"),
+          "mastery_url": user_values["mastery_url"],
+          # The page keeps the mastery levels it has seen per user, and
+          # this is the user. It is URL-encoded, like in the iframe URL.
+          "user_key": urllib.parse.quote_plus(
+              user_values.get("partner_user_id", "")),
+          "mastery_level": user_values["mastery_level"],
+          "mastery_text": user_values["mastery_text"],
+          "mastery_style": user_values["mastery_style"]
+        }
 
       # Now actually render the fragment, which is just a button with
       # some JS code that handles the click event on that button.
       fragment = Fragment(self.render_template("review_student_view.html",
                                                context))
 
-      # Load the common JS/CSS libraries:
-      fragment.add_css_url(
-        self.runtime.local_resource_url(self, "public/sylib.css"))
-      fragment.add_javascript_url(
-        self.runtime.local_resource_url(self, "public/sylib.js"))
-
-
-      # And finally the embedded HTML/JS code:
-      fragment.add_javascript(self.resource_string(
-          "static/js/review_student_view.js"))
-      fragment.add_css(self.resource_string(
-          "static/css/student_view.css"))
-      fragment.add_css_url("//fonts.googleapis.com/css?family=Open+Sans:700,400,300")
-      fragment.initialize_js("SchoolYourselfReviewStudentView")
+      with metrics.timer("review.student_view.fragment"):
+        self.add_preconnect_hints(fragment)
+
+        # Load the common JS/CSS libraries:
+        fragment.add_css_url(self.asset_url("public/sylib.css"))
+        fragment.add_css_url(self.asset_url("public/css/fonts.css"))
+        fragment.add_javascript_url(self.asset_url("public/sylib.js"))
+
+        # And finally the JS/CSS for this view. These are served by URL
+        # rather than inlined, so that a page with many blocks only
+        # downloads them once.
+        fragment.add_javascript_url(
+          self.asset_url("public/js/review_student_view.js"))
+        fragment.add_css_url(self.asset_url("public/css/student_view.css"))
+        fragment.initialize_js("SchoolYourselfReviewStudentView")
       return fragment
 
 
@@ -99,59 +156,226 @@ class SchoolYourselfReviewXBlock(SchoolYourselfXBlock):
       return self.handle_grade_json(data)
 
 
-    def handle_grade_json(self, data):
-      if not isinstance(data, dict):
-        return "bad_request"
+    @XBlock.json_handler
+    def handle_grade_batch(self, data, suffix=""):
+      """Like handle_grade(), but accepts a list of signed mastery
+      messages (for example, everything the iframe produced during a
+      session) in one request. See handle_grade_batch_json()."""
+      return self.handle_grade_batch_json(data)
 
-      mastery = data.get("mastery", None)
-      user_id = data.get("user_id", None)
-      signature = data.get("signature", None)
 
-      if not mastery or not user_id or not signature:
-        return "forbidden"
+    @XBlock.handler
+    def mastery(self, request, suffix=""):
+      """Returns the user's mastery levels, in the same format as the
+      School Yourself /progress/mastery endpoint: a JSON list of
+      [tag, mastery] pairs.
 
-      # Check that the module ID we care about is actually in the data
-      # that was sent.
-      mastery_level = mastery.get(self.module_id, None)
-      if mastery_level is None:
-        return "bad_request"
+      The tags come from the comma-separated "tags" param, and default
+      to this block's module. They are served from the mastery cache
+      if possible, and fetched from the School Yourself server if not.
 
+      The response has an ETag, and a request whose If-None-Match
+      matches it gets an empty 304 response instead.
+      """
+      tags = [tag for tag in request.GET.get("tags", "").split(",") if tag]
+      if not tags:
+        tags = [self.module_id]
+
+      user_id = self.get_student_id()
+      mastery = mastery_cache.get(self.get_base_url(), user_id, tags)
+      if mastery is None:
+        mastery = self.fetch_mastery(tags)
+        if mastery is None:
+          return Response(status=502)
+        mastery_cache.update(self.get_base_url(), user_id, mastery)
+
+      body = json.dumps([[tag, mastery.get(tag, 0)] for tag in tags])
+      etag = mastery_etag(body)
+      if etag in request.if_none_match:
+        metrics.increment("mastery.not_modified")
+        response = Response(status=304)
+      else:
+        response = Response(body, content_type="application/json",
+                            charset="utf8")
+      response.etag = etag
+      response.cache_control = "private, no-cache"
+      return response
+
+
+    def get_mastery_url(self, tags):
+      """Returns the School Yourself URL that reports this user's mastery
+      of the given tags."""
+      url_params = self.get_partner_url_params(self.get_shared_key())
+      url_params["tags"] = ",".join(tags)
+      return "%s/progress/mastery?%s" % (
+          self.get_base_url(), urllib.parse.urlencode(url_params))
+
+
+    def fetch_mastery(self, tags):
+      """Asks the School Yourself server for this user's mastery of the
+      given tags.
+
+      Returns:
+          A {tag: mastery} dict, or None if the server could not be
+          reached or sent back something we don't understand.
+      """
       try:
-        # The mastery level being passed in should be a number, otherwise
-        # things later on in this method will choke.
-        mastery_level = float(mastery_level)
-      except ValueError:
-        return "bad_request"
+        response = urllib.request.urlopen(
+            self.get_mastery_url(tags), timeout=MASTERY_FETCH_TIMEOUT)
+        try:
+          pairs = json.loads(response.read().decode("utf8"))
+        finally:
+          response.close()
+        return dict((tag, float(value)) for tag, value in pairs)
+      except (IOError, http.client.HTTPException,
+              ValueError, TypeError):
+        return None
 
-      # Verify the signature.
-      verifier = hmac.new(bytes(self.shared_key, "utf-8"),
-                          bytes(user_id, "utf-8"),
-                          digestmod=hashlib.md5)
-      for key in sorted(mastery):
-        verifier.update(bytes(key, "utf-8"))
 
-        # Every entry should be a number.
-        try:
-          mastery[key] = float(mastery[key])
-        except ValueError:
-          return "bad_request"
+    def remember_mastery(self, mastery):
+      """Stores verified mastery levels, so that the mastery handler
+      doesn't have to ask the School Yourself server for them."""
+      mastery_cache.update(self.get_base_url(), self.get_student_id(), mastery)
 
-        verifier.update(bytes("%.2f" % mastery[key], "utf-8"))
 
+    @profiled("handle_grade_json")
+    def handle_grade_json(self, data):
+      status, mastery_level, mastery = self.verify_grade_message(data)
+      metrics.increment("handle_grade." + status)
+      if status not in ("ok", "duplicate"):
+        return status
 
-      # If the signature is invalid, do nothing.
-      if signature != verifier.hexdigest():
-        return "invalid_signature"
+      if mastery is not None:
+        self.remember_mastery(mastery)
+      self.mastery_level = mastery_level
 
       # If we got here, then everything checks out and we can submit
       # a grade for this module.
-      scaled_mastery_level = min(mastery_level / 0.7, 1.0)
-      self.runtime.publish(self, "grade",
-                           { "value": scaled_mastery_level,
-                             "max_value": 1.0 })
+      with metrics.timer("handle_grade.publish"):
+        return self.publish_grade(mastery_level)
+
+
+    def handle_grade_batch_json(self, data):
+      """Verifies a batch of signed mastery messages and publishes one
+      grade for the whole batch.
+
+      The data is either a list of messages, or a dict with the list
+      under "messages". Each message is checked exactly like in
+      handle_grade_json(), and gets its own status in the response
+      ("ok", or one of the error strings that handle_grade_json()
+      returns). Only the grade from the last valid message is
+      published, since that is the one that would have stuck had the
+      messages been sent one at a time.
+
+      Returns:
+          A dict with the per-message "results" and the scaled "grade"
+          that was published, or "bad_request" if the batch itself is
+          malformed.
+      """
+      if isinstance(data, dict):
+        data = data.get("messages", None)
+      if not isinstance(data, list) or len(data) > MAX_GRADE_BATCH_SIZE:
+        return "bad_request"
+
+      results = []
+      mastery_level = None
+      for message in data:
+        status, level, mastery = self.verify_grade_message(message)
+        metrics.increment("handle_grade." + status)
+        results.append(status)
+        if status in ("ok", "duplicate"):
+          mastery_level = level
+        if mastery is not None:
+          self.remember_mastery(mastery)
+
+      grade = None
+      if mastery_level is not None:
+        self.mastery_level = mastery_level
+        grade = self.publish_grade(mastery_level)
+      return { "results": results, "grade": grade }
+
+
+    def verify_grade_message(self, data):
+      """Checks that a mastery message is well-formed and correctly signed
+      for this block.
+
+      Returns:
+          A (status, mastery_level, mastery) tuple, as described in
+          verify_mastery_message(). The status can also be "duplicate",
+          for a repeat of the last message that this block accepted for
+          this user. That one is not verified again; its mastery level
+          is the one it had then, and mastery is None.
+      """
+      # Once the shared key or the module changes (in studio_submit(),
+      # the course config, or another process), the messages accepted
+      # before are no longer repeats, and have to be verified again.
+      shared_key = self.get_shared_key()
+      replay_key = (self.scope_ids.user_id, str(self.scope_ids.usage_id),
+                    self.module_id, key_fingerprint(shared_key))
+      signature = None
+      if isinstance(data, dict):
+        signature = data.get("signature", None)
+      if isinstance(signature, str):
+        mastery_level = replay_cache.get(replay_key, signature)
+        if mastery_level is not None:
+          return "duplicate", mastery_level, None
+
+      status, _, mastery_level, mastery = verify_mastery_message(
+          data, shared_key, self.module_id)
+      if status != "ok":
+        return status, None, None
+
+      # A forged message can't have the signature of a valid one, so
+      # the signature is enough to recognize a repeat.
+      replay_cache.add(replay_key, signature, mastery_level)
+      return "ok", mastery_level, mastery
+
+
+    def publish_grade(self, mastery_level):
+      """Publishes a grade event for the given (unscaled) mastery level,
+      and returns the scaled grade.
+
+      Every grade event fans out into persistence and grade
+      recalculation in the LMS, and the iframe sends us the same
+      mastery level over and over, so the event is skipped if it would
+      not change the published grade (unless grade_republish_interval
+      says that it's time to send it again).
+      """
+      scaled_mastery_level = scaled_grade(mastery_level)
+
+      now = time.time()
+      if not self.should_publish_grade(scaled_mastery_level, now):
+        metrics.increment("handle_grade.publish_suppressed")
+        return scaled_mastery_level
+
+      event = { "value": scaled_mastery_level, "max_value": 1.0 }
+      if grade_queue is not None:
+        # Publish in the background; see publish_queue.py.
+        if grade_queue.put(self.runtime, self, event) == DROPPED:
+          # Leave last_published_grade alone, so the next report of the
+          # same grade tries again instead of being suppressed.
+          return scaled_mastery_level
+      else:
+        self.runtime.publish(self, "grade", event)
+      self.last_published_grade = scaled_mastery_level
+      self.last_published_time = now
+      metrics.increment("handle_grade.published")
       return scaled_mastery_level
 
 
+    def should_publish_grade(self, scaled_mastery_level, now):
+      """Returns True if a grade event for the given scaled grade would
+      tell the LMS anything new."""
+      if (self.last_published_grade is None or
+          abs(self.last_published_grade - scaled_mastery_level) > 1e-9):
+        return True
+
+      interval = self.grade_republish_interval
+      return (interval is not None and
+              (self.last_published_time is None or
+               now - self.last_published_time >= interval))
+
+
     @staticmethod
     def workbench_scenarios():
       """A canned scenario for display in the workbench."""
@@ -169,3 +393,189 @@ class SchoolYourselfReviewXBlock(SchoolYourselfXBlock):
             </vertical_demo>
          """),
         ]
+
+
+def verify_mastery_message(data, shared_key, module_id=None):
+  """Checks that a mastery message is well-formed and correctly signed
+  with the given key. These are the checks that handle_grade makes, and
+  the offline backfill (see backfill.py) makes the same ones.
+
+  Both versions of the message are accepted (see signing.py): a
+  version 2 message has "version": 2, and a message without a
+  "version" is a version 1 message.
+
+  Returns:
+      A (status, user_id, mastery_level, mastery) tuple. The status is
+      "ok" if the message can be trusted, in which case user_id is the
+      School Yourself user it is about, mastery is the whole {tag:
+      mastery level} report, and mastery_level is the (unscaled) level
+      of module_id in it (or None, if no module_id was given).
+      Otherwise the status is one of "bad_request", "forbidden" or
+      "invalid_signature", and the rest are None.
+  """
+  version = data.get("version", 1) if isinstance(data, dict) else 1
+  if version == 2:
+    return verify_payload_message(data, shared_key, module_id)
+  if version != 1:
+    return "bad_request", None, None, None
+
+  with metrics.timer("handle_grade.parse"):
+    status, mastery_level = parse_grade_message(data, module_id)
+  if status != "ok":
+    return status, None, None, None
+
+  with metrics.timer("handle_grade.verify"):
+    status, mastery = check_mastery_signature(shared_key, data["user_id"],
+                                              data["mastery"],
+                                              data["signature"])
+  if status != "ok":
+    return status, None, None, None
+  return "ok", data["user_id"], mastery_level, mastery
+
+
+def verify_payload_message(data, shared_key, module_id=None):
+  """The part of verify_mastery_message() that handles version 2
+  messages. The signature is checked over the payload string as it
+  arrived, before anything is parsed; then the payload is decoded, and
+  every level is converted to a float, as check_mastery_signature()
+  does for version 1 messages."""
+  payload = data.get("payload", None)
+  signature = data.get("signature", None)
+  if not payload or not signature:
+    return "forbidden", None, None, None
+  if not isinstance(payload, str) or not isinstance(signature, str):
+    return "bad_request", None, None, None
+
+  with metrics.timer("handle_grade.verify"):
+    if not signatures_match(signer.payload_signature(shared_key, payload),
+                            signature):
+      return "invalid_signature", None, None, None
+
+  with metrics.timer("handle_grade.parse"):
+    try:
+      message = json.loads(payload)
+      user_id = message["user_id"]
+      mastery = message["mastery"]
+      if not isinstance(mastery, dict) or not isinstance(user_id, str):
+        return "bad_request", None, None, None
+      # Every entry should be a number.
+      mastery = dict((key, float(value)) for key, value in mastery.items())
+      mastery_level = None
+      if module_id is not None:
+        mastery_level = mastery[module_id]
+    except (ValueError, TypeError, KeyError):
+      return "bad_request", None, None, None
+  return "ok", user_id, mastery_level, mastery
+
+
+def parse_grade_message(data, module_id=None):
+  """The part of verify_mastery_message() that checks the shape of a
+  version 1 message and finds the module's mastery level in it."""
+  if not isinstance(data, dict):
+    return "bad_request", None
+
+  mastery = data.get("mastery", None)
+  user_id = data.get("user_id", None)
+  signature = data.get("signature", None)
+
+  if not mastery or not user_id or not signature:
+    return "forbidden", None
+
+  if not isinstance(mastery, dict) or not isinstance(user_id, str):
+    return "bad_request", None
+
+  if module_id is None:
+    return "ok", None
+
+  # Check that the module ID we care about is actually in the data
+  # that was sent.
+  mastery_level = mastery.get(module_id, None)
+  if mastery_level is None:
+    return "bad_request", None
+
+  try:
+    # The mastery level being passed in should be a number, otherwise
+    # things later on will choke.
+    mastery_level = float(mastery_level)
+  except (TypeError, ValueError):
+    return "bad_request", None
+
+  return "ok", mastery_level
+
+
+def check_mastery_signature(shared_key, user_id, mastery, signature):
+  """The part of verify_mastery_message() that checks the signature of
+  a version 1 message.
+
+  Returns:
+      A (status, levels) tuple, where status is "ok", "bad_request" or
+      "invalid_signature", and levels is a copy of mastery with every
+      level converted to a float (or None, unless the status is "ok").
+  """
+  try:
+    # Every entry should be a number.
+    levels = dict((key, float(value)) for key, value in mastery.items())
+  except (TypeError, ValueError):
+    return "bad_request", None
+
+  # If the signature is invalid, do nothing.
+  if not signatures_match(
+      signer.mastery_signature(shared_key, user_id, levels), signature):
+    return "invalid_signature", None
+
+  return "ok", levels
+
+
+def scaled_grade(mastery_level):
+  """Returns the grade for an (unscaled) mastery level. A level of 0.7
+  gives full credit -- anything beyond that doesn't count."""
+  return min(mastery_level / 0.7, 1.0)
+
+
+def mastery_bar(mastery_level):
+  """Returns the mastery bar's state for the given (unscaled) mastery
+  level, as the "mastery_level", "mastery_text" and "mastery_style"
+  strings that the student view template expects.
+
+  This draws the bar exactly the way renderMastery() in
+  review_student_view.js does, so that the page doesn't change when
+  the script takes over. A level of None (nothing verified yet) leaves
+  the bar empty, for the script to fill in.
+  """
+  if mastery_level is None:
+    return { "mastery_level": "", "mastery_text": "", "mastery_style": "" }
+
+  # A mastery level of 0.7 gives full credit -- anything beyond that
+  # doesn't count toward anything.
+  scaled_mastery_level = mastery_level / 0.7
+  right = 100 - (scaled_mastery_level * 100)
+
+  color = "#fcd380"
+  if not scaled_mastery_level:
+    text = "Get started!"
+  elif scaled_mastery_level < 0.5:
+    text = "Keep practicing!"
+  elif scaled_mastery_level < 1:
+    text = "Almost there!"
+    color = "#f0b300"
+  else:
+    text = "Complete!"
+    color = "#6eb535"
+
+  return { "mastery_level": format_number(mastery_level),
+           "mastery_text": text,
+           "mastery_style": "right: %s%%; background: %s" % (
+               format_number(right), color) }
+
+
+def format_number(value):
+  """Formats a float the way JavaScript's String() does, for the usual
+  values: without a fraction if it is a whole number."""
+  if value == int(value):
+    return "%d" % value
+  return repr(value)
+
+
+def mastery_etag(body):
+  """Returns the (unquoted) ETag of a mastery response body."""
+  return hashlib.sha1(body.encode("utf8")).hexdigest()[:20]
@@ -3,9 +3,14 @@
 from __future__ import absolute_import
 import unittest
 
-from .schoolyourself_review import SchoolYourselfReviewXBlock
-
-from mock import Mock
+from . import schoolyourself_review
+from .metrics import Aggregator, configure, metrics
+from .render_cache import render_cache
+from .replay_cache import replay_cache
+from .schoolyourself_review import SchoolYourselfReviewXBlock, mastery_bar
+from .signing import signer
+
+from mock import Mock, patch
 from xblock.fields import ScopeIds
 from xblock.field_data import DictFieldData
 
@@ -24,6 +29,8 @@ class FakeXModuleRuntime(object):
 
 class SchoolYourselfReviewXBlockTest(unittest.TestCase):
   def setUp(self):
+    render_cache.clear()
+    replay_cache.clear()
     self.mock_runtime = Mock()
     self.block = SchoolYourselfReviewXBlock(self.mock_runtime,
                                             DictFieldData({}),
@@ -34,6 +41,9 @@ class SchoolYourselfReviewXBlockTest(unittest.TestCase):
     self.block.shared_key = "key"
     self.canned_signature = "f0cc345470c322e0c6f41d541fe2b736"
 
+    # The same, for a mastery level of 0.35 instead of 0.7.
+    self.canned_half_signature = "3c404ebe6d7f4b0b728b3942f4fed3b8"
+
 
   def test_default_params(self):
     self.assertFalse(SchoolYourselfReviewXBlock.has_children)
@@ -105,6 +115,268 @@ class SchoolYourselfReviewXBlockTest(unittest.TestCase):
                                                    "max_value": 1.0 })
 
 
+  def test_handle_grade_v2(self):
+    self.block.module_id = "algebra/multiplication"
+    message = signer.mastery_message(
+        "key", "foo", {"algebra/multiplication": 0.35, "other": 1}, version=2)
+    self.assertEqual(self.block.handle_grade_json(
+        dict(message, signature="asdf")), "invalid_signature")
+    self.assertEqual(self.block.handle_grade_json(dict(message, version=3)),
+                     "bad_request")
+    self.assertEqual(self.block.handle_grade_json(
+        dict(message, payload=None)), "forbidden")
+    self.assertEqual(self.mock_runtime.publish.call_count, 0)
+
+    self.assertAlmostEqual(self.block.handle_grade_json(message), 0.5)
+    self.assertEqual(self.mock_runtime.publish.call_count, 1)
+
+    # Signed, but not what we need.
+    for payload in ["[", "[]", '{"mastery": {"other": 1}}',
+                    '{"mastery": {"algebra/multiplication": "x"}}',
+                    '{"user_id": "foo", "mastery": '
+                    '{"algebra/multiplication": 0.35, "other": "x"}}',
+                    '{"user_id": "foo", "mastery": '
+                    '{"algebra/multiplication": 0.35, "other": null}}']:
+      self.assertEqual(self.block.handle_grade_json(
+          { "version": 2, "payload": payload,
+            "signature": signer.payload_signature("key", payload) }),
+                       "bad_request")
+
+    # The levels come out as floats, as they do from version 1 messages.
+    payload = ('{"user_id": "foo", "mastery": '
+               '{"algebra/multiplication": "0.35", "other": 1}}')
+    status, user_id, mastery_level, mastery = (
+        schoolyourself_review.verify_mastery_message(
+            { "version": 2, "payload": payload,
+              "signature": signer.payload_signature("key", payload) },
+            "key", "algebra/multiplication"))
+    self.assertEqual((status, user_id, mastery_level), ("ok", "foo", 0.35))
+    self.assertEqual(mastery, {"algebra/multiplication": 0.35, "other": 1.0})
+    self.assertTrue(all(isinstance(level, float)
+                        for level in mastery.values()))
+
+
+  def test_handle_grade_leaves_message_alone(self):
+    self.block.module_id = "algebra/multiplication"
+    message = {"mastery": {"algebra/multiplication": "0.7"},
+               "user_id": "foo",
+               "signature": self.canned_signature}
+    self.assertEqual(self.block.handle_grade_json(message), 1.0)
+    self.assertEqual(message["mastery"], {"algebra/multiplication": "0.7"})
+
+
+  def test_handle_grade_batch(self):
+    self.block.module_id = "algebra/multiplication"
+
+    result = self.block.handle_grade_batch_json(
+        {"messages": [
+          {"mastery": {"algebra/multiplication": 0.7},
+           "user_id": "foo",
+           "signature": self.canned_signature},
+          "foo",
+          {"mastery": {"algebra/multiplication": 0.35},
+           "user_id": "foo",
+           "signature": "asdf"},
+          {"mastery": ["algebra/multiplication"],
+           "user_id": "foo",
+           "signature": "asdf"},
+          {"mastery": {"algebra/multiplication": 0.35},
+           "user_id": "foo",
+           "signature": self.canned_half_signature},
+          {}]})
+
+    self.assertEqual(result["results"],
+                     ["ok", "bad_request", "invalid_signature",
+                      "bad_request", "ok", "forbidden"])
+    self.assertAlmostEqual(result["grade"], 0.5)
+
+    # Only the last valid grade in the batch gets published.
+    self.assertEqual(self.mock_runtime.publish.call_count, 1)
+    self.mock_runtime.publish.assert_called_with(self.block, "grade",
+                                                 { "value": result["grade"],
+                                                   "max_value": 1.0 })
+
+
+  def test_handle_grade_batch_malformed_input(self):
+    self.block.module_id = "algebra/multiplication"
+
+    self.assertEqual(self.block.handle_grade_batch_json("foo"), "bad_request")
+    self.assertEqual(self.block.handle_grade_batch_json({}), "bad_request")
+    self.assertEqual(self.block.handle_grade_batch_json([{}] * 1001),
+                     "bad_request")
+    self.assertEqual(self.block.handle_grade_batch_json(
+        [{"mastery": {"algebra/multiplication": 0.7},
+          "user_id": "foo",
+          "signature": "asdf"}]),
+        { "results": ["invalid_signature"], "grade": None })
+
+    self.assertEqual(self.mock_runtime.publish.call_count, 0)
+
+
+  def test_unchanged_grades_are_not_republished(self):
+    self.block.module_id = "algebra/multiplication"
+    message = {"mastery": {"algebra/multiplication": 0.7},
+               "user_id": "foo",
+               "signature": self.canned_signature}
+    sink = Aggregator()
+    previous = metrics.sink
+    configure(sink)
+    self.addCleanup(configure, previous)
+
+    self.assertEqual(self.block.handle_grade_json(dict(message)), 1.0)
+    self.assertEqual(self.block.handle_grade_json(dict(message)), 1.0)
+    self.assertEqual(self.mock_runtime.publish.call_count, 1)
+    self.assertEqual(sink.summary()["counts"]["handle_grade.published"], 1)
+    self.assertEqual(
+        sink.summary()["counts"]["handle_grade.publish_suppressed"], 1)
+    self.assertEqual(self.block.last_published_grade, 1.0)
+
+    # A different grade always gets published.
+    self.assertAlmostEqual(self.block.handle_grade_json(
+        {"mastery": {"algebra/multiplication": 0.35},
+         "user_id": "foo",
+         "signature": self.canned_half_signature}), 0.5)
+    self.assertEqual(self.mock_runtime.publish.call_count, 2)
+
+
+  def test_grade_republish_interval(self):
+    self.block.module_id = "algebra/multiplication"
+    self.block.grade_republish_interval = 60.0
+    message = {"mastery": {"algebra/multiplication": 0.7},
+               "user_id": "foo",
+               "signature": self.canned_signature}
+
+    with patch.object(schoolyourself_review.time, "time", return_value=1000):
+      self.block.handle_grade_json(dict(message))
+    with patch.object(schoolyourself_review.time, "time", return_value=1059):
+      self.block.handle_grade_json(dict(message))
+    self.assertEqual(self.mock_runtime.publish.call_count, 1)
+
+    with patch.object(schoolyourself_review.time, "time", return_value=1060):
+      self.block.handle_grade_json(dict(message))
+    self.assertEqual(self.mock_runtime.publish.call_count, 2)
+    self.assertEqual(self.block.last_published_time, 1060)
+
+
+  def test_duplicates_are_not_verified_again(self):
+    self.block.module_id = "algebra/multiplication"
+    message = {"mastery": {"algebra/multiplication": 0.7},
+               "user_id": "foo",
+               "signature": self.canned_signature}
+    self.assertEqual(self.block.handle_grade_json(dict(message)), 1.0)
+
+    with patch.object(schoolyourself_review,
+                      "verify_mastery_message") as verify:
+      self.assertEqual(self.block.handle_grade_json(dict(message)), 1.0)
+      self.assertEqual(verify.call_count, 0)
+    self.assertEqual(self.mock_runtime.publish.call_count, 1)
+
+    # Another user, or another block, still gets to use it.
+    other = SchoolYourselfReviewXBlock(self.mock_runtime, DictFieldData({}),
+                                       ScopeIds("bar", "bar", "baz", "x"))
+    other.module_id = "algebra/multiplication"
+    other.shared_key = "key"
+    self.assertEqual(other.handle_grade_json(dict(message)), 1.0)
+
+    # Messages that didn't check out are not remembered.
+    bad = dict(message, signature="asdf")
+    self.assertEqual(self.block.handle_grade_json(dict(bad)),
+                     "invalid_signature")
+    self.assertEqual(self.block.handle_grade_json(dict(bad)),
+                     "invalid_signature")
+
+
+  def test_duplicates_after_key_or_module_change(self):
+    self.block.module_id = "algebra/multiplication"
+    message = {"mastery": {"algebra/multiplication": 0.7},
+               "user_id": "foo",
+               "signature": self.canned_signature}
+    self.assertEqual(self.block.handle_grade_json(dict(message)), 1.0)
+
+    # Signed with the old key, so not to be trusted any more.
+    self.block.shared_key = "new key"
+    self.assertEqual(self.block.handle_grade_json(dict(message)),
+                     "invalid_signature")
+
+    # About a module the block isn't for any more.
+    self.block.shared_key = "key"
+    self.assertEqual(self.block.handle_grade_json(dict(message)), 1.0)
+    self.block.module_id = "geometry/lines_rays"
+    self.assertEqual(self.block.handle_grade_json(dict(message)),
+                     "bad_request")
+
+
+  def test_grade_can_go_back(self):
+    """A repeat of an older message is a change like any other."""
+    self.block.module_id = "algebra/multiplication"
+    a, b = [signer.mastery_message("key", "foo",
+                                   {"algebra/multiplication": level})
+            for level in (0.5, 0.6)]
+
+    self.assertAlmostEqual(self.block.handle_grade_json(dict(a)), 0.5 / 0.7)
+    self.assertAlmostEqual(self.block.handle_grade_json(dict(b)), 0.6 / 0.7)
+    self.assertAlmostEqual(self.block.handle_grade_json(dict(a)), 0.5 / 0.7)
+    self.assertEqual(self.block.mastery_level, 0.5)
+    self.assertAlmostEqual(self.block.last_published_grade, 0.5 / 0.7)
+    self.assertEqual(self.mock_runtime.publish.call_count, 3)
+
+    response = self.block.handle_grade_batch_json([dict(b), dict(a),
+                                                   dict(b), dict(b)])
+    self.assertEqual(response["results"],
+                     ["ok", "ok", "ok", "duplicate"])
+    self.assertAlmostEqual(response["grade"], 0.6 / 0.7)
+    self.assertEqual(self.block.mastery_level, 0.6)
+
+
+  def test_student_view(self):
+    self.block.module_id = "algebra/multiplication"
+    self.mock_runtime.handler_url.return_value = "/handler/mastery"
+
+    html = self.block.student_view().content
+    self.assertIn('data-module-id="algebra/multiplication"', html)
+    self.assertIn('data-mastery-url="/handler/mastery"', html)
+    self.mock_runtime.handler_url.assert_called_with(self.block, "mastery")
+
+
+  def test_mastery_bar(self):
+    # The same thresholds as renderMastery() in review_student_view.js.
+    self.assertEqual(mastery_bar(None), {"mastery_level": "",
+                                         "mastery_text": "",
+                                         "mastery_style": ""})
+    self.assertEqual(mastery_bar(0), {
+        "mastery_level": "0", "mastery_text": "Get started!",
+        "mastery_style": "right: 100%; background: #fcd380"})
+    self.assertEqual(mastery_bar(0.1)["mastery_text"], "Keep practicing!")
+    self.assertEqual(mastery_bar(0.35), {
+        "mastery_level": "0.35", "mastery_text": "Almost there!",
+        "mastery_style": "right: 50%; background: #f0b300"})
+    self.assertEqual(mastery_bar(1.0)["mastery_style"],
+                     "right: -42.85714285714286%; background: #6eb535")
+
+
+  def test_handle_grade_stores_mastery_level(self):
+    self.block.module_id = "algebra/multiplication"
+    self.block.handle_grade_json(
+        {"mastery": {"algebra/multiplication": 0.7},
+         "user_id": "foo",
+         "signature": "asdf"})
+    self.assertIsNone(self.block.mastery_level)
+
+    self.block.handle_grade_batch_json(
+        [{"mastery": {"algebra/multiplication": 0.35},
+          "user_id": "foo",
+          "signature": self.canned_half_signature}])
+    self.assertEqual(self.block.mastery_level, 0.35)
+
+    self.block.handle_grade_json(
+        {"mastery": {"algebra/multiplication": 0.7},
+         "user_id": "foo",
+         "signature": self.canned_signature})
+    self.assertEqual(self.block.mastery_level, 0.7)
+    self.mock_runtime.handler_url.return_value = "/handler/mastery"
+    self.assertIn("Complete!", self.block.student_view().content)
+
+
   def test_get_partner_url_params(self):
     # These are the defaults:
     self.assertEqual(self.block.get_partner_url_params(),
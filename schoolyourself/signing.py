@@ -0,0 +1,149 @@
+"""HMAC signing helpers shared by the School Yourself XBlocks.
+
+Everything we sign or verify uses HMAC-MD5 with the block's shared key.
+Creating an HMAC object pads and hashes the key, which is wasted work
+when the same key is used over and over, so the SigningService keeps
+one pre-keyed HMAC object per shared key and hands out copies of it.
+
+The partner signature that goes into the iframe URLs depends only on
+the shared key and the user ID, so it is also memoized in a bounded LRU.
+
+Mastery reports come in two versions. Version 1 is signed over the
+user ID followed by every tag and its level ("%.2f"), in sorted tag
+order; see mastery_signature(). Version 2 carries the user ID and the
+levels in a single JSON "payload" string, and is signed over exactly
+those bytes; see payload_signature(). The receiver only has to hash the
+string it was sent, instead of rebuilding it.
+"""
+
+from __future__ import absolute_import
+import collections
+import hashlib
+import hmac
+import json
+import threading
+
+
+class SigningService(object):
+    """Creates HMACs keyed with School Yourself shared keys.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, max_keys=64, max_signatures=10000):
+      self.max_keys = max_keys
+      self.max_signatures = max_signatures
+      # There are only ever a handful of shared keys in use, so the
+      # pre-keyed objects are evicted in insertion order, and looking
+      # one up doesn't need the lock.
+      self._keyed = collections.OrderedDict()  # Key -> HMAC object
+      self._signatures = collections.OrderedDict()  # (Key, user) -> hex
+      self._lock = threading.Lock()
+
+
+    def new_hmac(self, shared_key, msg=None):
+      """Returns a fresh HMAC-MD5 object keyed with shared_key, as if
+      created with hmac.new(), optionally already updated with msg."""
+      keyed = self._keyed.get(shared_key, None)
+      if keyed is None:
+        keyed = hmac.new(bytes(shared_key, "utf-8"), digestmod=hashlib.md5)
+        with self._lock:
+          self._keyed[shared_key] = keyed
+          if len(self._keyed) > self.max_keys:
+            self._keyed.popitem(last=False)
+
+      mac = keyed.copy()
+      if msg is not None:
+        mac.update(msg)
+      return mac
+
+
+    def partner_signature(self, shared_key, user_id):
+      """Returns the hex signature of user_id under shared_key, as sent
+      in the partner_signature URL param."""
+      cache_key = (shared_key, user_id)
+      with self._lock:
+        signature = self._signatures.get(cache_key, None)
+        if signature is not None:
+          self._signatures.move_to_end(cache_key)
+          return signature
+
+      signature = self.new_hmac(shared_key,
+                                bytes(user_id, "utf-8")).hexdigest()
+      with self._lock:
+        self._signatures[cache_key] = signature
+        if len(self._signatures) > self.max_signatures:
+          self._signatures.popitem(last=False)
+      return signature
+
+
+    def mastery_signature(self, shared_key, user_id, mastery):
+      """Returns the hex signature of a {tag: mastery level} report for
+      user_id, as School Yourself signs it. The levels must be numbers."""
+      mac = self.new_hmac(shared_key, bytes(user_id, "utf-8"))
+      for key in sorted(mastery):
+        mac.update(bytes(key, "utf-8"))
+        mac.update(bytes("%.2f" % mastery[key], "utf-8"))
+      return mac.hexdigest()
+
+
+    def payload_signature(self, shared_key, payload):
+      """Returns the hex signature of a version 2 mastery payload."""
+      return self.new_hmac(shared_key, bytes(payload, "utf-8")).hexdigest()
+
+
+    def mastery_message(self, shared_key, user_id, mastery, version=1):
+      """Returns a signed mastery message for handle_grade, the way the
+      School Yourself review player sends it."""
+      if version == 1:
+        return { "mastery": mastery,
+                 "user_id": user_id,
+                 "signature": self.mastery_signature(shared_key, user_id,
+                                                     mastery) }
+
+      payload = mastery_payload(user_id, mastery)
+      return { "version": 2,
+               "payload": payload,
+               "signature": self.payload_signature(shared_key, payload) }
+
+
+    def invalidate(self, shared_key=None):
+      """Forgets everything cached for the given key, or for all keys if
+      none is given. Call this when a shared key is rotated."""
+      with self._lock:
+        if shared_key is None:
+          self._keyed.clear()
+          self._signatures.clear()
+          return
+
+        self._keyed.pop(shared_key, None)
+        for cache_key in [cache_key for cache_key in self._signatures
+                          if cache_key[0] == shared_key]:
+          del self._signatures[cache_key]
+
+
+def key_fingerprint(shared_key):
+  """Returns a short digest that tells shared keys apart, for cache
+  keys that shouldn't hold the key itself."""
+  return hashlib.sha256(shared_key.encode("utf8")).hexdigest()[:16]
+
+
+def signatures_match(expected, signature):
+  """Returns whether a signature from a message is the one we expected.
+  The comparison takes the same time however much of it matches, so
+  that timing it doesn't help forge one. Anything but a string never
+  matches."""
+  if not isinstance(signature, str):
+    return False
+  return hmac.compare_digest(expected.encode("utf8"),
+                             signature.encode("utf8"))
+
+
+def mastery_payload(user_id, mastery):
+  """Returns the canonical version 2 payload for a {tag: mastery level}
+  report: compact JSON with sorted keys."""
+  return json.dumps({ "user_id": user_id, "mastery": mastery },
+                    sort_keys=True, separators=(",", ":"))
+
+
+signer = SigningService()
@@ -0,0 +1,123 @@
+"""This file contains a unit test for the HMAC signing service."""
+
+from __future__ import absolute_import
+import hashlib
+import hmac
+import unittest
+
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+from xblock.fields import ScopeIds
+
+from . import signing
+from .schoolyourself_lesson import SchoolYourselfLessonXBlock
+from .signing import SigningService, signatures_match
+
+
+class SigningServiceTest(unittest.TestCase):
+  def setUp(self):
+    self.signer = SigningService(max_keys=2, max_signatures=2)
+
+
+  def test_new_hmac_matches_hmac_new(self):
+    expected = hmac.new(b"key", b"foo", digestmod=hashlib.md5)
+    mac = self.signer.new_hmac("key", b"foo")
+    self.assertEqual(mac.hexdigest(), expected.hexdigest())
+
+    # Each call gets an independent copy.
+    mac.update(b"bar")
+    self.assertEqual(self.signer.new_hmac("key", b"foo").hexdigest(),
+                     expected.hexdigest())
+
+
+  def test_keyed_objects_are_bounded(self):
+    for key in ["a", "b", "c"]:
+      self.signer.new_hmac(key)
+    self.assertEqual(list(self.signer._keyed), ["b", "c"])
+
+
+  def test_partner_signature(self):
+    expected = hmac.new(b"key", b"abc123", digestmod=hashlib.md5).hexdigest()
+    self.assertEqual(self.signer.partner_signature("key", "abc123"), expected)
+
+    with patch.object(self.signer, "new_hmac") as new_hmac:
+      self.assertEqual(self.signer.partner_signature("key", "abc123"),
+                       expected)
+      self.assertEqual(new_hmac.call_count, 0)
+
+
+  def test_partner_signature_lru(self):
+    self.signer.partner_signature("key", "a")
+    self.signer.partner_signature("key", "b")
+    self.signer.partner_signature("key", "a")
+    self.signer.partner_signature("key", "c")
+    self.assertEqual(list(self.signer._signatures),
+                     [("key", "a"), ("key", "c")])
+
+
+  def test_mastery_signature(self):
+    # The same signatures that schoolyourself_review_test.py uses.
+    self.assertEqual(self.signer.mastery_signature(
+        "key", "foo", {"algebra/multiplication": 0.7}),
+                     "f0cc345470c322e0c6f41d541fe2b736")
+    self.assertEqual(self.signer.mastery_signature(
+        "key", "foo", {"algebra/multiplication": 0.35}),
+                     "3c404ebe6d7f4b0b728b3942f4fed3b8")
+
+
+  def test_mastery_message(self):
+    message = self.signer.mastery_message(
+        "key", "foo", {"algebra/multiplication": 0.7})
+    self.assertEqual(message["signature"], "f0cc345470c322e0c6f41d541fe2b736")
+
+    message = self.signer.mastery_message(
+        "key", "foo", {"b": 0.5, "a": 0.25}, version=2)
+    self.assertEqual(message["version"], 2)
+    self.assertEqual(message["payload"],
+                     '{"mastery":{"a":0.25,"b":0.5},"user_id":"foo"}')
+    self.assertEqual(message["signature"],
+                     self.signer.payload_signature("key", message["payload"]))
+
+
+  def test_signatures_match(self):
+    expected = "f0cc345470c322e0c6f41d541fe2b736"
+    self.assertTrue(signatures_match(expected, expected))
+    self.assertFalse(signatures_match(expected, expected[:-1] + "7"))
+    self.assertFalse(signatures_match(expected, ""))
+    self.assertFalse(signatures_match(expected, expected[:-1] + "\u00e9"))
+    self.assertFalse(signatures_match(expected, None))
+    self.assertFalse(signatures_match(expected, ["f0cc"]))
+
+    with patch.object(signing.hmac, "compare_digest",
+                      return_value=True) as compare_digest:
+      self.assertTrue(signatures_match(expected, "anything"))
+      compare_digest.assert_called_once_with(expected.encode("utf8"),
+                                             b"anything")
+
+
+  def test_invalidate(self):
+    self.signer.partner_signature("old", "a")
+    self.signer.partner_signature("new", "a")
+    self.signer.invalidate("old")
+    self.assertEqual(list(self.signer._signatures), [("new", "a")])
+    self.assertEqual(list(self.signer._keyed), ["new"])
+
+    self.signer.invalidate()
+    self.assertEqual(len(self.signer._signatures), 0)
+    self.assertEqual(len(self.signer._keyed), 0)
+
+
+  def test_studio_submit_invalidates_old_key(self):
+    block = SchoolYourselfLessonXBlock(Mock(), DictFieldData({}),
+                                       ScopeIds("foo", "bar", "baz", "x"))
+    block.shared_key = "old"
+    with patch.object(signing.signer, "invalidate") as invalidate:
+      block.studio_submit.__wrapped__(block, {"shared_key": "old"})
+      self.assertEqual(invalidate.call_count, 0)
+      block.studio_submit.__wrapped__(block, {"shared_key": "new"})
+      invalidate.assert_called_once_with("old")
+    self.assertEqual(block.shared_key, "new")
+
+
+if __name__ == "__main__":
+  unittest.main()
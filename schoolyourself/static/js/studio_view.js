@@ -18,4 +18,169 @@ function SchoolYourselfStudioView(runtime, element) {
   $('.cancel-button').bind('click', function() {
     runtime.notify('cancel', {});
   });
+
+  new SchoolYourselfCatalogSearch(
+      $('.module-id', element), $('.catalog-results', element),
+      runtime.handlerUrl(element, 'catalog_search'),
+      function(module) {
+        $('.module-id', element).val(module.id);
+        $('.module-title', element).val(module.title);
+        $('.module-description', element).val(module.description);
+      });
+
+  $('.catalog-bulk-apply', element).bind('click', function() {
+    var blocks = [];
+    $.each($('.catalog-bulk', element).val().split('\n'), function(i, line) {
+      var parts = $.trim(line).split(/\s+/);
+      if (parts.length == 2) {
+        blocks.push({'usage_id': parts[0], 'module_id': parts[1]});
+      }
+    });
+    var status = $('.catalog-bulk-status', element);
+    if (!blocks.length) {
+      status.text('Nothing to apply.');
+      return false;
+    }
+
+    status.text('Applying...');
+    var handlerUrl = runtime.handlerUrl(element, 'catalog_apply');
+    $.post(handlerUrl, JSON.stringify({'blocks': blocks}))
+      .done(function(response) {
+        var failed = $.grep(response.results, function(result) {
+          return result.status != 'ok';
+        });
+        status.text((response.results.length - failed.length) +
+                    ' blocks updated.' +
+                    $.map(failed, function(result) {
+                      return ' ' + result.usage_id + ': ' + result.status +
+                          '.';
+                    }).join(''));
+      })
+      .fail(function() {
+        status.text('Could not apply the catalog, please try again.');
+      });
+    return false;
+  });
+}
+
+
+/**
+ * Type-ahead over the module catalog: as the author types into the
+ * input, the matching modules are listed underneath it, and picking one
+ * calls onSelect with it.
+ *
+ * Keystrokes are debounced, and only the response to the latest query
+ * is ever shown, however the requests overtake each other. Responses
+ * are remembered for the lifetime of the page, so going back to a
+ * query that was already typed costs nothing.
+ */
+function SchoolYourselfCatalogSearch(input, list, handlerUrl, onSelect) {
+  this.input_ = input;
+  this.list_ = list;
+  this.handlerUrl_ = handlerUrl;
+  this.onSelect_ = onSelect;
+  this.results_ = {};  // Query -> modules
+  this.modules_ = [];
+  this.selected_ = -1;
+  this.latest_ = null;
+  this.timer_ = null;
+
+  var self = this;
+  input.bind('input', function() {
+    window.clearTimeout(self.timer_);
+    self.timer_ = window.setTimeout(function() {
+      self.search_($.trim(input.val()));
+    }, SchoolYourselfCatalogSearch.DEBOUNCE_MS);
+  });
+  input.bind('keydown', function(event) {
+    return self.onKeyDown_(event);
+  });
+  input.bind('blur', function() {
+    // Late enough for a click on the list to land first.
+    window.setTimeout(function() { self.show_([]); }, 200);
+  });
+  list.delegate('li', 'mousedown', function() {
+    self.select_($(this).index());
+    return false;
+  });
 }
+
+SchoolYourselfCatalogSearch.DEBOUNCE_MS = 150;
+
+
+SchoolYourselfCatalogSearch.prototype.search_ = function(query) {
+  this.latest_ = query;
+  if (!query) {
+    this.show_([]);
+    return;
+  }
+  if (this.results_.hasOwnProperty(query)) {
+    this.show_(this.results_[query]);
+    return;
+  }
+
+  var self = this;
+  $.post(this.handlerUrl_, JSON.stringify({'query': query}))
+    .done(function(response) {
+      self.results_[query] = response.modules;
+      if (query == self.latest_) {
+        self.show_(response.modules);
+      }
+    });
+};
+
+
+SchoolYourselfCatalogSearch.prototype.show_ = function(modules) {
+  this.modules_ = modules;
+  this.selected_ = -1;
+  this.list_.empty();
+  var list = this.list_;
+  $.each(modules, function(i, module) {
+    list.append($('<li role="option"></li>')
+        .append($('<span class="catalog-result-title"></span>')
+                .text(module.title))
+        .append($('<span class="catalog-result-id"></span>')
+                .text(module.id)));
+  });
+};
+
+
+SchoolYourselfCatalogSearch.prototype.select_ = function(index) {
+  var module = this.modules_[index];
+  if (module) {
+    this.onSelect_(module);
+    this.latest_ = null;
+    this.show_([]);
+  }
+};
+
+
+SchoolYourselfCatalogSearch.prototype.onKeyDown_ = function(event) {
+  if (!this.modules_.length) {
+    return true;
+  }
+
+  switch (event.which) {
+    case 38:  // Up
+    case 40:  // Down
+      // Cycles through the modules and back to the input itself.
+      var states = this.modules_.length + 1;
+      this.selected_ = (this.selected_ + 1 + (event.which == 40 ? 1 : -1) +
+                        states) % states - 1;
+      this.list_.children().removeClass('selected');
+      if (this.selected_ != -1) {
+        this.list_.children().eq(this.selected_).addClass('selected');
+      }
+      return false;
+    case 13:  // Enter
+      if (this.selected_ != -1) {
+        this.select_(this.selected_);
+        return false;
+      }
+      return true;
+    case 27:  // Escape
+      this.show_([]);
+      return false;
+  }
+  return true;
+};
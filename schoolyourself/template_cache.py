@@ -0,0 +1,99 @@
+"""A process-wide registry of compiled Mako templates.
+
+Compiling a Mako template is far more expensive than rendering it, and
+the School Yourself XBlocks only ever render a handful of templates
+that never change while a worker is running. The registry compiles each
+template the first time it is asked for, and hands out the same
+compiled Template object from then on.
+
+If the SCHOOLYOURSELF_MAKO_MODULE_DIR environment variable is set, the
+compiled Python modules are also written to that directory, so that a
+freshly started worker can load them from disk instead of compiling
+them again.
+"""
+
+from __future__ import absolute_import
+import importlib.resources
+import os
+import threading
+
+
+MODULE_DIRECTORY_ENV = "SCHOOLYOURSELF_MAKO_MODULE_DIR"
+
+
+class TemplateRegistry(object):
+    """Compiles templates from our package once and caches them.
+
+    Lookups are safe to call from multiple threads. A template that
+    is requested by several threads at the same time is only compiled
+    once; the others wait for it under the lock.
+    """
+
+    def __init__(self, package=__package__, directory="templates",
+                 module_directory=None):
+      self.package = package
+      self.directory = directory
+      self.module_directory = module_directory
+      self._templates = {}
+      self._lock = threading.Lock()
+
+
+    def get_template(self, template_name):
+      """Returns the compiled Template for the given file name."""
+      template = self._templates.get(template_name, None)
+      if template is not None:
+        return template
+
+      with self._lock:
+        # Somebody else might have compiled it while we were waiting.
+        template = self._templates.get(template_name, None)
+        if template is None:
+          template = self._compile(template_name)
+          self._templates[template_name] = template
+      return template
+
+
+    def render(self, template_name, context):
+      """Renders the named template with the given context dict."""
+      return self.get_template(template_name).render_unicode(**context)
+
+
+    def invalidate(self, template_name=None):
+      """Drops one compiled template, or all of them if no name is given.
+
+      This is meant for development, where the templates on disk may
+      change while the server is running.
+      """
+      with self._lock:
+        if template_name is None:
+          self._templates.clear()
+        else:
+          self._templates.pop(template_name, None)
+
+
+    def _compile(self, template_name):
+      # Mako is only needed once something actually gets rendered, so
+      # it isn't imported until then.
+      from mako.template import Template
+
+      resource = importlib.resources.files(self.package).joinpath(
+          self.directory, template_name)
+      uri = "/".join((self.directory, template_name))
+      if self.module_directory:
+        # Mako can only cache compiled modules on disk for templates
+        # that are loaded from a file.
+        return Template(filename=str(resource),
+                        uri=uri,
+                        module_directory=self.module_directory)
+
+      return Template(resource.read_text(encoding="utf8"), uri=uri)
+
+
+registry = TemplateRegistry(
+    module_directory=os.environ.get(MODULE_DIRECTORY_ENV) or None)
+
+
+def invalidate_templates(template_name=None):
+  """Clears the process-wide template registry. See
+  TemplateRegistry.invalidate()."""
+  registry.invalidate(template_name)
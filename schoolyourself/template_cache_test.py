@@ -0,0 +1,81 @@
+"""This file contains a unit test for the compiled template registry."""
+
+from __future__ import absolute_import
+import shutil
+import tempfile
+import threading
+import unittest
+
+from mako.template import Template
+from mock import patch
+
+from . import template_cache
+from .template_cache import TemplateRegistry
+
+
+class TemplateRegistryTest(unittest.TestCase):
+  def setUp(self):
+    self.registry = TemplateRegistry(package=template_cache.__package__)
+
+
+  def test_compiles_once(self):
+    with patch("mako.template.Template", wraps=Template) as template_class:
+      first = self.registry.get_template("lesson_student_view.html")
+      second = self.registry.get_template("lesson_student_view.html")
+
+    self.assertIs(first, second)
+    self.assertEqual(template_class.call_count, 1)
+
+
+  def test_render(self):
+    html = self.registry.render("lesson_student_view.html",
+                                { "iframe_url": "http://example.com/embed",
+                                  "screenshot_url": "http://example.com/s",
+                                  "title": "<Lines>",
+                                  "description": "Rays & lines" })
+    self.assertIn('data-url="http://example.com/embed"', html)
+    self.assertIn("&lt;Lines&gt;", html)
+    self.assertIn("Rays &amp; lines", html)
+
+
+  def test_invalidate(self):
+    first = self.registry.get_template("studio_view.html")
+    self.registry.get_template("lesson_student_view.html")
+
+    self.registry.invalidate("studio_view.html")
+    self.assertIsNot(self.registry.get_template("studio_view.html"), first)
+
+    lesson = self.registry.get_template("lesson_student_view.html")
+    self.registry.invalidate()
+    self.assertIsNot(self.registry.get_template("lesson_student_view.html"),
+                     lesson)
+
+
+  def test_concurrent_lookups(self):
+    results = []
+    def lookup():
+      results.append(self.registry.get_template("review_student_view.html"))
+
+    with patch("mako.template.Template", wraps=Template) as template_class:
+      threads = [threading.Thread(target=lookup) for _ in range(8)]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+    self.assertEqual(template_class.call_count, 1)
+    self.assertEqual(len(set(id(template) for template in results)), 1)
+
+
+  def test_module_directory(self):
+    module_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, module_directory)
+
+    registry = TemplateRegistry(package=template_cache.__package__,
+                                module_directory=module_directory)
+    template = registry.get_template("studio_view.html")
+    self.assertTrue(template.module.__file__.startswith(module_directory))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -58,14 +58,18 @@ setup(
   description="School Yourself lesson player",
   packages=[
     "schoolyourself",
+    "schoolyourself.devtools",
   ],
   install_requires=load_requirements("requirements.txt"),
   entry_points={
     "xblock.v1": [
       "schoolyourself_lesson = schoolyourself:SchoolYourselfLessonXBlock",
       "schoolyourself_review = schoolyourself:SchoolYourselfReviewXBlock",
-    ]
+    ],
+    "console_scripts": [
+      "schoolyourself-backfill = schoolyourself.backfill:main",
+    ],
   },
   package_data=package_data("schoolyourself",
-                            ["static", "public", "templates"]),
+                            ["static", "public", "templates", "data"]),
 )